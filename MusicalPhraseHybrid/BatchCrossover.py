@@ -0,0 +1,177 @@
+"""
+种群级批量杂交模块
+
+mate_population 与对每一对父代调用 Crossover.GetChild 等价（单切点时），但与
+BatchMutations.mutate_population 一样原地修改父代：所有配对的父代打包成 NumPy 矩阵，parent2 按 Transposition.KEY_OFFSET 一次平移到
+parent1 的调（同调的行偏移为 0），整批选出切点、拼出子代，再把 child2 整批平移回
+parent2 的调，只有真正发生交换的个体才解包写回。切点的分布与 GetChild 相同：
+    mode="index": 在相同下标、相同时刻处切开（原 crossover）
+    mode="onset": 在任意共同起音时刻切开（onset_crossover, points=1）
+多切点（points > 1），以及起音不在 BEAT_UNIT 格点上的旋律，对这些配对逐个调用 GetChild。
+
+随机数由 numpy Generator 产生，种子取自 random，因此 random.seed 之后结果可复现。
+"""
+import random
+
+import numpy as np
+
+from Crossover import GetChild
+from DeltaFitness import invalidate
+from Packing import REST, PackedMelodies, pack_melodies, unpack_rows
+from RhythmPool import onset_masks
+from Settings import MELODY_LENGTH, BEAT_UNIT
+from Transposition import KEY_OFFSET, transpose_packed
+
+_KEY_OFFSET = np.array(KEY_OFFSET, dtype=np.int16)
+
+
+def _pick(legal, rng):
+    """legal 为 (n, m) 布尔矩阵，每行均匀选一个 True 的列号；没有 True 的行返回 -1"""
+    count = legal.sum(axis=1)
+    r = (rng.random(len(legal)) * count).astype(np.int64)
+    pick = np.argmax(np.cumsum(legal, axis=1) > r[:, None], axis=1)
+    return np.where(count > 0, pick, -1)
+
+
+def _index_cuts(packed1, packed2, rng):
+    """crossover 的切点：1 <= k < 两者较短的长度，且交换后两个子代总时值都是 192"""
+    width = min(packed1.width, packed2.width)
+    cum1 = np.cumsum(packed1.beat[:, :width], axis=1, dtype=np.int64)
+    cum2 = np.cumsum(packed2.beat[:, :width], axis=1, dtype=np.int64)
+    total1 = packed1.beat.sum(axis=1, dtype=np.int64)[:, None]
+    total2 = packed2.beat.sum(axis=1, dtype=np.int64)[:, None]
+    # 第 c 列对应切点 k = c + 1（前 k 个音符的时值之和为 cum[:, c]）
+    k = np.arange(1, width + 1)
+    legal = ((k < np.minimum(packed1.lengths, packed2.lengths)[:, None])
+             & (cum1 + total2 - cum2 == MELODY_LENGTH)
+             & (cum2 + total1 - cum1 == MELODY_LENGTH))
+    pick = _pick(legal, rng)
+    cut = np.where(pick >= 0, pick + 1, -1)
+    return cut, cut
+
+
+def _on_grid(packed):
+    """每行的起音是否都在 BEAT_UNIT 格点上且总时值不超过 192（起音位图能表示）"""
+    beat = packed.beat.astype(np.int64)
+    on_grid = (beat > 0) & (beat % BEAT_UNIT == 0)
+    return (on_grid | ~packed.valid).all(axis=1) & (beat.sum(axis=1) <= MELODY_LENGTH)
+
+
+def _popcount32(x):
+    return np.bitwise_count(x) if hasattr(np, "bitwise_count") else \
+        np.array([bin(int(v)).count("1") for v in x], dtype=np.int64)
+
+
+def _onset_cuts(packed1, packed2, rng):
+    """单点 onset_crossover 的切点：两个起音位图交集（去掉时刻 0）中均匀选一位"""
+    masks1 = onset_masks(packed1.beat, packed1.lengths)
+    masks2 = onset_masks(packed2.beat, packed2.lengths)
+    common = masks1 & masks2 & ~np.uint32(1)
+    slots = np.arange(MELODY_LENGTH // BEAT_UNIT, dtype=np.uint32)
+    slot = _pick(((common[:, None] >> slots) & 1).astype(bool), rng)
+    below = np.where(slot >= 0, (np.uint32(1) << np.maximum(slot, 0).astype(np.uint32)) - 1, 0)
+    below = below.astype(np.uint32)
+    i = _popcount32(masks1 & below).astype(np.int64)
+    j = _popcount32(masks2 & below).astype(np.int64)
+    return np.where(slot >= 0, i, -1), np.where(slot >= 0, j, -1)
+
+
+def _splice(head, i, tail, j):
+    """每行取 head 的前 i 个音符接上 tail 从第 j 个开始的音符，返回 (pitch, beat, lengths)"""
+    lengths = i + tail.lengths.astype(np.int64) - j
+    width = max(int(lengths.max()), 1)
+    cols = np.arange(width)[None, :]
+    from_head = cols < i[:, None]
+    head_idx = np.minimum(cols, head.width - 1)
+    tail_idx = np.clip(cols - i[:, None] + j[:, None], 0, tail.width - 1)
+    head_idx = np.broadcast_to(head_idx, from_head.shape)
+    pitch = np.where(from_head, np.take_along_axis(head.pitch, head_idx, axis=1),
+                     np.take_along_axis(tail.pitch, tail_idx, axis=1))
+    beat = np.where(from_head, np.take_along_axis(head.beat, head_idx, axis=1),
+                    np.take_along_axis(tail.beat, tail_idx, axis=1))
+    valid = cols < lengths[:, None]
+    pitch = np.where(valid, pitch, REST).astype(np.int16)
+    beat = np.where(valid, beat, 0).astype(np.int16)
+    return pitch, beat, lengths.astype(np.int16)
+
+
+def mate_packed(packed1, packed2, mode="onset", rng=None):
+    """
+    对两个 PackedMelodies 逐行配对做单点杂交，返回 (children1, children2, crossed)
+
+    children1 的调与 packed1 相同，children2 与 packed2 相同；
+    crossed 为 (n,) 布尔数组，没有合法切点（crossed 为 False）的行原样复制。
+    """
+    if rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+    offsets = _KEY_OFFSET[packed2.keys.astype(np.int64), packed1.keys.astype(np.int64)]
+    # 所有配对都同调时整批跳过来回平移
+    moved = bool(offsets.any())
+    shifted = PackedMelodies(packed2.keys,
+                             transpose_packed(packed2.pitch, offsets) if moved else packed2.pitch,
+                             packed2.beat, packed2.lengths)
+
+    if mode == "onset":
+        i, j = _onset_cuts(packed1, shifted, rng)
+    else:
+        i, j = _index_cuts(packed1, shifted, rng)
+    crossed = i >= 0
+    i = np.where(crossed, i, packed1.lengths).astype(np.int64)
+    j = np.where(crossed, j, shifted.lengths).astype(np.int64)
+
+    pitch1, beat1, lengths1 = _splice(packed1, i, shifted, j)
+    pitch2, beat2, lengths2 = _splice(shifted, j, packed1, i)
+    children1 = PackedMelodies(packed1.keys.copy(), pitch1, beat1, lengths1)
+    children2 = PackedMelodies(packed2.keys.copy(),
+                               transpose_packed(pitch2, -offsets) if moved else pitch2,
+                               beat2, lengths2)
+    return children1, children2, crossed
+
+
+def _take(packed, rows):
+    return PackedMelodies(packed.keys[rows], packed.pitch[rows], packed.beat[rows],
+                          packed.lengths[rows])
+
+
+def _assign(individual, pitch, beat):
+    individual.pitch = pitch
+    individual.beat = beat
+    invalidate(individual)
+
+
+def mate_population(pairs, mode="onset", points=1):
+    """
+    对一组 (parent1, parent2) 批量杂交（原地修改），可注册为 toolbox.mate_population，
+    Evolution.var_and 会优先使用它
+
+    相当于对每一对调用 GetChild 再把子代写回父代；返回 pairs 本身（[(child1, child2), ...]）
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return pairs
+    if points == 1:
+        packed1 = pack_melodies([p1 for p1, _ in pairs])
+        packed2 = pack_melodies([p2 for _, p2 in pairs])
+        children1, children2, crossed = mate_packed(packed1, packed2, mode)
+        batched = _on_grid(packed1) & _on_grid(packed2) if mode == "onset" else \
+            np.ones(len(pairs), dtype=bool)
+        rows = np.flatnonzero(crossed & batched)
+        for r, (_, pitch1, beat1), (_, pitch2, beat2) in zip(
+                rows.tolist(), unpack_rows(_take(children1, rows)),
+                unpack_rows(_take(children2, rows))):
+            _assign(pairs[r][0], pitch1, beat1)
+            _assign(pairs[r][1], pitch2, beat2)
+        scalar = np.flatnonzero(~batched).tolist()
+    else:
+        scalar = range(len(pairs))
+
+    # 多切点或不在格点上的配对逐对调用 GetChild
+    for r in scalar:
+        p1, p2 = pairs[r]
+        child1, child2 = GetChild(p1, p2, mode=mode, points=points)
+        _assign(p1, child1.pitch, child1.beat)
+        _assign(p2, child2.pitch, child2.beat)
+    return pairs
+
+
+__all__ = ['mate_packed', 'mate_population']
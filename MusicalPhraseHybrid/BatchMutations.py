@@ -0,0 +1,203 @@
+"""
+种群级批量变异模块
+
+mutate_population 与对每个个体调用 melody_mutation 等价：每个个体以 indpb 的概率
+从 mutation_strategies 中随机选一种变异。不同的是，被选中的个体先打包成 NumPy
+矩阵，Translation / Inversion / Retrograde / ChangePitch / ChangeRhythm 对同一
+策略的所有行一次性向量化完成；会改变音符个数的 SplitNote / MergeNotes 以及其它
+没有向量化实现的策略，对挑出的个体逐个调用原函数。
+mutate_packed 则直接作用在 PackedMelodies 上，不需要 Melody 对象。
+
+所有音高变化都查 Mutations 中预先算好的调内音表，结果保持在调内；节奏变化保持
+总时值 192 不变。随机数由 numpy Generator 产生，种子取自 random，因此 random.seed
+之后结果可复现。
+"""
+import random
+
+import numpy as np
+
+import Mutations
+from DeltaFitness import invalidate
+from Mutations import PITCH_MIN, PITCH_MAX, BEAT_UNIT, mutation_strategies
+from Packing import REST, pack_melodies, unpack_row, unpack_rows
+from Settings import Melody, Notes
+
+# 以 Notes 的顺序（即 PackedMelodies.keys 的取值）排列的查找表
+_SCALE_LEN = np.array([len(Mutations.SCALE_PITCHES[k]) for k in Notes])
+_SCALE_PITCHES = np.zeros((len(Notes), _SCALE_LEN.max()), dtype=np.int64)
+for _i, _k in enumerate(Notes):
+    _SCALE_PITCHES[_i, :_SCALE_LEN[_i]] = Mutations.SCALE_PITCHES[_k]
+_SCALE_INDEX = np.array([Mutations.SCALE_INDEX[k] for k in Notes], dtype=np.int64)
+_CLOSEST_NOTE = np.array([Mutations.CLOSEST_NOTE[k] for k in Notes], dtype=np.int64)
+
+
+def _degree(keys, pitch):
+    """对应 Mutations.scale_degree；keys 与 pitch 形状可广播"""
+    return _SCALE_INDEX[keys, np.clip(pitch, PITCH_MIN, PITCH_MAX)]
+
+
+def _to_pitch(keys, degree):
+    return _SCALE_PITCHES[keys, np.clip(degree, 0, _SCALE_LEN[keys] - 1)]
+
+
+def translation(pitch, beat, lengths, keys, note, rng):
+    shift = rng.choice([-2, -1, 1, 2], size=len(keys))[:, None]
+    moved = pitch + shift
+    new = _CLOSEST_NOTE[keys[:, None], moved % 12] + 12 * (moved // 12)
+    pitch[note] = np.clip(new, PITCH_MIN, PITCH_MAX)[note]
+
+
+def inversion(pitch, beat, lengths, keys, note, rng):
+    rows = (lengths >= 2) & note.any(axis=1)
+    first = np.argmax(note, axis=1)
+    axis = _degree(keys, pitch[np.arange(len(keys)), first])
+    new = _to_pitch(keys[:, None], 2 * axis[:, None] - _degree(keys[:, None], pitch))
+    change = note & rows[:, None]
+    pitch[change] = new[change]
+
+
+def retrograde(pitch, beat, lengths, keys, note, rng):
+    cols = np.arange(pitch.shape[1])
+    src = np.where(cols < lengths[:, None], lengths[:, None] - 1 - cols, cols)
+    pitch[:] = np.take_along_axis(pitch, src, axis=1)
+    beat[:] = np.take_along_axis(beat, src, axis=1)
+
+
+def change_pitch(pitch, beat, lengths, keys, note, rng):
+    rows = np.flatnonzero(note.any(axis=1))
+    pick = np.where(note[rows], rng.random((len(rows), pitch.shape[1])), -1.0)
+    idx = np.argmax(pick, axis=1)
+    delta = rng.choice([-2, -1, 1, 2], size=len(rows))
+    k = keys[rows]
+    pitch[rows, idx] = _to_pitch(k, _degree(k, pitch[rows, idx]) + delta)
+
+
+def change_rhythm(pitch, beat, lengths, keys, note, rng):
+    rows = np.flatnonzero(lengths >= 2)
+    idx = (rng.random(len(rows)) * (lengths[rows] - 1)).astype(np.int64)
+    forward = rng.random(len(rows)) < 0.5
+    # forward: idx 的时值移给 idx+1；否则反过来。被减的一方必须大于 BEAT_UNIT
+    src = np.where(forward, idx, idx + 1)
+    dst = np.where(forward, idx + 1, idx)
+    ok = beat[rows, src] > BEAT_UNIT
+    rows, src, dst = rows[ok], src[ok], dst[ok]
+    beat[rows, src] -= BEAT_UNIT
+    beat[rows, dst] += BEAT_UNIT
+
+
+# 策略函数 -> 向量化实现；不在表中的策略逐个调用原函数
+VECTORIZED = {
+    Mutations.Translation: translation,
+    Mutations.Inversion: inversion,
+    Mutations.Retrograde: retrograde,
+    Mutations.ChangePitch: change_pitch,
+    Mutations.ChangeRhythm: change_rhythm,
+}
+
+
+def _draw(n, indpb, strategies, rng):
+    """
+    与 melody_mutation 相同的抽样：每个个体以 indpb 概率被选中，再选一种策略
+
+    strategies 就是 mutation_strategies 且设置了 Mutations.strategy_weights 时按权重选择，
+    否则均匀选择
+    """
+    chosen = np.flatnonzero(rng.random(n) < indpb)
+    weights = Mutations.strategy_weights if strategies is mutation_strategies else None
+    if weights is None:
+        picks = rng.integers(0, len(strategies), size=len(chosen))
+    else:
+        p = np.asarray(weights, dtype=np.float64)
+        picks = rng.choice(len(strategies), size=len(chosen), p=p / p.sum())
+    return chosen, picks
+
+
+def _run_kernel(kernel, pitch, beat, lengths, keys, rng):
+    """在 int64 副本上运行向量化实现，返回 (pitch, beat)"""
+    pitch = pitch.astype(np.int64)
+    beat = beat.astype(np.int64)
+    note = (np.arange(pitch.shape[1])[None, :] < lengths[:, None]) & (pitch != REST)
+    kernel(pitch, beat, lengths.astype(np.int64), keys.astype(np.int64), note, rng)
+    return pitch, beat
+
+
+def mutate_packed(packed, indpb=0.1, strategies=None, rng=None):
+    """
+    直接在 PackedMelodies 上批量变异（原地修改 packed）
+
+    向量化策略只改动矩阵中的对应行；其余策略（改变音符个数的 SplitNote /
+    MergeNotes 等）把对应行还原成 Melody 逐个调用原函数，再写回矩阵，
+    必要时加宽矩阵。返回被变异的行号列表。
+    """
+    strategies = mutation_strategies if strategies is None else strategies
+    if rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+    chosen, picks = _draw(len(packed), indpb, strategies, rng)
+
+    fallback = []
+    for s, strategy in enumerate(strategies):
+        rows = chosen[picks == s]
+        if len(rows) == 0:
+            continue
+        kernel = VECTORIZED.get(strategy)
+        if kernel is None:
+            fallback.extend((i, strategy) for i in rows)
+            continue
+        pitch, beat = _run_kernel(kernel, packed.pitch[rows], packed.beat[rows],
+                                  packed.lengths[rows], packed.keys[rows], rng)
+        packed.pitch[rows] = pitch
+        packed.beat[rows] = beat
+
+    for i, strategy in fallback:
+        melody = strategy(Melody(*unpack_row(packed, i)))
+        n = len(melody.pitch)
+        if n > packed.width:
+            extra = n - packed.width
+            packed.pitch = np.pad(packed.pitch, ((0, 0), (0, extra)), constant_values=REST)
+            packed.beat = np.pad(packed.beat, ((0, 0), (0, extra)))
+        packed.pitch[i] = REST
+        packed.beat[i] = 0
+        packed.pitch[i, :n] = [REST if p is None else p for p in melody.pitch]
+        packed.beat[i, :n] = melody.beat
+        packed.lengths[i] = n
+
+    return chosen.tolist()
+
+
+def mutate_population(population, indpb=0.1, strategies=None):
+    """
+    对整个种群批量变异（原地修改），相当于对每个个体调用 melody_mutation(ind, indpb)
+
+    只有选中向量化策略的个体会被打包；其余个体直接调用原策略函数。
+    返回被实际施加了变异的个体下标列表。
+    """
+    strategies = mutation_strategies if strategies is None else strategies
+    rng = np.random.default_rng(random.getrandbits(64))
+    chosen, picks = _draw(len(population), indpb, strategies, rng)
+
+    for s, strategy in enumerate(strategies):
+        rows = chosen[picks == s]
+        if len(rows) == 0:
+            continue
+        if Mutations.strategy_hook is not None:
+            for i in rows:
+                Mutations.strategy_hook(population[i], strategy)
+        kernel = VECTORIZED.get(strategy)
+        if kernel is None:
+            for i in rows:
+                population[i] = strategy(population[i])
+            continue
+
+        members = [population[i] for i in rows]
+        packed = pack_melodies(members)
+        packed.pitch, packed.beat = _run_kernel(kernel, packed.pitch, packed.beat,
+                                                packed.lengths, packed.keys, rng)
+        for ind, (_, pitch, beat) in zip(members, unpack_rows(packed)):
+            ind.pitch = pitch
+            ind.beat = beat
+            invalidate(ind)
+
+    return chosen.tolist()
+
+
+__all__ = ['mutate_population', 'mutate_packed', 'VECTORIZED']
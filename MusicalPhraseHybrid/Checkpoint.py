@@ -0,0 +1,177 @@
+"""
+检查点模块：保存 / 恢复进化状态
+
+一个检查点是一个 .npz 文件，包含：
+- 种群与名人堂：打包后的 pitch/beat 矩阵（int16）、长度、调性、适应度（无效为 NaN）
+- 代数、logbook（JSON）
+- random 与 numpy 全局随机数发生器的状态
+- 可选：Controller 的状态（停滞计数、自适应概率、各变异策略的成功率与权重等）
+写入时先写临时文件再 os.replace，中途崩溃不会留下损坏的检查点。
+恢复后用 evolve(..., start_gen=generation + 1) 继续，结果与不中断的运行一致。
+"""
+import json
+import os
+import random
+
+import numpy as np
+from deap import tools
+
+from Packing import PackedMelodies, pack_melodies, unpack_melodies
+
+FORMAT_VERSION = 1
+
+
+def _pack(prefix, individuals, arrays, fitness=None):
+    if isinstance(individuals, PackedMelodies):
+        packed = individuals
+    else:
+        packed = pack_melodies(individuals)
+        fitness = [ind.fitness.values[0] if ind.fitness.valid else np.nan
+                   for ind in individuals]
+    arrays[prefix + "pitch"] = packed.pitch
+    arrays[prefix + "beat"] = packed.beat
+    arrays[prefix + "lengths"] = packed.lengths
+    arrays[prefix + "keys"] = packed.keys
+    arrays[prefix + "fitness"] = np.asarray(fitness, dtype=np.float64)
+
+
+def _unpack(prefix, data, melody_creator):
+    packed = PackedMelodies(data[prefix + "keys"], data[prefix + "pitch"],
+                            data[prefix + "beat"], data[prefix + "lengths"])
+    if melody_creator is None:
+        return packed
+    individuals = unpack_melodies(packed, melody_creator)
+    for ind, fit in zip(individuals, data[prefix + "fitness"].tolist()):
+        if not np.isnan(fit):
+            ind.fitness.values = (fit,)
+    return individuals
+
+
+def _logbook_to_json(logbook):
+    if logbook is None:
+        return None
+    from Stats import ColumnarLogbook
+    return {"header": logbook.header, "entries": list(logbook),
+            "chapters": {name: _logbook_to_json(chapter)
+                         for name, chapter in logbook.chapters.items()},
+            "columnar": isinstance(logbook, ColumnarLogbook)}
+
+
+def _logbook_from_json(obj):
+    if obj is None:
+        return None
+    if obj.get("columnar"):
+        from Stats import ColumnarLogbook
+        logbook = ColumnarLogbook(obj["header"])
+        for entry in obj["entries"]:
+            logbook.record(**entry)
+        return logbook
+    logbook = tools.Logbook()
+    logbook.header = obj["header"]
+    for entry in obj["entries"]:
+        logbook.record(**entry)
+    for name, chapter in obj.get("chapters", {}).items():
+        logbook.chapters[name] = _logbook_from_json(chapter)
+    return logbook
+
+
+def _to_builtin(value):
+    """json 序列化 logbook 中的 numpy 标量"""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"无法序列化 {type(value)}")
+
+
+def save_checkpoint(path, population, generation, halloffame=None, logbook=None,
+                    fitness=None, controller=None):
+    """
+    原子地把进化状态写入 path
+
+    population 可以是个体列表，也可以是 PackedMelodies（此时由 fitness 给出适应度数组）
+    controller: 正在使用的 Controller，其状态一并保存
+    """
+    arrays = {"version": np.array(FORMAT_VERSION), "generation": np.array(generation)}
+    _pack("pop_", population, arrays, fitness)
+    if halloffame is not None:
+        _pack("hof_", list(halloffame), arrays)
+        arrays["hof_maxsize"] = np.array(halloffame.maxsize)
+
+    meta = {"logbook": _logbook_to_json(logbook),
+            "controller": controller.state() if controller is not None else None}
+    version, mt_state, gauss_next = random.getstate()
+    arrays["random_state"] = np.array(mt_state, dtype=np.uint32)
+    meta["random_version"] = version
+    meta["random_gauss"] = gauss_next
+    np_state = np.random.get_state()
+    arrays["np_random_keys"] = np_state[1]
+    meta["np_random"] = [np_state[0]] + list(np_state[2:])
+    arrays["meta"] = np.frombuffer(json.dumps(meta, default=_to_builtin).encode("utf-8"),
+                                   dtype=np.uint8)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path, melody_creator=None, restore_rng=True):
+    """
+    读取检查点
+
+    melody_creator: 签名为 (key, pitch, beat) -> Melody 的工厂函数；
+        为 None 时不创建个体，population 为 PackedMelodies，适应度在 fitness 中
+        （大种群时创建 DEAP 个体本身就要约 10us/个，只需数组时用这种方式）
+    restore_rng: 是否同时恢复 random / numpy 的随机数状态
+    返回 dict: population, fitness, generation, halloffame, logbook, controller
+        （controller 为 Controller.state() 的结果，交给 Controller.load_state 恢复；没有保存时为 None）
+    """
+    with np.load(path) as data:
+        if int(data["version"]) != FORMAT_VERSION:
+            raise ValueError(f"不支持的检查点版本 {int(data['version'])}")
+        meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+        population = _unpack("pop_", data, melody_creator)
+
+        halloffame = None
+        if "hof_maxsize" in data:
+            halloffame = tools.HallOfFame(int(data["hof_maxsize"]))
+            if melody_creator is None:
+                halloffame = _unpack("hof_", data, None)
+            else:
+                for ind in _unpack("hof_", data, melody_creator):
+                    halloffame.insert(ind)
+
+        if restore_rng:
+            random.setstate((meta["random_version"],
+                             tuple(data["random_state"].tolist()),
+                             meta["random_gauss"]))
+            name, pos, has_gauss, cached = meta["np_random"]
+            np.random.set_state((name, data["np_random_keys"], pos, has_gauss, cached))
+
+        return {
+            "population": population,
+            "fitness": data["pop_fitness"],
+            "generation": int(data["generation"]),
+            "halloffame": halloffame,
+            "logbook": _logbook_from_json(meta["logbook"]),
+            "controller": meta.get("controller"),
+        }
+
+
+def checkpointed(generations, path, every=10, controller=None):
+    """
+    包装 evolve 产生的 GenerationState 迭代器，每 every 代保存一次检查点
+    （给出 controller 时连同它的状态一起保存）
+
+        for state in checkpointed(evolve(...), "run.ckpt.npz", every=10):
+            ...
+    """
+    for state in generations:
+        if state.gen % every == 0:
+            save_checkpoint(path, state.population, state.gen,
+                            state.halloffame, state.logbook, controller=controller)
+        yield state
+
+
+__all__ = ['save_checkpoint', 'load_checkpoint', 'checkpointed', 'FORMAT_VERSION']
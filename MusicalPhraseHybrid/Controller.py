@@ -0,0 +1,222 @@
+"""
+进化过程控制模块：提前停止 + 自适应杂交 / 变异概率
+
+挂到 toolbox 上之后（controller.attach(toolbox)），Evolution.evolve 每代：
+- 从 controller.cxpb / controller.mutpb 读取本代的杂交、变异概率
+- 一代结束时调用 controller.end_generation，结果作为 control / weights 两个 chapter
+  写进 logbook
+- controller.stop_reason 不为 None 时不再进行下一代
+
+停止条件（满足任意一个即停止）：
+    plateau : 连续 patience 代，最优适应度与平均适应度都没有超过此前的最好值 min_delta 以上
+    evals   : 累计评估次数达到 max_evals（toolbox.evaluate 是开启的 FitnessCache 时
+              只计未命中缓存、真正算过的次数，否则计 nevals，即适应度失效的个体数）
+    time    : attach 之后经过的时间达到 max_seconds 秒
+自适应概率：
+- 停滞的代数越多，变异概率越高、杂交概率越低（线性，停滞 patience 代时分别到达
+  max_mutpb / min_cxpb），一旦有提高就恢复到初始值
+- 每种变异策略的成功率（变异后适应度高于变异前的比例，与 Profiling 的统计方式相同）
+  做指数平滑，按成功率设置 Mutations.strategy_weights，成功率高的策略更容易被选中；
+  每种策略至少保留 min_weight / 策略数 的概率
+
+用进程池并行变异时，策略统计发生在子进程中，各策略的权重不会更新，
+子进程中也仍然等概率选择策略。
+
+state() / load_state() 导出、恢复停滞计数、最好值、当前概率、各策略成功率与权重、
+已用时间和停止原因（Checkpoint.save_checkpoint 的 controller 参数会把它们存进检查点），
+从检查点继续时与不中断的运行一致；已经停止的运行恢复后也不会再继续。
+
+用法:
+    controller = Controller(CXPB, MUTPB, patience=10, max_evals=20000)
+    controller.attach(toolbox)
+    for state in evolve(population, toolbox, CXPB, MUTPB, ngen=NGEN, halloffame=hof):
+        ...
+    controller.detach()
+    print(controller.stop_reason)
+"""
+import time
+from collections import Counter
+
+import Mutations
+
+
+class Controller:
+    """
+    逐代判断是否停止，并调整杂交 / 变异概率与各变异策略的权重
+
+    cxpb, mutpb: 初始（也是没有停滞时）的杂交、变异概率
+    patience: 允许连续停滞的代数；为 None 时不做停滞检测，但仍按停滞代数调整概率
+    min_delta: 适应度至少提高这么多才算有提高
+    max_evals / max_seconds: 评估次数 / 时间预算，None 为不限；命中适应度缓存的不算评估
+    adapt_rates: 是否按停滞代数调整 cxpb / mutpb
+    adapt_strategies: 是否按成功率调整各变异策略的权重
+    smoothing: 成功率指数平滑系数，越大越看重最近几代
+    """
+
+    def __init__(self, cxpb, mutpb, patience=10, min_delta=1e-6, max_evals=None,
+                 max_seconds=None, adapt_rates=True, adapt_strategies=True,
+                 min_cxpb=0.4, max_mutpb=0.6, smoothing=0.1, min_weight=0.5):
+        self.base_cxpb = self.cxpb = cxpb
+        self.base_mutpb = self.mutpb = mutpb
+        self.patience = patience
+        self.min_delta = min_delta
+        self.max_evals = max_evals
+        self.max_seconds = max_seconds
+        self.adapt_rates = adapt_rates
+        self.adapt_strategies = adapt_strategies
+        self.min_cxpb = min(min_cxpb, cxpb)
+        self.max_mutpb = max(max_mutpb, mutpb)
+        self.smoothing = smoothing
+        self.min_weight = min_weight
+
+        self.evals = 0
+        self.stall = 0
+        self.best = None
+        self.best_avg = None
+        self.stop_reason = None
+        self.success = {strategy.__name__: None for strategy in Mutations.mutation_strategies}
+        self._pending = []
+        self._previous_hook = None
+        self._toolbox = None
+        self._cache = None                   # toolbox.evaluate 背后的 FitnessCache
+        self._misses = 0
+        self._elapsed = 0.0                  # 从检查点恢复的已用时间
+        self._start = time.perf_counter()
+
+    def attach(self, toolbox):
+        """挂到 toolbox 上（Evolution 通过 toolbox.controller 找到它），并接管变异策略钩子"""
+        toolbox.controller = self
+        self._toolbox = toolbox
+        from Fitness import FitnessCache, _unwrap
+        cache = _unwrap(getattr(toolbox, "evaluate", None))
+        self._cache = cache if isinstance(cache, FitnessCache) else None
+        self._misses = self._cache.misses if self._cache is not None else 0
+        self._previous_hook = Mutations.strategy_hook
+        Mutations.strategy_hook = self.on_mutation
+        self._start = time.perf_counter() - self._elapsed
+
+    def detach(self):
+        """恢复原来的钩子，并把变异策略恢复为等概率"""
+        if self._toolbox is not None:
+            del self._toolbox.controller
+            self._toolbox = None
+        self._cache = None
+        if Mutations.strategy_hook == self.on_mutation:
+            Mutations.strategy_hook = self._previous_hook
+        if self.adapt_strategies:
+            Mutations.strategy_weights = None
+
+    def state(self):
+        """可以 JSON 序列化的运行状态（在两代之间调用）"""
+        return {"evals": self.evals, "stall": self.stall, "best": self.best,
+                "best_avg": self.best_avg, "cxpb": self.cxpb, "mutpb": self.mutpb,
+                "stop_reason": self.stop_reason, "success": dict(self.success),
+                "weights": Mutations.strategy_weights if self.adapt_strategies else None,
+                "elapsed": time.perf_counter() - self._start}
+
+    def load_state(self, state):
+        """恢复 state() 导出的状态，并按其中的权重设置 Mutations.strategy_weights"""
+        self.evals = state["evals"]
+        self.stall = state["stall"]
+        self.best = state["best"]
+        self.best_avg = state["best_avg"]
+        self.cxpb = state["cxpb"]
+        self.mutpb = state["mutpb"]
+        self.stop_reason = state["stop_reason"]
+        self.success.update({name: rate for name, rate in state["success"].items()
+                             if name in self.success})
+        self._elapsed = state["elapsed"]
+        self._start = time.perf_counter() - self._elapsed
+        if self.adapt_strategies:
+            Mutations.strategy_weights = state["weights"]
+
+    def on_mutation(self, individual, strategy):
+        """变异前调用：记下策略与变异前的适应度（已经挂着的钩子照常调用）"""
+        if self._previous_hook is not None:
+            self._previous_hook(individual, strategy)
+        if individual.fitness.valid:
+            self._pending.append((individual, strategy.__name__, individual.fitness.values[0]))
+
+    def _update_weights(self):
+        tried = Counter()
+        success = Counter()
+        for individual, name, before in self._pending:
+            if individual.fitness.valid:
+                tried[name] += 1
+                success[name] += individual.fitness.values[0] > before
+        self._pending = []
+        for name in self.success:
+            if tried[name]:
+                rate = success[name] / tried[name]
+                old = self.success[name]
+                self.success[name] = rate if old is None else \
+                    (1 - self.smoothing) * old + self.smoothing * rate
+
+        known = [rate for rate in self.success.values() if rate is not None]
+        if not known:
+            return None
+        # 还没有统计到的策略按已知成功率的平均值对待
+        default = sum(known) / len(known)
+        rates = [default if rate is None else rate for rate in self.success.values()]
+        total = sum(rates)
+        k = len(rates)
+        if total <= 0:
+            weights = [1.0 / k] * k
+        else:
+            weights = [self.min_weight / k + (1 - self.min_weight) * rate / total
+                       for rate in rates]
+        Mutations.strategy_weights = weights
+        return weights
+
+    def _evaluated(self, nevals):
+        """本代真正算过的评估次数：有开启的 FitnessCache 时为新增的未命中次数"""
+        cache = self._cache
+        if cache is None or not cache.enabled:
+            return nevals
+        if cache.misses < self._misses:   # 缓存被 clear 过
+            self._misses = 0
+        count = cache.misses - self._misses
+        self._misses = cache.misses
+        return count
+
+    def end_generation(self, gen, population, halloffame, nevals):
+        """一代结束时调用：更新停滞计数、预算与各概率，返回要并入 logbook 的 chapter"""
+        self.evals += self._evaluated(nevals)
+        fitness = [ind.fitness.values[0] for ind in population]
+        if halloffame is not None and len(halloffame):
+            best = halloffame[0].fitness.values[0]
+        else:
+            best = max(fitness)
+        avg = sum(fitness) / len(fitness)
+
+        improved = self.best is None or best > self.best + self.min_delta \
+            or avg > self.best_avg + self.min_delta
+        if self.best is None or best > self.best:
+            self.best = best
+        if self.best_avg is None or avg > self.best_avg:
+            self.best_avg = avg
+        self.stall = 0 if improved else self.stall + 1
+
+        if self.adapt_rates:
+            horizon = self.patience or 10
+            level = min(self.stall / horizon, 1.0)
+            self.cxpb = self.base_cxpb + (self.min_cxpb - self.base_cxpb) * level
+            self.mutpb = self.base_mutpb + (self.max_mutpb - self.base_mutpb) * level
+        weights = self._update_weights() if self.adapt_strategies else None
+
+        if self.patience is not None and self.stall >= self.patience:
+            self.stop_reason = "plateau"
+        elif self.max_evals is not None and self.evals >= self.max_evals:
+            self.stop_reason = "evals"
+        elif self.max_seconds is not None and time.perf_counter() - self._start >= self.max_seconds:
+            self.stop_reason = "time"
+
+        record = {"control": {"cxpb": self.cxpb, "mutpb": self.mutpb,
+                              "stall": self.stall, "evals": self.evals}}
+        if weights is not None:
+            record["weights"] = {strategy.__name__: w
+                                 for strategy, w in zip(Mutations.mutation_strategies, weights)}
+        return record
+
+
+__all__ = ['Controller']
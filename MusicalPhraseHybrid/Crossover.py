@@ -1,12 +1,12 @@
-from Settings import Melody, Notes,KEY_SCALE_MAP
+from Settings import Melody, MelodyBase, Notes,KEY_SCALE_MAP
+from Transposition import KEY_INDEX, KEY_SHIFT, key_offset, transpose
 import random
-from deap import base, creator, tools, algorithms
 
 # ----------- crossover function by zyx -------------
 
 # ----------------- 平移到指定调式 -----------------
 def shift_pitch_to_key(pitch_list, from_key, to_key):
-    shift = (Notes.index(to_key) - Notes.index(from_key)) % 12
+    shift = KEY_SHIFT[KEY_INDEX[from_key]][KEY_INDEX[to_key]]
     shifted = []
     for p in pitch_list:
         if p is None:
@@ -66,26 +66,97 @@ def crossover(parent1_pitch, parent1_beat, parent2_pitch, parent2_beat):
 
 
 
+# ----------------- 按起音时刻 crossover -----------------
+def shared_onsets(parent1_beat, parent2_beat):
+    """
+    双指针归并两条旋律的前缀和，找出两者都有音符起点的所有时刻
+
+    返回 [(t, i, j), ...]：时刻 t 处 parent1 从下标 i 开始、parent2 从下标 j 开始，
+    不含开头 0 和结尾。与 crossover 只比较相同下标不同，这里下标可以不同。
+    """
+    points = []
+    i = j = 0
+    t1 = t2 = 0
+    n1, n2 = len(parent1_beat), len(parent2_beat)
+    while i < n1 and j < n2:
+        if t1 == t2:
+            if i > 0:
+                points.append((t1, i, j))
+            t1 += parent1_beat[i]
+            t2 += parent2_beat[j]
+            i += 1
+            j += 1
+        elif t1 < t2:
+            t1 += parent1_beat[i]
+            i += 1
+        else:
+            t2 += parent2_beat[j]
+            j += 1
+    return points
+
+
+def onset_crossover(parent1_pitch, parent1_beat, parent2_pitch, parent2_beat, points=1):
+    """
+    在共同的起音时刻切开并交换片段，支持多点 crossover
+
+    随机选取 points 个共同起音时刻（不足则全用），两个子代在各段之间交替取自
+    两个父代；因为切点时刻相同，子代总时值保持不变。没有共同起音时刻时返回父代拷贝。
+    """
+    cuts = shared_onsets(parent1_beat, parent2_beat)
+    if not cuts:
+        return parent1_pitch[:], parent1_beat[:], parent2_pitch[:], parent2_beat[:]
+
+    cuts = sorted(random.sample(cuts, min(points, len(cuts))))
+    bounds = [(0, 0)] + [(i, j) for _, i, j in cuts] + [(len(parent1_beat), len(parent2_beat))]
+
+    c1_pitch, c1_beat, c2_pitch, c2_beat = [], [], [], []
+    for s in range(len(bounds) - 1):
+        (i0, j0), (i1, j1) = bounds[s], bounds[s + 1]
+        seg1 = (parent1_pitch[i0:i1], parent1_beat[i0:i1])
+        seg2 = (parent2_pitch[j0:j1], parent2_beat[j0:j1])
+        if s % 2:
+            seg1, seg2 = seg2, seg1
+        c1_pitch += seg1[0]
+        c1_beat += seg1[1]
+        c2_pitch += seg2[0]
+        c2_beat += seg2[1]
+    return c1_pitch, c1_beat, c2_pitch, c2_beat
+
+
 # ----------------- 主函数 -----------------
-def GetChild(parent1: Melody, parent2: Melody):
-    # 1. 平移父母到 C 大调
-    c1_pitch = shift_pitch_to_key(parent1.pitch, parent1.key, "C")
-    c2_pitch = shift_pitch_to_key(parent2.pitch, parent2.key, "C")
+def GetChild(parent1: Melody, parent2: Melody, mode="index", points=1):
+    """
+    mode="index": 原单点 crossover，只在相同下标、相同时刻处切开
+    mode="onset": 在任意共同起音时刻切开，points 为切点个数
+
+    parent2 按 Transposition.KEY_OFFSET 平移到 parent1 的调，杂交后 child2 再平移回去；
+    两个父代同调时不做任何平移。与原先“都平移到 C 再平移回来”相比，子代的音程关系
+    相同，只是不再被整体抬高一个八度（见 Transposition 模块说明）。
+    """
+    # 1. parent2 平移到 parent1 的调（同调时跳过）
+    offset = key_offset(parent2.key, parent1.key)
+    c1_pitch = parent1.pitch[:]
+    c2_pitch = transpose(parent2.pitch, offset) if offset else parent2.pitch[:]
     c1_beat = parent1.beat[:]
     c2_beat = parent2.beat[:]
 
     # 2. 可以多次杂交（循环调用 crossover）
-    c1_pitch, c1_beat, c2_pitch, c2_beat = crossover(
-        c1_pitch, c1_beat, c2_pitch, c2_beat
-    )
-
-    # 3. 平移回父母调式
-    c1_pitch = shift_pitch_to_key(c1_pitch, "C", parent1.key)
-    c2_pitch = shift_pitch_to_key(c2_pitch, "C", parent2.key)
-
-    # 4. 创建子代 Melody
-    child1 = creator.Melody(parent1.key, c1_pitch, c1_beat)
-    child2 = creator.Melody(parent2.key, c2_pitch, c2_beat)
-
-    assert isinstance(child1, creator.Melody) and isinstance(child2, creator.Melody), "Invalid Crossover Function"
+    if mode == "onset":
+        c1_pitch, c1_beat, c2_pitch, c2_beat = onset_crossover(
+            c1_pitch, c1_beat, c2_pitch, c2_beat, points=points
+        )
+    else:
+        c1_pitch, c1_beat, c2_pitch, c2_beat = crossover(
+            c1_pitch, c1_beat, c2_pitch, c2_beat
+        )
+
+    # 3. child2 平移回 parent2 的调
+    if offset:
+        c2_pitch = transpose(c2_pitch, -offset)
+
+    # 4. 创建子代 Melody（与父代同类，通常是 creator.Melody；这样本模块不必导入 deap）
+    child1 = type(parent1)(parent1.key, c1_pitch, c1_beat)
+    child2 = type(parent2)(parent2.key, c2_pitch, c2_beat)
+
+    assert isinstance(child1, MelodyBase) and isinstance(child2, MelodyBase), "Invalid Crossover Function"
     return child1, child2
@@ -0,0 +1,230 @@
+"""
+增量适应度模块
+
+把 evaluate_melody 拆成可以逐位置累加的形式，保存在个体的 fitness_terms 属性上：
+    states  : 每个位置处理完之后的扫描状态 (代替音级, 连唱音符数, 连唱时值, 连续空拍时值)
+    contrib : 每个位置对连唱 / 连续空拍 / 长音稳定度 / 小节结尾空拍各项的贡献之和
+    pause   : 空拍位置的时值，音符位置为 0
+    start   : 每个位置的起始时刻
+    jump    : 相邻两个位置之间的跳跃代价
+以及音级直方图（音区范围）、跳跃代价之和与平方和（均值项与标准差项）、
+空拍个数、总空拍时值、contrib 之和等汇总量。
+
+ChangePitch / ChangeRhythm / SplitNote / MergeNotes 只改动一两个音符，它们通过
+touch(individual, lo, old_hi, new_hi) 报告改动的区间：原来的 [lo, old_hi) 变成了
+现在的 [lo, new_hi)，且区间总时值不变。之后的位置只要遇到一次“空拍 -> 音符”
+的转折，扫描状态就与之前无关，因此只需重算 [lo, 该转折] 这一段并更新汇总量。
+Translation / Inversion / Retrograde 等整体改动调用 invalidate，下次评估时重新全量构建。
+
+用法：toolbox.register("evaluate", evaluate_incremental)
+"""
+import math
+
+from Settings import Notes
+from Fitness import JUMP_LIST, JUMP_OUT_OF_RANGE, STABLE_LIST, evaluate_melody
+
+_INITIAL_STATE = (0, 0, 0.0, 0)  # 开头的空拍用主音代替
+
+
+def _jump_cost(a, b):
+    interval = abs(b - a)
+    if interval < len(JUMP_LIST):
+        return JUMP_LIST[interval]
+    return JUMP_OUT_OF_RANGE
+
+
+def _scan(melody, lo, hi, state, t):
+    """
+    从扫描状态 state、时刻 t 开始处理位置 [lo, hi)
+
+    返回 (states, contrib, pause, start) 四个列表，与 evaluate_melody 中各循环的
+    逐位置结算一一对应
+    """
+    pitches = melody.pitch
+    beats = melody.beat
+    offset = Notes.index(melody.key) if melody.key in Notes else 0
+    filled, count, duration, pause_run = state
+
+    states, contrib, pause, start = [], [], [], []
+    for i in range(lo, hi):
+        p = pitches[i]
+        b = beats[i]
+        c = 0.0
+        if p is None:
+            # 连唱在空拍处结算
+            if count >= 4:
+                c += (count - 3) * 5.0
+            if duration > 48.0:
+                c -= ((duration - 48.0) * 0.2) ** 2
+            count = 0
+            duration = 0.0
+            pause_run += b
+            pause.append(b)
+        else:
+            # 连续空拍在音符处结算
+            if pause_run >= 24.0:
+                c -= ((pause_run - 24.0) * 0.2) ** 2.0
+            pause_run = 0
+            count += 1
+            duration += b
+            filled = (p - offset) % 12
+            stable = STABLE_LIST[filled]
+            if b >= 24.0 or stable < 0:
+                c += stable * (b / 6.0)
+            pause.append(0)
+        # 每两个小节结尾为空拍
+        if p is None and (t + b >= 96.0 and t < 96.0 or t + b >= 192.0 and t < 192.0):
+            c += 20.0
+        start.append(t)
+        t += b
+        states.append((filled, count, duration, pause_run))
+        contrib.append(c)
+    return states, contrib, pause, start
+
+
+class FitnessTerms:
+    """evaluate_melody 的逐位置分解，见模块说明"""
+
+    __slots__ = ("states", "contrib", "pause", "start", "jump", "histogram",
+                 "jump_sum", "jump_sq", "rests", "pause_total", "contrib_sum")
+
+    def __init__(self, melody):
+        self.states, self.contrib, self.pause, self.start = _scan(
+            melody, 0, len(melody.pitch), _INITIAL_STATE, 0)
+        self.histogram = [0] * 12
+        for state in self.states:
+            self.histogram[state[0]] += 1
+        self.jump = [_jump_cost(a[0], b[0]) for a, b in zip(self.states, self.states[1:])]
+        self.jump_sum = sum(self.jump)
+        self.jump_sq = sum(j * j for j in self.jump)
+        self.rests = sum(1 for b in self.pause if b)
+        self.pause_total = sum(self.pause)
+        self.contrib_sum = sum(self.contrib)
+
+    def __len__(self):
+        return len(self.states)
+
+    def __deepcopy__(self, memo):
+        # 列表元素都是不可变对象，浅拷贝列表即可（toolbox.clone 会走到这里）
+        other = FitnessTerms.__new__(FitnessTerms)
+        for name in self.__slots__:
+            value = getattr(self, name)
+            setattr(other, name, value[:] if isinstance(value, list) else value)
+        return other
+
+    def update(self, melody, lo, old_hi, new_hi):
+        """melody 的 [lo, old_hi) 已被替换为 [lo, new_hi)，在 O(改动区间) 内更新"""
+        pitches = melody.pitch
+        n = len(pitches)
+        # 向右找到第一个“空拍 -> 音符”的转折，其后的扫描状态不受影响
+        end = n - 1
+        for k in range(max(new_hi, 1), n):
+            if pitches[k] is not None and pitches[k - 1] is None:
+                end = k
+                break
+        new_end = end + 1
+        old_end = new_end + old_hi - new_hi
+
+        state = self.states[lo - 1] if lo > 0 else _INITIAL_STATE
+        t = self.start[lo]
+        states, contrib, pause, start = _scan(melody, lo, new_end, state, t)
+
+        histogram = self.histogram
+        for s in self.states[lo:old_end]:
+            histogram[s[0]] -= 1
+        for s in states:
+            histogram[s[0]] += 1
+        old_pause = self.pause[lo:old_end]
+        self.rests += sum(1 for b in pause if b) - sum(1 for b in old_pause if b)
+        self.pause_total += sum(pause) - sum(old_pause)
+        self.contrib_sum += sum(contrib) - sum(self.contrib[lo:old_end])
+
+        self.states[lo:old_end] = states
+        self.contrib[lo:old_end] = contrib
+        self.pause[lo:old_end] = pause
+        self.start[lo:old_end] = start
+
+        # 跳跃 j 连接位置 j 与 j+1；受影响的是 [lo-1, end) 这些跳跃
+        jlo = max(lo - 1, 0)
+        old_jump = self.jump[jlo:old_end - 1]
+        new_jump = [_jump_cost(a[0], b[0])
+                    for a, b in zip(self.states[jlo:new_end - 1], self.states[jlo + 1:new_end])]
+        self.jump_sum += sum(new_jump) - sum(old_jump)
+        self.jump_sq += sum(j * j for j in new_jump) - sum(j * j for j in old_jump)
+        self.jump[jlo:old_end - 1] = new_jump
+
+    def score(self, melody):
+        """由汇总量组合出 evaluate_melody 的得分"""
+        score = self.contrib_sum
+
+        # 音区范围
+        used = [i for i, c in enumerate(self.histogram) if c]
+        pitch_range = used[-1] - used[0]
+        if pitch_range > 24:
+            score -= (pitch_range - 18) ** 2
+        else:
+            score += pitch_range
+
+        # 跳跃：均值项与标准差项
+        m = len(self.jump)
+        score -= ((self.jump_sum - 20.0) / math.sqrt(m)) ** 2
+        score -= max(self.jump_sq - self.jump_sum * self.jump_sum / m, 0.0) / (m - 1)
+
+        # 总音符数
+        note_count = len(self.states) - self.rests
+        if note_count < 16:
+            score -= (16 - note_count) ** 2
+        elif note_count > 48:
+            score -= (note_count - 48) ** 2
+        else:
+            score += note_count * 2.0
+
+        # 总pause时长
+        if self.pause_total < 24:
+            score -= (24 - self.pause_total) ** 2
+        elif self.pause_total > 96:
+            score -= (self.pause_total - 96) ** 2
+        else:
+            score += (96 - self.pause_total) * 0.5
+
+        # 结尾落在主/属音上、结尾为长音
+        last = self.states[-1][0]
+        if last == 0:
+            score += 10.0
+        elif last == 7:
+            score += 5.0
+        if melody.beat[-1] >= 12.0:
+            score += 10.0
+        return score
+
+
+def touch(individual, lo, old_hi, new_hi):
+    """局部变异后调用：个体带有 fitness_terms 时就地增量更新"""
+    terms = getattr(individual, "fitness_terms", None)
+    if terms is not None:
+        terms.update(individual, lo, old_hi, new_hi)
+
+
+def invalidate(individual):
+    """整体变异后调用：丢弃 fitness_terms，下次评估时重新构建"""
+    if getattr(individual, "fitness_terms", None) is not None:
+        individual.fitness_terms = None
+
+
+def evaluate_incremental(melody):
+    """
+    与 evaluate_melody 结果一致（浮点误差范围内）的评估函数
+
+    首次评估时构建 fitness_terms 并挂到个体上；之后局部变异报告过改动区间的个体
+    直接由汇总量得出得分。少于3个音符的旋律交给 evaluate_melody 处理。
+    """
+    if len(melody.pitch) < 3:
+        return evaluate_melody(melody)
+    terms = getattr(melody, "fitness_terms", None)
+    if terms is None or len(terms) != len(melody.pitch):
+        terms = FitnessTerms(melody)
+        melody.fitness_terms = terms
+    return (terms.score(melody),)
+
+
+__all__ = ['FitnessTerms', 'evaluate_incremental', 'touch', 'invalidate']
@@ -0,0 +1,192 @@
+"""
+种群多样性模块：旋律距离 + 局部敏感哈希索引 + 共享适应度选择
+
+旋律距离（音高轮廓 + 起音位置）：
+    把每条旋律按 BEAT_UNIT 采样到 32 个格点上，每个格点取此刻正在发声的音高
+    （空拍沿用前一个音，开头的空拍取第一个音），再减去该旋律的平均音高，得到与
+    移调无关的音高轮廓 grid。两条旋律的距离为
+        mean(|grid1 - grid2|) + ONSET_WEIGHT * popcount(mask1 ^ mask2) / 32
+    其中 mask 是 RhythmPool.onset_masks 的 32 位起音位图。
+
+MelodyIndex 用 p-stable（柯西分布）随机投影对 [grid, ONSET_WEIGHT * 起音位] 做
+局部敏感哈希：距离近的旋律大概率落进同一个桶。每张哈希表按桶排序后，只比较排序后
+相距不超过 window 的同桶旋律，候选对的个数为 O(tables * n * window)，建索引为
+O(tables * n log n)，不需要 O(n²) 的两两比较。桶非常大（种群塌缩到近似重复的个体）
+时只比较窗口内的邻居，此时算出的小生境计数偏小，但这些个体仍会被明显惩罚。
+
+sel_shared_tournament 用小生境计数做适应度共享：
+    shared = (fitness - min(fitness) + 1) / niche_count
+再在 shared 上做锦标赛选择，可直接注册为 toolbox.select。
+"""
+import math
+import random
+
+import numpy as np
+
+from Packing import REST, pack_melodies
+from RhythmPool import onset_masks
+from Settings import MELODY_LENGTH, BEAT_UNIT
+
+GRID_SLOTS = MELODY_LENGTH // BEAT_UNIT
+ONSET_WEIGHT = 4.0   # 起音位置完全不同（32 个格点都不同）时相当于平均相差 4 个半音
+SHARE_SIGMA = 2.0    # 距离小于该值的两条旋律互相分摊适应度
+_PAIR_CHUNK = 1 << 16
+
+
+def _popcount(x):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x).astype(np.int64)
+    x = x.astype(np.uint64)
+    x = x - ((x >> 1) & 0x5555555555555555)
+    x = (x & 0x3333333333333333) + ((x >> 2) & 0x3333333333333333)
+    x = (x + (x >> 4)) & 0x0F0F0F0F0F0F0F0F
+    return ((x * 0x0101010101010101) >> 56).astype(np.int64)
+
+
+def contour_grid(packed):
+    """
+    对 PackedMelodies 一次算出音高轮廓，返回 (n, GRID_SLOTS) float32
+
+    同一行在同一时刻只有一个音，所以把每行音符结束时刻加上行偏移后展平，
+    整个种群的格点只需一次 searchsorted
+    """
+    n, width = packed.pitch.shape
+    if n == 0 or width == 0:
+        return np.zeros((n, GRID_SLOTS), dtype=np.float32)
+    valid = packed.valid
+    note = valid & (packed.pitch != REST)
+    cols = np.arange(width)
+
+    # 空拍沿用前一个音，开头的空拍取第一个音
+    last_note = np.maximum.accumulate(np.where(note, cols, -1), axis=1)
+    first_note = np.argmax(note, axis=1)[:, None]
+    source = np.where(last_note >= 0, last_note, first_note)
+    pitch = np.take_along_axis(packed.pitch, source, axis=1).astype(np.float32)
+    pitch[~note.any(axis=1)] = 0.0
+
+    ends = np.cumsum(packed.beat, axis=1, dtype=np.int64)
+    span = max(MELODY_LENGTH, int(ends.max()))
+    offset = np.arange(n, dtype=np.int64)[:, None] * span
+    flat_ends = (ends + offset)[valid]
+    flat_pitch = pitch[valid]
+    times = offset + np.arange(GRID_SLOTS, dtype=np.int64)[None, :] * BEAT_UNIT
+    index = np.searchsorted(flat_ends, times.ravel(), side="right")
+    grid = flat_pitch[np.minimum(index, len(flat_pitch) - 1)].reshape(n, GRID_SLOTS)
+    return grid - grid.mean(axis=1, keepdims=True)
+
+
+def grid_distance(grid1, masks1, grid2, masks2, onset_weight=ONSET_WEIGHT):
+    """逐行（可广播）计算距离，见模块说明"""
+    contour = np.abs(grid1 - grid2).mean(axis=-1)
+    return contour + onset_weight * _popcount(masks1 ^ masks2) / GRID_SLOTS
+
+
+def melody_distance(melody1, melody2, onset_weight=ONSET_WEIGHT):
+    """两条旋律（具有 key/pitch/beat 属性）之间的距离"""
+    packed = pack_melodies([melody1, melody2])
+    grid = contour_grid(packed)
+    masks = onset_masks(packed.beat, packed.lengths)
+    return float(grid_distance(grid[0], masks[0], grid[1], masks[1], onset_weight))
+
+
+class MelodyIndex:
+    """
+    种群的局部敏感哈希索引
+
+    packed: PackedMelodies
+    tables: 哈希表个数，越多召回率越高
+    projections: 每张表拼接的投影个数，越多桶越小；默认 6，种群超过一万时按规模增加，
+                 使每条旋律的平均候选数大致不随种群规模增长
+    bucket_width: 投影量化的宽度（以特征空间的 L1 距离计）
+    window: 每张表中每条旋律最多与排序后之后的 window 条同桶旋律比较
+    """
+
+    def __init__(self, packed, tables=16, projections=None, bucket_width=None, window=16,
+                 onset_weight=ONSET_WEIGHT, rng=None):
+        if rng is None:
+            rng = np.random.default_rng(random.getrandbits(64))
+        self.onset_weight = onset_weight
+        self.window = window
+        self.grid = contour_grid(packed)
+        self.masks = onset_masks(packed.beat, packed.lengths) if len(packed) else \
+            np.zeros(0, dtype=np.uint32)
+
+        n = len(self.grid)
+        if projections is None:
+            projections = 6 + max(0, round(2 * math.log10(max(n, 1) / 10_000)))
+        bits = (self.masks[:, None] >> np.arange(GRID_SLOTS, dtype=np.uint32)) & 1
+        # 特征空间中的 L1 距离 = GRID_SLOTS * grid_distance
+        features = np.hstack([self.grid, onset_weight * bits.astype(np.float32)])
+        if bucket_width is None:
+            bucket_width = 3 * SHARE_SIGMA * GRID_SLOTS
+        a = rng.standard_cauchy((features.shape[1], tables * projections)).astype(np.float32)
+        b = rng.uniform(0, bucket_width, tables * projections)
+        codes = np.floor((features @ a + b) / bucket_width).astype(np.int64)
+        codes = codes.reshape(n, tables, projections)
+        mix = rng.integers(1, 2**61, size=projections, dtype=np.int64) | 1
+        self.keys = (codes * mix).sum(axis=2)   # (n, tables)，整数溢出回绕不影响分桶
+
+    def __len__(self):
+        return len(self.grid)
+
+    def candidate_pairs(self):
+        """所有哈希表中落进同一个桶的候选对 (i, j)，i < j，已去重"""
+        n = len(self)
+        found = []
+        for t in range(self.keys.shape[1]):
+            order = np.argsort(self.keys[:, t], kind="stable")
+            keys = self.keys[order, t]
+            for step in range(1, min(self.window, n - 1) + 1):
+                same = keys[:-step] == keys[step:]
+                if not same.any():
+                    break
+                i, j = order[:-step][same], order[step:][same]
+                found.append(np.minimum(i, j) * n + np.maximum(i, j))
+        if not found:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        pairs = np.unique(np.concatenate(found))
+        return pairs // n, pairs % n
+
+    def distances(self, i, j):
+        return grid_distance(self.grid[i], self.masks[i], self.grid[j], self.masks[j],
+                             self.onset_weight)
+
+    def niche_counts(self, sigma=SHARE_SIGMA, alpha=1.0):
+        """
+        每条旋律的小生境计数 1 + sum(sh(d))，sh(d) = 1 - (d / sigma) ** alpha（d < sigma）
+
+        只统计候选对，距离 sigma 以内但没有落进同一个桶的旋律会被漏掉
+        """
+        i, j = self.candidate_pairs()
+        n = len(self)
+        counts = np.ones(n)
+        # 分块计算距离，临时矩阵的大小与种群规模无关
+        for start in range(0, len(i), _PAIR_CHUNK):
+            ci, cj = i[start:start + _PAIR_CHUNK], j[start:start + _PAIR_CHUNK]
+            share = np.maximum(1.0 - (self.distances(ci, cj) / sigma) ** alpha, 0.0)
+            counts += np.bincount(ci, share, minlength=n) + np.bincount(cj, share, minlength=n)
+        return counts
+
+
+def sel_shared_tournament(individuals, k, tournsize=3, sigma=SHARE_SIGMA, **index_options):
+    """
+    共享适应度锦标赛选择，接口与 tools.selTournament 相同
+
+    适应度先平移到正数再除以小生境计数，相近的个体越多，每个个体越难被选中
+    """
+    n = len(individuals)
+    rng = np.random.default_rng(random.getrandbits(64))
+    index = MelodyIndex(pack_melodies(individuals), rng=rng, **index_options)
+    fitness = np.fromiter((ind.fitness.values[0] for ind in individuals), dtype=np.float64,
+                          count=n)
+    shared = (fitness - fitness.min() + 1.0) / index.niche_counts(sigma)
+    aspirants = rng.integers(0, n, size=(k, tournsize))
+    winners = aspirants[np.arange(k), shared[aspirants].argmax(axis=1)]
+    return [individuals[i] for i in winners.tolist()]
+
+
+__all__ = [
+    'contour_grid', 'grid_distance', 'melody_distance', 'MelodyIndex',
+    'sel_shared_tournament', 'GRID_SLOTS', 'ONSET_WEIGHT', 'SHARE_SIGMA'
+]
@@ -0,0 +1,303 @@
+"""
+精英档案：保存适应度最高的 K 条互不相同的旋律
+
+与 tools.HallOfFame 接口兼容（update / insert / __getitem__ / __len__ / __iter__ /
+maxsize / clear），可以直接作为 evolve 的 halloffame，但：
+- 去重：每条旋律按调性下标向下平移到 C 调后的 pitch/beat 内容取
+  blake2b 摘要，查字典 O(1) 判断是否重复；不同调但音程、节奏完全相同的旋律算作重复
+- 排序：按适应度的最小堆维护前 K 名，档案已满时适应度不超过堆顶的个体
+  连摘要都不用算，直接跳过；新个体挤掉堆顶（当前最差）
+- 存储：旋律按 Packing 的格式存放在预分配的 pitch/beat 矩阵中，不 deepcopy 个体；
+  按下标读取时才还原为个体（默认 creator.Melody）
+- 持久化：给定 path 时，每条新收录的旋律追加写入日志文件，下次用同一个 path 创建
+  档案时重放日志恢复；被挤出档案的条目不会从日志中删除，日志中的记录数超过
+  COMPACT_FACTOR * maxsize 时自动压缩（只保留当前条目，先写临时文件再 os.replace）。
+  日志尾部不完整的记录（写入时崩溃）会被截掉。
+
+用法:
+    archive = EliteArchive(2000, path="elite.archive")
+    for state in evolve(population, toolbox, CXPB, MUTPB, NGEN, halloffame=archive):
+        ...
+    archive[0], len(archive), archive.packed()
+    archive.close()
+"""
+import hashlib
+import heapq
+import itertools
+import os
+import struct
+
+import numpy as np
+
+from Packing import REST, PackedMelodies, pack_melodies
+from Settings import MELODY_LENGTH, BEAT_UNIT, Notes
+
+MAGIC = b"MPHELITE"
+LOG_VERSION = 1
+COMPACT_FACTOR = 4
+_HEADER = struct.Struct("<8sI")
+_RECORD = struct.Struct("<dbxH")   # 适应度, 调性下标, 音符数；之后是 int16 pitch[n], beat[n]
+
+# 每个调平移到 C 调加上的半音数（带符号：D 调 -2，B 调 -11）。
+# 不能用 KEY_SHIFT[k][0] = (12 - k) % 12：它把非 C 调抬到上一个八度，C 调却不动，
+# 同一旋律的 C 调版本与其它调版本会差 12 个半音
+_TO_C = -np.arange(len(Notes), dtype=np.int16)
+
+
+def _digests(packed):
+    """每行平移到 C 调后的 pitch/beat 内容的 16 字节摘要"""
+    pitch = np.where(packed.pitch == REST, REST,
+                     packed.pitch + _TO_C[packed.keys.astype(np.int64)][:, None])
+    pitch = pitch.astype("<i2")
+    beat = packed.beat.astype("<i2")
+    return [hashlib.blake2b(pitch[i, :n].tobytes() + beat[i, :n].tobytes(),
+                            digest_size=16).digest()
+            for i, n in enumerate(packed.lengths.tolist())]
+
+
+class EliteArchive:
+    """
+    适应度最高的 maxsize 条互不相同的旋律
+
+    path: 持久化日志文件，None 为只在内存中
+    melody_creator: 按下标读取时还原个体的工厂函数 (key, pitch, beat) -> Melody，
+        默认为 Settings.register_types() 注册的 creator.Melody
+    """
+
+    def __init__(self, maxsize, path=None, melody_creator=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.melody_creator = melody_creator
+        self._heap = []                       # (适应度, 序号, 槽位)
+        self._slots = {}                      # 摘要 -> 槽位
+        self._digest = [None] * maxsize       # 槽位 -> 摘要
+        self._free = list(range(maxsize - 1, -1, -1))
+        self._seq = itertools.count()
+        self._order = None                    # 按适应度从高到低排好的槽位（惰性计算）
+        self.fitness = np.full(maxsize, np.nan)
+        self.keys = np.zeros(maxsize, dtype=np.int8)
+        self.lengths = np.zeros(maxsize, dtype=np.int16)
+        self.pitch = np.full((maxsize, MELODY_LENGTH // BEAT_UNIT), REST, dtype=np.int16)
+        self.beat = np.zeros_like(self.pitch)
+        self._log = None
+        self._logged = 0
+        if path is not None:
+            self._open_log()
+
+    # ----------------- 持久化 -----------------
+    def _open_log(self):
+        records = 0
+        if os.path.exists(self.path):
+            records = self._replay()
+        if records > COMPACT_FACTOR * self.maxsize:
+            self.compact()
+            return
+        new = not os.path.exists(self.path)
+        self._log = open(self.path, "ab")
+        if new:
+            self._log.write(_HEADER.pack(MAGIC, LOG_VERSION))
+            self._log.flush()
+        self._logged = records
+
+    def _replay(self):
+        """重放日志，返回完整记录的条数；截掉尾部不完整的记录"""
+        with open(self.path, "rb") as f:
+            data = f.read()
+        if len(data) < _HEADER.size:
+            good = 0
+        else:
+            magic, version = _HEADER.unpack_from(data)
+            if magic != MAGIC or version != LOG_VERSION:
+                raise ValueError(f"{self.path} 不是精英档案日志（或版本不支持）")
+            good = _HEADER.size
+        entries = []
+        while good:
+            if good + _RECORD.size > len(data):
+                break
+            fitness, key, n = _RECORD.unpack_from(data, good)
+            end = good + _RECORD.size + 4 * n
+            if end > len(data):
+                break
+            notes = np.frombuffer(data, dtype="<i2", count=2 * n, offset=good + _RECORD.size)
+            entries.append((fitness, key, notes[:n], notes[n:]))
+            good = end
+        if good != len(data):
+            with open(self.path, "r+b") as f:
+                f.truncate(good)
+        if entries:
+            packed = _pack_entries(entries)
+            self._insert_packed(packed, np.array([e[0] for e in entries]), log=False)
+        return len(entries)
+
+    def _append(self, slots):
+        if self._log is None or not slots:
+            return
+        chunks = []
+        for s in slots:
+            n = int(self.lengths[s])
+            chunks.append(_RECORD.pack(float(self.fitness[s]), int(self.keys[s]), n))
+            chunks.append(self.pitch[s, :n].astype("<i2").tobytes())
+            chunks.append(self.beat[s, :n].astype("<i2").tobytes())
+        self._log.write(b"".join(chunks))
+        self._log.flush()
+        self._logged += len(slots)
+        if self._logged > COMPACT_FACTOR * self.maxsize:
+            self.compact()
+
+    def compact(self):
+        """把日志重写为只包含当前条目（原子替换）"""
+        if self.path is None:
+            return
+        if self._log is not None:
+            self._log.close()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            self._log = f
+            f.write(_HEADER.pack(MAGIC, LOG_VERSION))
+            slots = self._sorted_slots()
+            self._logged = 0
+            self._append(slots)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._log = open(self.path, "ab")
+        self._logged = len(slots)
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ----------------- 收录 -----------------
+    def update(self, population):
+        """与 HallOfFame.update 相同：收录 population 中够格且不重复的个体"""
+        threshold = self._heap[0][0] if len(self._heap) == self.maxsize else -np.inf
+        candidates = [ind for ind in population
+                      if ind.fitness.valid and ind.fitness.values[0] > threshold]
+        if not candidates:
+            return
+        fitness = np.array([ind.fitness.values[0] for ind in candidates])
+        self._insert_packed(pack_melodies(candidates), fitness)
+
+    def insert(self, item):
+        """收录一个个体（不重复时）"""
+        self.update([item])
+
+    def _insert_packed(self, packed, fitness, log=True):
+        added = []
+        order = np.argsort(-fitness, kind="stable")   # 同一批中先收录好的，重复时保留它
+        digests = _digests(packed)
+        for i in order.tolist():
+            fit = float(fitness[i])
+            full = len(self._heap) == self.maxsize
+            if full and fit <= self._heap[0][0]:
+                break
+            digest = digests[i]
+            if digest in self._slots:
+                continue
+            if full:
+                _, _, slot = heapq.heappop(self._heap)
+                del self._slots[self._digest[slot]]
+                if slot in added:
+                    added.remove(slot)
+            else:
+                slot = self._free.pop()
+            self._store(slot, packed, i, fit)
+            self._slots[digest] = slot
+            self._digest[slot] = digest
+            heapq.heappush(self._heap, (fit, next(self._seq), slot))
+            added.append(slot)
+        if added:
+            self._order = None
+            if log:
+                self._append(added)
+
+    def _store(self, slot, packed, i, fit):
+        n = int(packed.lengths[i])
+        if n > self.pitch.shape[1]:
+            extra = n - self.pitch.shape[1]
+            self.pitch = np.pad(self.pitch, ((0, 0), (0, extra)), constant_values=REST)
+            self.beat = np.pad(self.beat, ((0, 0), (0, extra)))
+        self.pitch[slot] = REST
+        self.beat[slot] = 0
+        self.pitch[slot, :n] = packed.pitch[i, :n]
+        self.beat[slot, :n] = packed.beat[i, :n]
+        self.lengths[slot] = n
+        self.keys[slot] = packed.keys[i]
+        self.fitness[slot] = fit
+
+    # ----------------- 读取 -----------------
+    def _sorted_slots(self):
+        if self._order is None:
+            slots = np.array([slot for _, _, slot in self._heap], dtype=np.int64)
+            self._order = slots[np.argsort(-self.fitness[slots], kind="stable")].tolist()
+        return self._order
+
+    def packed(self):
+        """按适应度从高到低打包的 (PackedMelodies, fitness) 副本"""
+        slots = self._sorted_slots()
+        width = max(int(self.lengths[slots].max()), 1) if slots else 0
+        packed = PackedMelodies(self.keys[slots], self.pitch[slots, :width],
+                                self.beat[slots, :width], self.lengths[slots])
+        return packed, self.fitness[slots]
+
+    def _individual(self, slot):
+        creator = self.melody_creator
+        if creator is None:
+            from Settings import register_types
+            creator = self.melody_creator = register_types()
+        n = int(self.lengths[slot])
+        pitch = [None if p == REST else p for p in self.pitch[slot, :n].tolist()]
+        ind = creator(Notes[self.keys[slot]], pitch, self.beat[slot, :n].tolist())
+        ind.fitness.values = (float(self.fitness[slot]),)
+        return ind
+
+    def __getitem__(self, i):
+        slots = self._sorted_slots()
+        if isinstance(i, slice):
+            return [self._individual(s) for s in slots[i]]
+        return self._individual(slots[i])
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __iter__(self):
+        return (self._individual(s) for s in self._sorted_slots())
+
+    def __contains__(self, individual):
+        return _digests(pack_melodies([individual]))[0] in self._slots
+
+    def clear(self):
+        """清空档案（日志文件不受影响）"""
+        self._heap = []
+        self._slots = {}
+        self._digest = [None] * self.maxsize
+        self._free = list(range(self.maxsize - 1, -1, -1))
+        self._order = None
+        self.fitness[:] = np.nan
+
+    def __str__(self):
+        return str(list(self))
+
+
+def _pack_entries(entries):
+    """日志记录 [(fitness, key, pitch, beat), ...] 打包为 PackedMelodies"""
+    n = len(entries)
+    width = max(len(e[2]) for e in entries)
+    pitch = np.full((n, width), REST, dtype=np.int16)
+    beat = np.zeros((n, width), dtype=np.int16)
+    for i, (_, _, p, b) in enumerate(entries):
+        pitch[i, :len(p)] = p
+        beat[i, :len(b)] = b
+    keys = np.array([e[1] for e in entries], dtype=np.int8)
+    lengths = np.array([len(e[2]) for e in entries], dtype=np.int16)
+    return PackedMelodies(keys, pitch, beat, lengths)
+
+
+__all__ = ['EliteArchive', 'COMPACT_FACTOR']
@@ -0,0 +1,178 @@
+"""
+进化主循环模块
+
+与 deap.algorithms.eaSimple 流程一致，区别在于杂交与变异也通过 toolbox.map
+分发，因此注册了进程池 map（见 Parallel 模块）后评估、杂交、变异都能并行。
+哪些个体参与杂交/变异由主进程的随机数决定，结果与进程数无关。
+
+evolve 是逐代 yield 的生成器，调用方可以实时获取每代结果、提前停止或保存检查点；
+ea_simple 在其上包装出与 eaSimple 相同的一次性接口。
+deap.tools 与 asyncio 在用到时才导入，导入本模块本身很快。
+"""
+import contextlib
+import random
+from functools import partial
+
+
+_NO_TIMER = contextlib.nullcontext()
+
+
+def _timed(toolbox, phase):
+    """toolbox 上挂了 Profiling.Profiler 时为该阶段计时，否则什么也不做"""
+    profiler = getattr(toolbox, "profiler", None)
+    return _NO_TIMER if profiler is None else profiler.timer(phase)
+
+
+def _mate_pair(mate, pair):
+    return mate(*pair)
+
+
+def var_and(population, toolbox, cxpb, mutpb):
+    """
+    对应 deap.algorithms.varAnd：先两两杂交，再逐个变异
+
+    返回新的后代列表，被修改过的个体适应度已失效。
+    """
+    offspring = [toolbox.clone(ind) for ind in population]
+
+    # 杂交；注册了 toolbox.mate_population 时整批杂交（见 BatchCrossover）
+    mate_idx = [i for i in range(1, len(offspring), 2) if random.random() < cxpb]
+    pairs = [(offspring[i - 1], offspring[i]) for i in mate_idx]
+    with _timed(toolbox, "mate"):
+        if hasattr(toolbox, "mate_population"):
+            children = toolbox.mate_population(pairs)
+        else:
+            children = toolbox.map(partial(_mate_pair, toolbox.mate), pairs)
+    for i, (child1, child2) in zip(mate_idx, children):
+        del child1.fitness.values, child2.fitness.values
+        offspring[i - 1], offspring[i] = child1, child2
+
+    # 变异；注册了 toolbox.mutate_population 时整批变异（见 BatchMutations）
+    mut_idx = [i for i in range(len(offspring)) if random.random() < mutpb]
+    mutants = [offspring[i] for i in mut_idx]
+    with _timed(toolbox, "mutate"):
+        if hasattr(toolbox, "mutate_population"):
+            toolbox.mutate_population(mutants)
+            mutants = [(mutant,) for mutant in mutants]
+        else:
+            mutants = toolbox.map(toolbox.mutate, mutants)
+    for i, (mutant,) in zip(mut_idx, mutants):
+        del mutant.fitness.values
+        offspring[i] = mutant
+
+    return offspring
+
+
+def evaluate_invalid(population, toolbox):
+    """评估适应度失效的个体，返回评估个数"""
+    invalid_ind = [ind for ind in population if not ind.fitness.valid]
+    with _timed(toolbox, "evaluate"):
+        fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
+    for ind, fit in zip(invalid_ind, fitnesses):
+        ind.fitness.values = fit
+    return len(invalid_ind)
+
+
+class GenerationState:
+    """evolve 每代产出的快照"""
+
+    def __init__(self, gen, population, halloffame, logbook, record, nevals):
+        self.gen = gen
+        self.population = population    # 当前种群（之后的代会原地替换其内容）
+        self.halloffame = halloffame
+        self.logbook = logbook
+        self.record = record            # 本代的统计结果
+        self.nevals = nevals
+
+    @property
+    def best(self):
+        """名人堂中最好的个体；没有名人堂时取当前种群中最好的个体"""
+        if self.halloffame is not None and len(self.halloffame):
+            return self.halloffame[0]
+        return max(self.population, key=lambda ind: ind.fitness)
+
+
+def evolve(population, toolbox, cxpb, mutpb, ngen=None, stats=None,
+           halloffame=None, logbook=None, start_gen=0):
+    """
+    逐代进行的简单遗传算法（与 eaSimple 流程相同），每完成一代 yield 一个 GenerationState
+
+    调用方可以随时停止迭代（例如适应度停滞时），也可以在两代之间保存检查点。
+    ngen 为 None 时一直进行下去；start_gen > 0 表示从检查点恢复，
+    此时不再重复第 0 代的初始评估记录，population 中已有适应度的个体不会重新评估。
+    """
+    # toolbox 上挂了 Controller 时，每代的杂交 / 变异概率与是否停止都由它决定
+    controller = getattr(toolbox, "controller", None)
+    if logbook is None:
+        from deap import tools
+        logbook = tools.Logbook()
+        logbook.header = ['gen', 'nevals'] + (stats.fields if stats else [])
+
+    def finish(gen, nevals):
+        with _timed(toolbox, "stats"):
+            record = stats.compile(population) if stats else {}
+        profiler = getattr(toolbox, "profiler", None)
+        if profiler is not None:
+            record.update(profiler.end_generation(gen, population))
+        if controller is not None:
+            record.update(controller.end_generation(gen, population, halloffame, nevals))
+        logbook.record(gen=gen, nevals=nevals, **record)
+        return GenerationState(gen, population, halloffame, logbook, record, nevals)
+
+    if start_gen == 0:
+        nevals = evaluate_invalid(population, toolbox)
+        if halloffame is not None:
+            halloffame.update(population)
+        yield finish(0, nevals)
+
+    gen = max(start_gen, 1)
+    while ngen is None or gen <= ngen:
+        if controller is not None:
+            if controller.stop_reason is not None:
+                return
+            cxpb, mutpb = controller.cxpb, controller.mutpb
+        with _timed(toolbox, "select"):
+            offspring = toolbox.select(population, len(population))
+        offspring = var_and(offspring, toolbox, cxpb, mutpb)
+        nevals = evaluate_invalid(offspring, toolbox)
+
+        if halloffame is not None:
+            halloffame.update(offspring)
+        population[:] = offspring
+        yield finish(gen, nevals)
+        gen += 1
+
+
+async def aevolve(*args, **kwargs):
+    """
+    evolve 的异步版本：每一代在默认线程池中计算，不阻塞事件循环
+
+        async for state in aevolve(population, toolbox, 0.7, 0.2, ngen=50):
+            ...
+    """
+    import asyncio
+    loop = asyncio.get_running_loop()
+    generations = evolve(*args, **kwargs)
+    while True:
+        state = await loop.run_in_executor(None, next, generations, None)
+        if state is None:
+            return
+        yield state
+
+
+def ea_simple(population, toolbox, cxpb, mutpb, ngen, stats=None,
+              halloffame=None, verbose=True):
+    """
+    与 deap.algorithms.eaSimple 参数及返回值相同的简单遗传算法
+
+    返回 (population, logbook)
+    """
+    logbook = None
+    for state in evolve(population, toolbox, cxpb, mutpb, ngen, stats, halloffame):
+        logbook = state.logbook
+        if verbose:
+            print(logbook.stream)
+    return population, logbook
+
+
+__all__ = ['var_and', 'evaluate_invalid', 'GenerationState', 'evolve', 'aevolve', 'ea_simple']
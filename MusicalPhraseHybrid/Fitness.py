@@ -0,0 +1,409 @@
+"""
+适应度评估模块
+
+evaluate_melody: 逐个体的标量评估（原 demo.py 中的实现）
+evaluate_population: 把整个种群打包成 NumPy 矩阵后一次性向量化计算所有评分项，
+    结果与 evaluate_melody 在浮点误差范围内一致
+batch_map: 可注册为 toolbox.map，使 eaSimple 每代的适应度评估只需一次调用
+FitnessCache: 按旋律内容缓存适应度，跳过重复个体的评估
+
+NumPy 只在批量评估时才导入，只用 evaluate_melody 的模块（如 DeltaFitness）不必载入它
+"""
+import functools
+import math
+import statistics
+from collections import OrderedDict
+
+from Settings import Notes  # 需要引用 Notes 来确定调性主音索引
+
+# 音程(半音数) -> 跳跃代价
+JUMP_LIST = [0, 1.0, 1.0, 1.5, 3.0, 4.0, 6.0, 6.0, 8.0, 8.0, 8.0, 8.0]
+JUMP_OUT_OF_RANGE = 20.0
+# 调内音级 -> 稳定度
+STABLE_LIST = [10.0, -30.0, 4.0, -30.0, 5.0, 1.0, -30.0, 8.0, -30.0, 3.0, -30.0, 0.0]
+
+
+def evaluate_melody(melody):
+    """
+    空拍现在还没加，我暂时认为作为“None”存在pitch列表中了
+    """
+    if not melody.pitch or not melody.beat:
+        return (0,)
+
+    score = 0.0
+    pitches = melody.pitch
+    beats = melody.beat
+    key = melody.key
+
+    if key not in Notes:
+        offset = 0 
+    else:
+        offset = Notes.index(key)
+    normalized_noNone = []
+    normalized = []
+    for p in pitches:
+        if p is None:
+            normalized.append(None)
+        else:
+            normalized.append((p - offset) % 12)
+    for i in range(len(normalized)): # normalized:
+        normalized_noNone.append(normalized[i])
+        if normalized[i] is None:
+            if i==0:
+                normalized_noNone[-1] = 0  # 空拍开头用主音代替计算
+            else:
+                normalized_noNone[-1] = normalized_noNone[-2]  # 空拍用前一个音代替计算
+    
+    # 音区范围
+    pitch_range = max(normalized_noNone) - min(normalized_noNone)
+    if pitch_range > 24:
+        score -= (pitch_range - 18) ** 2
+    else:
+        score += (pitch_range)
+
+    # 不要太跳跃也不要太无聊
+    jump = []
+
+    for i in range(len(normalized_noNone) - 1):
+        interval = abs(normalized_noNone[i+1] - normalized_noNone[i])
+        if interval < len(JUMP_LIST):
+            jump.append(JUMP_LIST[interval])
+        else:
+            jump.append(JUMP_OUT_OF_RANGE)
+        
+    score -= ((sum(jump) - 20.0)/math.sqrt(len(jump))) ** 2
+    score -= statistics.stdev(jump) ** 2
+
+    # 总音符数在一个范围内
+    note_count = len([p for p in pitches if p is not None])
+    if note_count < 16:
+        score -= (16 - note_count) ** 2
+    elif note_count > 48:
+        score -= (note_count - 48) ** 2
+    else:
+        score += note_count * 2.0
+    
+    # 总pause时长在一个范围内
+    pause_duration = sum([beats[i] for i in range(len(pitches)) if pitches[i] is None])
+    if pause_duration < 24:
+        score -= (24 - pause_duration) ** 2
+    elif pause_duration > 96:
+        score -= (pause_duration - 96) ** 2
+    else:
+        score += (96 - pause_duration) * 0.5
+
+    # 连唱超过3个音符奖励，但连唱超过一小节惩罚
+    consec_count = 0
+    consec_duration = 0.0
+    for i in range(len(pitches)):
+        if pitches[i] is not None:
+            consec_count +=1
+            consec_duration += beats[i]
+        else:
+            if consec_count >=4:
+                score += (consec_count -3) *5.0
+            if consec_duration > 48.0:
+                score -= ((consec_duration - 48.0) * 0.2) **2
+            consec_count =0
+            consec_duration = 0.0
+
+    # 连续pause超过两拍，惩罚
+    pause_duration = 0
+    for i in range(len(pitches)):
+        if pitches[i] is None:
+            pause_duration += beats[i]
+        else:
+            if pause_duration >= 24.0:
+                score -= ((pause_duration -24.0) * 0.2) ** 2.0
+            pause_duration =0
+    # 长停留音应较稳定
+    for i in range(len(normalized)):
+        if normalized[i] is None:
+            continue
+        if beats[i] >= 24.0:
+            score += STABLE_LIST[normalized[i] % 12] * (beats[i] / 6.0)
+        elif STABLE_LIST[normalized[i] % 12] < 0:
+            score += STABLE_LIST[normalized[i] % 12] * (beats[i] / 6.0)
+    
+    # 奖励结尾落在主\属音上
+    if normalized_noNone[-1] == 0:
+        score += 10.0
+    elif normalized_noNone[-1] == 7:
+        score += 5.0
+
+    # 奖励结尾为长音
+    if beats[-1] >= 12.0:
+        score += 10.0
+
+    # 奖励每两个小节结尾为空拍
+
+    sum_beats=0.0
+    for i in range(len(normalized)):
+        if sum_beats + beats[i] >= 96.0 and sum_beats < 96.0 or sum_beats + beats[i] >= 192.0 and sum_beats < 192.0:
+            if normalized[i] is None:
+                score += 20.0
+        sum_beats += beats[i]
+
+    # 奖励不同小节的节奏相似性
+    # todo
+
+    # 奖励不同小节具有相同的前缀节奏和旋律
+    # todo
+
+
+    return (score,)
+
+
+# ----------------- 批量向量化评估 -----------------
+TERM_NAMES = (
+    'range', 'jump', 'note_count', 'pause', 'legato',
+    'long_rest', 'stable', 'cadence', 'bar_rest',
+)
+
+
+def _prev_at(cum, mask):
+    """cum 为按行单调不减的累加量；返回每个位置之前最近一个 mask 位置上的 cum 值（没有则为0）"""
+    import numpy as np
+    last = np.maximum.accumulate(np.where(mask, cum, 0), axis=1)
+    prev = np.zeros_like(last)
+    prev[:, 1:] = last[:, :-1]
+    return prev
+
+
+def evaluate_packed_terms(packed):
+    """
+    对 PackedMelodies 向量化计算每个评分项，返回 {项名: (n,) float64 数组}
+
+    各项之和即 evaluate_melody 的得分。少于3个音符的旋律在标量版本中会因
+    求标准差而报错，这里把缺失的跳跃项记为0。
+    """
+    import numpy as np
+    n = len(packed)
+    if n == 0 or packed.width == 0:
+        return {name: np.zeros(n) for name in TERM_NAMES}
+
+    lengths = packed.lengths.astype(np.int64)
+    pitch = packed.pitch.astype(np.int64)
+    beat = packed.beat.astype(np.float64)
+    valid = packed.valid
+    rest = packed.rest
+    note = valid & ~rest
+    cols = np.arange(packed.width)
+    last_idx = np.maximum(lengths - 1, 0)[:, None]
+    terms = {}
+
+    # 调内音级，空拍用前一个音代替，开头的空拍用主音代替
+    normalized = np.where(note, (pitch - packed.keys.astype(np.int64)[:, None]) % 12, 0)
+    last_note = np.maximum.accumulate(np.where(note, cols, -1), axis=1)
+    filled = np.where(last_note >= 0,
+                      np.take_along_axis(normalized, np.maximum(last_note, 0), axis=1), 0)
+
+    # 音区范围
+    pitch_range = (np.where(valid, filled, -1).max(axis=1)
+                   - np.where(valid, filled, 99).min(axis=1)).astype(np.float64)
+    terms['range'] = np.where(pitch_range > 24, -(pitch_range - 18) ** 2, pitch_range)
+
+    # 跳跃：均值项与标准差项
+    interval = np.abs(np.diff(filled, axis=1))
+    jump_valid = valid[:, 1:]
+    jump = np.where(interval < len(JUMP_LIST),
+                    np.array(JUMP_LIST)[np.minimum(interval, len(JUMP_LIST) - 1)], JUMP_OUT_OF_RANGE)
+    jump = np.where(jump_valid, jump, 0.0)
+    m = (lengths - 1).astype(np.float64)
+    jump_sum = jump.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_term = np.where(m > 0, ((jump_sum - 20.0) / np.sqrt(m)) ** 2, 0.0)
+        dev = np.where(jump_valid, jump - (jump_sum / m)[:, None], 0.0)
+        var = np.where(m > 1, (dev ** 2).sum(axis=1) / (m - 1), 0.0)
+    terms['jump'] = -mean_term - var
+
+    # 总音符数
+    note_count = note.sum(axis=1).astype(np.float64)
+    terms['note_count'] = np.select(
+        [note_count < 16, note_count > 48],
+        [-(16 - note_count) ** 2, -(note_count - 48) ** 2],
+        note_count * 2.0)
+
+    # 总pause时长
+    rest_beat = np.where(rest, beat, 0.0)
+    pause_duration = rest_beat.sum(axis=1)
+    terms['pause'] = np.select(
+        [pause_duration < 24, pause_duration > 96],
+        [-(24 - pause_duration) ** 2, -(pause_duration - 96) ** 2],
+        (96 - pause_duration) * 0.5)
+
+    # 连唱：在每个空拍处结算前面一段连续音符
+    note_beat = np.where(note, beat, 0.0)
+    cum_count = np.cumsum(note, axis=1)
+    cum_duration = np.cumsum(note_beat, axis=1)
+    run_count = cum_count - _prev_at(cum_count, rest)
+    run_duration = cum_duration - _prev_at(cum_duration, rest)
+    legato = (np.where(run_count >= 4, (run_count - 3) * 5.0, 0.0)
+              - np.where(run_duration > 48.0, ((run_duration - 48.0) * 0.2) ** 2, 0.0))
+    terms['legato'] = np.where(rest, legato, 0.0).sum(axis=1)
+
+    # 连续pause：在每个音符处结算前面一段连续空拍
+    cum_rest = np.cumsum(rest_beat, axis=1)
+    rest_run = cum_rest - _prev_at(cum_rest, note)
+    long_rest = np.where(rest_run >= 24.0, -((rest_run - 24.0) * 0.2) ** 2.0, 0.0)
+    terms['long_rest'] = np.where(note, long_rest, 0.0).sum(axis=1)
+
+    # 长停留音应较稳定
+    stable = np.array(STABLE_LIST)[normalized]
+    stable = np.where((beat >= 24.0) | (stable < 0), stable * (beat / 6.0), 0.0)
+    terms['stable'] = np.where(note, stable, 0.0).sum(axis=1)
+
+    # 结尾落在主/属音上、结尾为长音
+    last_pitch = np.take_along_axis(filled, last_idx, axis=1)[:, 0]
+    last_beat = np.take_along_axis(beat, last_idx, axis=1)[:, 0]
+    terms['cadence'] = (np.select([last_pitch == 0, last_pitch == 7], [10.0, 5.0], 0.0)
+                        + np.where(last_beat >= 12.0, 10.0, 0.0))
+
+    # 每两个小节结尾为空拍
+    end = np.cumsum(beat, axis=1)
+    start = end - beat
+    boundary = ((end >= 96.0) & (start < 96.0)) | ((end >= 192.0) & (start < 192.0))
+    terms['bar_rest'] = np.where(boundary & rest, 20.0, 0.0).sum(axis=1)
+
+    empty = lengths == 0
+    for name in TERM_NAMES:
+        terms[name] = np.where(empty, 0.0, terms[name])
+    return terms
+
+
+def evaluate_packed(packed):
+    """对 PackedMelodies 批量评估，返回 (n,) float64 得分数组"""
+    terms = evaluate_packed_terms(packed)
+    return sum(terms[name] for name in TERM_NAMES)
+
+
+def evaluate_population(melodies):
+    """
+    批量评估一组旋律
+
+    返回与 map(evaluate_melody, melodies) 相同格式的 [(score,), ...] 列表
+    """
+    melodies = list(melodies)
+    if not melodies:
+        return []
+    from Packing import pack_melodies
+    scores = evaluate_packed(pack_melodies(melodies))
+    return [(s,) for s in scores.tolist()]
+
+
+# 标量评估函数 -> 对应的批量评估函数
+BATCH_EVALUATORS = {evaluate_melody: evaluate_population}
+
+
+def _unwrap(func):
+    """去掉 toolbox.register 包上的无参 partial"""
+    while isinstance(func, functools.partial) and not func.args and not func.keywords:
+        func = func.func
+    return func
+
+
+def batch_map(func, iterable):
+    """
+    可注册为 toolbox.map 的映射函数
+
+    当 func 是有批量实现的评估函数时（见 BATCH_EVALUATORS），整批交给批量版本
+    一次算完；其它函数按普通 map 处理。
+    """
+    func = _unwrap(func)
+    if isinstance(func, FitnessCache):
+        return func.map_with(batch_map, iterable)
+    batch = BATCH_EVALUATORS.get(func)
+    if batch is not None:
+        return batch(iterable)
+    return list(map(func, iterable))
+
+
+# ----------------- 适应度缓存 -----------------
+class FitnessCache:
+    """
+    按旋律内容 (key, pitch, beat) 缓存适应度的 LRU 缓存
+
+    杂交找不到合法切点时会直接返回父代的拷贝，ChangeRhythm 等变异也可能什么都没改，
+    这些与已有个体完全相同的后代直接取缓存结果，不再重新评估。
+    用法：toolbox.register("evaluate", FitnessCache(evaluate_melody))
+    enabled=False 时直接调用原评估函数。
+    """
+
+    def __init__(self, evaluate=evaluate_melody, maxsize=100000, enabled=True):
+        self.evaluate = evaluate
+        self.maxsize = maxsize
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    @staticmethod
+    def content_key(melody):
+        return (melody.key, tuple(melody.pitch), tuple(melody.beat))
+
+    def _store(self, key, value):
+        self._cache[key] = value
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def __call__(self, melody):
+        if not self.enabled:
+            return self.evaluate(melody)
+        key = self.content_key(melody)
+        value = self._cache.get(key)
+        if value is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = self.evaluate(melody)
+        self._store(key, value)
+        return value
+
+    def map_with(self, mapper, melodies):
+        """
+        批量评估：先查缓存，未命中的（批内去重后）交给 mapper(self.evaluate, ...) 一次算完
+
+        mapper 可以是 batch_map 或进程池 map，缓存本身始终留在主进程。
+        """
+        melodies = list(melodies)
+        if not self.enabled:
+            return list(mapper(self.evaluate, melodies))
+        keys = [self.content_key(m) for m in melodies]
+        results = [self._cache.get(k) for k in keys]
+        pending = {}
+        for i, (key, value) in enumerate(zip(keys, results)):
+            if value is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            elif key in pending:
+                self.hits += 1
+            else:
+                pending[key] = i
+        self.misses += len(pending)
+        values = mapper(self.evaluate, [melodies[i] for i in pending.values()])
+        fresh = dict(zip(pending, values))
+        for key, value in fresh.items():
+            self._store(key, value)
+        return [value if value is not None else fresh[key]
+                for key, value in zip(keys, results)]
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def clear(self):
+        self._cache.clear()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+
+__all__ = [
+    'evaluate_melody', 'evaluate_population', 'evaluate_packed',
+    'evaluate_packed_terms', 'batch_map', 'BATCH_EVALUATORS', 'TERM_NAMES',
+    'FitnessCache',
+    'JUMP_LIST', 'STABLE_LIST'
+]
@@ -0,0 +1,157 @@
+"""
+岛屿模型：多个子种群各在一个进程中独立进化，每隔若干代交换最优个体
+
+- 每个岛使用 demo 中注册好的 toolbox 算子，通过 Evolution.evolve 逐代进化
+- 迁移拓扑：ring（第 i 个岛发给第 i+1 个岛）或 full（发给其余所有岛）
+- 迁移时发送的是打包后的 pitch/beat 数组和适应度（见 Packing），而不是 pickle
+  creator.Melody 对象；接收方用它们替换本岛最差的个体
+- 各岛每代的统计通过队列汇总到主进程的同一个 Logbook 中（带 island 字段），
+  表头由 demo.create_stats() 的 fields 得出；demo.USE_FAST_STATS 时为 Stats.ColumnarLogbook
+"""
+import multiprocessing
+import queue
+import random
+
+import numpy as np
+from deap import tools
+
+from Packing import PackedMelodies, pack_melodies, unpack_melodies
+
+TOPOLOGIES = ("ring", "full")
+
+
+def neighbors(index, n_islands, topology="ring"):
+    """第 index 个岛的迁出目标"""
+    if n_islands < 2:
+        return []
+    if topology == "ring":
+        return [(index + 1) % n_islands]
+    if topology == "full":
+        return [j for j in range(n_islands) if j != index]
+    raise ValueError(f"未知拓扑 '{topology}'，可选 {TOPOLOGIES}")
+
+
+def _pack_individuals(individuals):
+    packed = pack_melodies(individuals)
+    fitness = np.array([ind.fitness.values[0] for ind in individuals])
+    return packed.keys, packed.pitch, packed.beat, packed.lengths, fitness
+
+
+def _unpack_individuals(payload, melody_creator):
+    keys, pitch, beat, lengths, fitness = payload
+    individuals = unpack_melodies(PackedMelodies(keys, pitch, beat, lengths), melody_creator)
+    for ind, fit in zip(individuals, fitness.tolist()):
+        ind.fitness.values = (fit,)
+    return individuals
+
+
+def _migrate(population, gen, index, targets, n_sources, inboxes, migrants, melody_creator):
+    """把本岛最好的 migrants 个个体发给 targets，再用收到的个体替换本岛最差的个体"""
+    payload = _pack_individuals(tools.selBest(population, migrants))
+    for target in targets:
+        inboxes[target].put((gen, index, payload))
+
+    immigrants = []
+    for _ in range(n_sources):
+        msg_gen, _, payload = inboxes[index].get()
+        assert msg_gen == gen, "islands out of sync"
+        immigrants += _unpack_individuals(payload, melody_creator)
+
+    worst = sorted(range(len(population)), key=lambda i: population[i].fitness)
+    for i, ind in zip(worst, immigrants):
+        population[i] = ind
+
+
+def _island_main(index, params, inboxes, results):
+    import demo  # 注册 creator 类型与 toolbox 算子
+    from Evolution import evolve
+
+    random.seed(params["seed"] + index)
+    np.random.seed((params["seed"] + index) % 2**32)
+
+    n_islands, topology = params["n_islands"], params["topology"]
+    targets = neighbors(index, n_islands, topology)
+    n_sources = sum(index in neighbors(j, n_islands, topology) for j in range(n_islands))
+    interval, ngen = params["migration_interval"], params["ngen"]
+
+    population = demo.toolbox.population(n=params["island_size"])
+    hof = tools.HallOfFame(params["hof_size"])
+    for state in evolve(population, demo.toolbox, params["cxpb"], params["mutpb"], ngen,
+                        stats=demo.create_stats(), halloffame=hof):
+        results.put(("record", index, dict(gen=state.gen, island=index,
+                                           nevals=state.nevals, **state.record)))
+        if interval and targets and 0 < state.gen < ngen and state.gen % interval == 0:
+            _migrate(population, state.gen, index, targets, n_sources, inboxes,
+                     params["migrants"], demo.Get_Melody_Creator)
+
+    results.put(("best", index, _pack_individuals(list(hof))))
+
+
+def _island_logbook(demo):
+    """汇总各岛统计的 logbook：表头与各岛使用的统计一致"""
+    header = ['gen', 'island', 'nevals'] + demo.create_stats().fields
+    if demo.USE_FAST_STATS:
+        from Stats import ColumnarLogbook
+        return ColumnarLogbook(header)
+    logbook = tools.Logbook()
+    logbook.header = header
+    return logbook
+
+
+def run_islands(n_islands=4, island_size=200, ngen=50, cxpb=0.7, mutpb=0.2,
+                migration_interval=5, migrants=5, topology="ring", seed=0,
+                hof_size=1, verbose=True):
+    """
+    运行岛屿模型
+
+    返回 (logbook, best)：logbook 按 (gen, island) 排序，包含各岛每代的统计；
+    best 为所有岛名人堂合并后按适应度从高到低排列的个体列表
+    """
+    import demo  # 主进程也需要 creator 类型来还原个体
+    neighbors(0, n_islands, topology)  # 提前检查拓扑名
+
+    params = dict(n_islands=n_islands, island_size=island_size, ngen=ngen, cxpb=cxpb,
+                  mutpb=mutpb, migration_interval=migration_interval, migrants=migrants,
+                  topology=topology, seed=seed, hof_size=hof_size)
+    ctx = multiprocessing.get_context()
+    inboxes = [ctx.Queue() for _ in range(n_islands)]
+    results = ctx.Queue()
+    processes = [ctx.Process(target=_island_main, args=(i, params, inboxes, results))
+                 for i in range(n_islands)]
+    for p in processes:
+        p.start()
+
+    records, best = [], []
+    logbook = _island_logbook(demo)
+    try:
+        finished = 0
+        while finished < n_islands:
+            try:
+                kind, index, payload = results.get(timeout=1.0)
+            except queue.Empty:
+                failed = [i for i, p in enumerate(processes) if p.exitcode not in (None, 0)]
+                if failed:
+                    raise RuntimeError(f"岛 {failed} 的进程异常退出")
+                continue
+            if kind == "record":
+                records.append(payload)
+                if verbose:
+                    logbook.record(**payload)
+                    print(logbook.stream)
+            else:
+                best += _unpack_individuals(payload, demo.Get_Melody_Creator)
+                finished += 1
+    finally:
+        for p in processes:
+            if finished < n_islands:
+                p.terminate()
+            p.join()
+
+    logbook = _island_logbook(demo)
+    for record in sorted(records, key=lambda r: (r["gen"], r["island"])):
+        logbook.record(**record)
+    best.sort(key=lambda ind: ind.fitness, reverse=True)
+    return logbook, best
+
+
+__all__ = ['run_islands', 'neighbors', 'TOPOLOGIES']
@@ -1,33 +1,61 @@
 """
 变异操作模块 (by zcs)
 
-提供8种变异策略，直接操作creator.Melody对象。
+提供8种变异策略，直接操作creator.Melody对象（导入本模块不注册 creator 类型，
+见 Settings.register_types）。
 所有变异都保留原对象的key属性不变。
 所有涉及音高变化的操作都保证在调性内（基于音级而非半音）。
 """
-from Settings import Melody, KEY_SCALE_MAP,Notes
+from Settings import Melody, MelodyBase, KEY_SCALE_MAP,Notes
 import random
-from deap import base, creator, tools, algorithms
+from DeltaFitness import touch, invalidate
 
-creator.create("FitnessMax", base.Fitness, weights=(1.0,))
-creator.create("Melody", Melody, fitness=creator.FitnessMax)
 PITCH_MIN = 0
 PITCH_MAX = 84
 BEAT_UNIT = 6  # 最小时值单位（八分音符）
 
 mutation_strategies = []
+# 变异前调用的钩子 hook(individual, strategy)，供 Profiling 统计各策略；为 None 时不调用
+strategy_hook = None
+# 与 mutation_strategies 一一对应的选择权重，由 Controller 按成功率设置；为 None 时等概率
+strategy_weights = None
+
+
+def _build_scale_pitches(key, pitch_min=PITCH_MIN, pitch_max=PITCH_MAX):
+    scale = KEY_SCALE_MAP[key]
+    return [pitch for pitch in range(pitch_min, pitch_max + 1) if pitch % 12 in scale]
+
+
+# ----------- 每个调性预先算好的查找表（导入时构建一次）-----------
+# SCALE_PITCHES[key]: 音域内所有调内音（升序）
+# SCALE_INDEX[key][p]: 音高 p 在 SCALE_PITCHES[key] 中的下标，调外音取最近的调内音（距离相同取低音）
+# CLOSEST_NOTE[key][n]: 音级 n(0~11) 在 KEY_SCALE_MAP[key] 中最近的音级
+SCALE_PITCHES = {}
+SCALE_INDEX = {}
+CLOSEST_NOTE = {}
+for _key, _scale in KEY_SCALE_MAP.items():
+    _pitches = _build_scale_pitches(_key)
+    SCALE_PITCHES[_key] = tuple(_pitches)
+    SCALE_INDEX[_key] = tuple(
+        min(range(len(_pitches)), key=lambda k: abs(_pitches[k] - p))
+        for p in range(PITCH_MIN, PITCH_MAX + 1)
+    )
+    CLOSEST_NOTE[_key] = tuple(
+        min(_scale, key=lambda x: abs(x - n)) for n in range(12)
+    )
 
 
 def get_scale_pitches(key, pitch_min=PITCH_MIN, pitch_max=PITCH_MAX):
     """获取指定调性在音域范围内的所有有效音高"""
     assert key in KEY_SCALE_MAP,"invalid key"
+    if pitch_min == PITCH_MIN and pitch_max == PITCH_MAX:
+        return list(SCALE_PITCHES[key])
+    return _build_scale_pitches(key, pitch_min, pitch_max)
 
-    scale = KEY_SCALE_MAP[key]
-    valid_pitches = []
-    for pitch in range(pitch_min, pitch_max + 1):
-        if pitch % 12 in scale:
-            valid_pitches.append(pitch)
-    return valid_pitches
+
+def scale_degree(pitch, key):
+    """音高在 SCALE_PITCHES[key] 中的下标，调外音先吸附到最近的调内音"""
+    return SCALE_INDEX[key][max(PITCH_MIN, min(PITCH_MAX, pitch))]
 
 
 def normalize_pitch_to_key(pitch, key):
@@ -35,15 +63,13 @@ def normalize_pitch_to_key(pitch, key):
     if key not in KEY_SCALE_MAP:
         return pitch
 
-    key_scale = KEY_SCALE_MAP[key]
-    note = pitch % 12
-    closest = min(key_scale, key=lambda x: abs(x - note))
+    closest = CLOSEST_NOTE[key][pitch % 12]
     octave = pitch // 12
     new_p = closest + 12 * octave
     return max(PITCH_MIN, min(PITCH_MAX, new_p))
 
 
-def Translation(individual: creator.Melody):
+def Translation(individual: MelodyBase):
     """
     调性归一化变异：将所有调外音吸附到最近的调内音
 
@@ -60,12 +86,13 @@ def Translation(individual: creator.Melody):
         else:
             new_pitch.append(normalize_pitch_to_key(i+l, key))
     individual.pitch = new_pitch
+    invalidate(individual)
     return individual
 
 
 mutation_strategies.append(Translation)
 
-def Inversion(individual: creator.Melody):
+def Inversion(individual: MelodyBase):
     """
     倒影变异：以第一个音为轴，将音程关系上下翻转（基于音级）
 
@@ -77,9 +104,7 @@ def Inversion(individual: creator.Melody):
         return individual
 
     key = individual.key
-    scale_pitches = get_scale_pitches(key)
-    if not scale_pitches:
-        return individual
+    scale_pitches = SCALE_PITCHES[key]
 
     # 找到第一个非休止符的音作为轴
     axis = None
@@ -94,13 +119,8 @@ def Inversion(individual: creator.Melody):
     if axis is None:
         return individual
 
-    # 找到轴音在调内音阶中的位置
-    if axis in scale_pitches:
-        axis_idx = scale_pitches.index(axis)
-    else:
-        # 如果轴音是调外音，先吸附到调内
-        axis = min(scale_pitches, key=lambda x: abs(x - axis))
-        axis_idx = scale_pitches.index(axis)
+    # 找到轴音在调内音阶中的位置（调外音先吸附到调内）
+    axis_idx = scale_degree(axis, key)
 
     new_pitch = individual.pitch[:]
 
@@ -113,11 +133,7 @@ def Inversion(individual: creator.Melody):
             continue
 
         # 找到当前音在调内音阶的位置
-        if current in scale_pitches:
-            current_idx = scale_pitches.index(current)
-        else:
-            current = min(scale_pitches, key=lambda x: abs(x - current))
-            current_idx = scale_pitches.index(current)
+        current_idx = scale_degree(current, key)
 
         # 计算音级间隔并倒影
         interval = current_idx - axis_idx
@@ -127,22 +143,24 @@ def Inversion(individual: creator.Melody):
         new_pitch[i] = scale_pitches[new_idx]
 
     individual.pitch = new_pitch
+    invalidate(individual)
     return individual
 
 mutation_strategies.append(Inversion)
 
 
-def Retrograde(individual: creator.Melody):
+def Retrograde(individual: MelodyBase):
     """逆行变异：将旋律倒序播放"""
     individual.pitch = individual.pitch[::-1]
     individual.beat = individual.beat[::-1]
+    invalidate(individual)
     return individual
 
 
 mutation_strategies.append(Retrograde)
 
 
-def ChangePitch(individual: creator.Melody):
+def ChangePitch(individual: MelodyBase):
     """
     音高微调：随机选择一个音符，在调内上下移动1~2个音级
 
@@ -160,22 +178,11 @@ def ChangePitch(individual: creator.Melody):
         return individual
 
     key = individual.key
-    scale_pitches = get_scale_pitches(key)
-
-    if len(scale_pitches) == 0:
-        return individual
+    scale_pitches = SCALE_PITCHES[key]
 
     # 随机选择一个非休止符的索引
     idx = random.choice(non_rest_indices)
-    current_pitch = individual.pitch[idx]
-
-    if current_pitch not in scale_pitches:
-        current_pitch = min(scale_pitches, key=lambda x: abs(x - current_pitch))
-
-    try:
-        scale_idx = scale_pitches.index(current_pitch)
-    except ValueError:
-        return individual
+    scale_idx = scale_degree(individual.pitch[idx], key)
 
     # 在调内移动±1~2个音级
     delta = random.choice([-2, -1, 1, 2])
@@ -183,13 +190,14 @@ def ChangePitch(individual: creator.Melody):
     new_scale_idx = max(0, min(len(scale_pitches) - 1, new_scale_idx))
 
     individual.pitch[idx] = scale_pitches[new_scale_idx]
+    touch(individual, idx, idx + 1, idx + 1)
     return individual
 
 
 mutation_strategies.append(ChangePitch)
 
 
-def ChangeRhythm(individual: creator.Melody):
+def ChangeRhythm(individual: MelodyBase):
     """节奏微调：相邻音符间转移时值，保持总时值不变"""
     if len(individual.beat) < 2:
         return individual
@@ -198,17 +206,19 @@ def ChangeRhythm(individual: creator.Melody):
         if individual.beat[idx] > BEAT_UNIT:
             individual.beat[idx] -= BEAT_UNIT
             individual.beat[idx + 1] += BEAT_UNIT
+            touch(individual, idx, idx + 2, idx + 2)
     else:
         if individual.beat[idx + 1] > BEAT_UNIT:
             individual.beat[idx + 1] -= BEAT_UNIT
             individual.beat[idx] += BEAT_UNIT
+            touch(individual, idx, idx + 2, idx + 2)
     return individual
 
 
 mutation_strategies.append(ChangeRhythm)
 
 
-def SplitNote(individual: creator.Melody):
+def SplitNote(individual: MelodyBase):
     """
     音符分裂：将一个音符分裂成两个，时值平分
     新音符在调内上下移动0~1个音级
@@ -218,7 +228,7 @@ def SplitNote(individual: creator.Melody):
         return individual
 
     key = individual.key
-    scale_pitches = get_scale_pitches(key)
+    scale_pitches = SCALE_PITCHES[key]
 
     idx = random.randint(0, len(individual.pitch) - 1)
     if individual.beat[idx] >= 2 * BEAT_UNIT:
@@ -239,11 +249,7 @@ def SplitNote(individual: creator.Melody):
                 individual.beat.insert(idx + 1, other_half)
             else:
                 # 原音符不是休止符
-                if old_pitch in scale_pitches:
-                    scale_idx = scale_pitches.index(old_pitch)
-                else:
-                    old_pitch = min(scale_pitches, key=lambda x: abs(x - old_pitch))
-                    scale_idx = scale_pitches.index(old_pitch)
+                scale_idx = scale_degree(old_pitch, key)
 
                 # 新音符在调内移动0或±1音级
                 delta = random.choice([-1, 0, 0, 0, 1])
@@ -254,6 +260,7 @@ def SplitNote(individual: creator.Melody):
                 individual.beat[idx] = half_beat
                 individual.pitch.insert(idx + 1, new_pitch)
                 individual.beat.insert(idx + 1, other_half)
+            touch(individual, idx, idx + 1, idx + 2)
 
     return individual
 
@@ -261,7 +268,7 @@ def SplitNote(individual: creator.Melody):
 mutation_strategies.append(SplitNote)
 
 
-def MergeNotes(individual: creator.Melody):
+def MergeNotes(individual: MelodyBase):
     """音符合并：将相邻两个音符合并，时值相加
     如果两个音符中有一个是休止符，则合并后的音符为另一个音符。
     如果两个音符都是休止符，则合并后的音符仍为休止符。
@@ -292,13 +299,14 @@ def MergeNotes(individual: creator.Melody):
     individual.pitch[idx] = merged_pitch
     individual.pitch.pop(idx + 1)
     individual.beat.pop(idx + 1)
+    touch(individual, idx, idx + 2, idx + 1)
     return individual
 
 
 mutation_strategies.append(MergeNotes)
 
 
-def melody_mutation(individual: creator.Melody, indpb=0.1):
+def melody_mutation(individual: MelodyBase, indpb=0.1):
     """
     变异入口函数
 
@@ -307,7 +315,12 @@ def melody_mutation(individual: creator.Melody, indpb=0.1):
     返回格式符合DEAP要求：(individual,)
     """
     if random.random()<indpb:
-        strategy = random.choice(mutation_strategies)
+        if strategy_weights is None:
+            strategy = random.choice(mutation_strategies)
+        else:
+            strategy = random.choices(mutation_strategies, strategy_weights)[0]
+        if strategy_hook is not None:
+            strategy_hook(individual, strategy)
         individual = strategy(individual)
-    assert isinstance(individual, creator.Melody), "Invalid Mutational Function"
+    assert isinstance(individual, MelodyBase), "Invalid Mutational Function"
     return (individual,)
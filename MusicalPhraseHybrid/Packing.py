@@ -0,0 +1,103 @@
+"""
+种群打包模块
+
+把一组 Melody（变长的 pitch/beat 列表）打包成定长补齐的 NumPy 矩阵，
+供批量评估等向量化计算使用：
+    pitch : (n, W) int16，空拍与补齐位置为 REST
+    beat  : (n, W) int16，补齐位置为 0
+    lengths : (n,) 每条旋律的真实音符数
+    keys  : (n,) 调性在 Notes 中的下标
+"""
+import numpy as np
+from Settings import Notes
+
+REST = -1  # pitch 矩阵中代表空拍(None)的哨兵值
+
+KEY_INDEX = {k: i for i, k in enumerate(Notes)}
+
+
+class PackedMelodies:
+    """打包后的种群，按行对应原种群中的个体"""
+
+    def __init__(self, keys, pitch, beat, lengths):
+        self.keys = keys
+        self.pitch = pitch
+        self.beat = beat
+        self.lengths = lengths
+
+    def __len__(self):
+        return len(self.lengths)
+
+    @property
+    def width(self):
+        return self.pitch.shape[1]
+
+    @property
+    def valid(self):
+        """(n, W) 布尔矩阵：该位置是否为真实音符（含空拍）"""
+        return np.arange(self.width)[None, :] < self.lengths[:, None]
+
+    @property
+    def rest(self):
+        """(n, W) 布尔矩阵：该位置是否为空拍"""
+        return (self.pitch == REST) & self.valid
+
+
+def pack_melodies(melodies, width=None):
+    """
+    将旋律列表打包为 PackedMelodies
+
+    参数:
+        melodies: 具有 key/pitch/beat 属性的对象序列
+        width: 矩阵列数，默认取最长旋律的长度
+    """
+    n = len(melodies)
+    lengths = np.fromiter((len(m.pitch) for m in melodies), dtype=np.int16, count=n)
+    if width is None:
+        width = int(lengths.max()) if n else 0
+    keys = np.fromiter((KEY_INDEX.get(m.key, 0) for m in melodies), dtype=np.int8, count=n)
+
+    flat_pitch = [REST if p is None else p for m in melodies for p in m.pitch]
+    flat_beat = [b for m in melodies for b in m.beat]
+    mask = np.arange(width)[None, :] < lengths[:, None]
+
+    pitch = np.full((n, width), REST, dtype=np.int16)
+    beat = np.zeros((n, width), dtype=np.int16)
+    pitch[mask] = flat_pitch
+    beat[mask] = flat_beat
+    return PackedMelodies(keys, pitch, beat, lengths)
+
+
+def unpack_row(packed, i):
+    """取出第 i 行，返回 (key, pitch_list, beat_list)"""
+    n = int(packed.lengths[i])
+    pitch = [None if p == REST else p for p in packed.pitch[i, :n].tolist()]
+    beat = packed.beat[i, :n].tolist()
+    return Notes[packed.keys[i]], pitch, beat
+
+
+def unpack_rows(packed):
+    """逐行产生 (key, pitch_list, beat_list)，整块转换比逐行 unpack_row 快"""
+    pitch_rows = packed.pitch.tolist()
+    beat_rows = packed.beat.tolist()
+    for key, n, pitch, beat in zip(packed.keys.tolist(), packed.lengths.tolist(),
+                                   pitch_rows, beat_rows):
+        pitch = pitch[:n]
+        if REST in pitch:
+            pitch = [None if p == REST else p for p in pitch]
+        yield Notes[key], pitch, beat[:n]
+
+
+def unpack_melodies(packed, melody_creator):
+    """
+    将 PackedMelodies 还原为 Melody 对象列表
+
+    melody_creator: 签名为 (key, pitch, beat) -> Melody 的工厂函数
+    """
+    return [melody_creator(*row) for row in unpack_rows(packed)]
+
+
+__all__ = [
+    'REST', 'KEY_INDEX', 'PackedMelodies',
+    'pack_melodies', 'unpack_row', 'unpack_rows', 'unpack_melodies'
+]
@@ -0,0 +1,89 @@
+"""
+多进程并行模块
+
+ProcessPoolMap 可注册为 toolbox.map，把评估、杂交、变异分块提交到进程池。
+- 子进程启动时调用一次 Settings.register_types，注册 creator.FitnessMax / creator.Melody
+- DEAP 默认把 creator 类型按值 pickle，每次反序列化都会重新 creator.create
+  一个同名新类，导致 isinstance(ind, creator.Melody) 失败；这里改为按名字传递，
+  由接收方进程中已注册的同名类型还原
+- 每个分块携带一个由主进程随机数生成的种子，子进程执行前用它重置 random，
+  因此只要分块大小固定，结果与进程数、调度顺序无关，可复现
+"""
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.reduction import ForkingPickler
+
+from deap import creator
+
+from Fitness import FitnessCache, batch_map, _unwrap
+from Settings import register_types
+
+DEFAULT_CHUNKSIZE = 256
+
+
+def _creator_class(name):
+    return getattr(creator, name)
+
+
+def _reduce_creator_class(cls):
+    return _creator_class, (cls.__name__,)
+
+
+ForkingPickler.register(creator.MetaCreator, _reduce_creator_class)
+
+
+def _init_worker():
+    register_types()
+
+
+def _run_chunk(func, chunk, seed):
+    random.seed(seed)
+    return batch_map(func, chunk)
+
+
+class ProcessPoolMap:
+    """
+    基于进程池的 map，用法：
+        pool = ProcessPoolMap(processes=32)
+        toolbox.register("map", pool)
+        ...
+        pool.close()
+    """
+
+    def __init__(self, processes=None, chunksize=DEFAULT_CHUNKSIZE):
+        self.processes = processes or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self._executor = ProcessPoolExecutor(max_workers=self.processes,
+                                             initializer=_init_worker)
+
+    def __call__(self, func, iterable):
+        cache = _unwrap(func)
+        if isinstance(cache, FitnessCache):
+            # 缓存留在主进程，只把未命中的个体分发出去
+            return cache.map_with(self, iterable)
+        items = list(iterable)
+        if not items:
+            return []
+        chunks = [items[i:i + self.chunksize]
+                  for i in range(0, len(items), self.chunksize)]
+        seeds = [random.getrandbits(64) for _ in chunks]
+        results = []
+        for part in self._executor.map(_run_chunk, [func] * len(chunks), chunks, seeds):
+            results.extend(part)
+        return results
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getstate__(self):
+        raise TypeError("ProcessPoolMap 不能被传入子进程")
+
+
+__all__ = ['ProcessPoolMap', 'DEFAULT_CHUNKSIZE']
@@ -0,0 +1,188 @@
+"""
+性能与评分剖析模块（默认关闭）
+
+开启后每代记录：
+- timing  : select / mate / mutate / evaluate / stats 各阶段以及整代的耗时（秒）
+- terms   : 种群中 evaluate_melody 各评分项的平均值（见 Fitness.TERM_NAMES）
+- term_corr : 各评分项与总得分的相关系数，用来判断是哪一项在主导选择
+- mutation: 每种变异策略本代被调用的次数与成功率（变异后适应度高于变异前的比例；
+            变异前已经因杂交失效的个体只计次数）
+结果作为 chapter 写进 logbook，同时可以逐代写到 JSON-lines 或 CSV 文件。
+
+用法:
+    profiler = Profiler(sink=open_sink("profile.jsonl"))
+    profiler.attach(toolbox)
+    for state in evolve(...):
+        ...
+    profiler.detach()
+
+关闭时 Evolution 每个阶段只多一次 getattr，Mutations.melody_mutation 每次只多一次
+None 判断。用进程池并行变异时，策略统计发生在子进程中，不会被记录。
+"""
+import csv
+import json
+import time
+from collections import Counter
+
+import numpy as np
+
+import Mutations
+from Fitness import TERM_NAMES, evaluate_packed_terms
+from Packing import pack_melodies
+
+PHASES = ("select", "mate", "mutate", "evaluate", "stats")
+
+
+class _Timer:
+    __slots__ = ("profiler", "phase", "start")
+
+    def __init__(self, profiler, phase):
+        self.profiler = profiler
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.profiler.timing[self.phase] += time.perf_counter() - self.start
+
+
+class Profiler:
+    """
+    逐代收集耗时、评分项与变异策略统计
+
+    sink: 具有 write(record) / close() 的对象（见 JsonlSink、CsvSink），为 None 时只写 logbook
+    terms: 是否统计评分项（需要把整个种群打包一次）
+    """
+
+    def __init__(self, sink=None, terms=True):
+        self.sink = sink
+        self.terms = terms
+        self.timing = Counter()
+        self.calls = Counter()
+        self._pending = []
+        self._toolbox = None
+        self._generation_start = time.perf_counter()
+
+    def timer(self, phase):
+        return _Timer(self, phase)
+
+    def attach(self, toolbox):
+        """挂到 toolbox 上（Evolution 通过 toolbox.profiler 找到它），并接管变异策略钩子"""
+        toolbox.profiler = self
+        Mutations.strategy_hook = self.on_mutation
+        self._toolbox = toolbox
+        self._generation_start = time.perf_counter()
+
+    def detach(self):
+        if self._toolbox is not None:
+            del self._toolbox.profiler
+            self._toolbox = None
+        if Mutations.strategy_hook == self.on_mutation:
+            Mutations.strategy_hook = None
+        if self.sink is not None:
+            self.sink.close()
+
+    def on_mutation(self, individual, strategy):
+        """变异前调用：记下策略与变异前的适应度"""
+        self.calls[strategy.__name__] += 1
+        if individual.fitness.valid:
+            self._pending.append((individual, strategy.__name__, individual.fitness.values[0]))
+
+    def _mutation_record(self):
+        success = Counter()
+        tried = Counter()
+        for individual, name, before in self._pending:
+            if individual.fitness.valid:
+                tried[name] += 1
+                success[name] += individual.fitness.values[0] > before
+        record = {}
+        for strategy in Mutations.mutation_strategies:
+            name = strategy.__name__
+            record[name] = self.calls[name]
+            record[name + "_success"] = success[name] / tried[name] if tried[name] else None
+        return record
+
+    def _term_records(self, population):
+        terms = evaluate_packed_terms(pack_melodies(population))
+        fitness = np.array([ind.fitness.values[0] for ind in population])
+        means, corr = {}, {}
+        for name in TERM_NAMES:
+            values = terms[name]
+            means[name] = float(values.mean())
+            if values.std() > 0 and fitness.std() > 0:
+                corr[name] = float(np.corrcoef(values, fitness)[0, 1])
+            else:
+                corr[name] = 0.0
+        return means, corr
+
+    def end_generation(self, gen, population):
+        """一代结束时调用，返回要并入 logbook 的 chapter，并写入 sink"""
+        now = time.perf_counter()
+        timing = {phase: self.timing[phase] for phase in PHASES}
+        timing["generation"] = now - self._generation_start
+        record = {"timing": timing, "mutation": self._mutation_record()}
+        if self.terms and population:
+            record["terms"], record["term_corr"] = self._term_records(population)
+
+        if self.sink is not None:
+            self.sink.write(dict(gen=gen, **record))
+        self.timing.clear()
+        self.calls.clear()
+        self._pending = []
+        self._generation_start = time.perf_counter()
+        return record
+
+
+def _flatten(record):
+    flat = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            for name, v in value.items():
+                flat[f"{key}.{name}"] = v
+        else:
+            flat[key] = value
+    return flat
+
+
+class JsonlSink:
+    """每代一行 JSON"""
+
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class CsvSink:
+    """每代一行 CSV，列名形如 timing.mate、terms.jump，由第一行记录确定"""
+
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.writer = None
+
+    def write(self, record):
+        flat = _flatten(record)
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.file, fieldnames=list(flat), extrasaction="ignore")
+            self.writer.writeheader()
+        self.writer.writerow(flat)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def open_sink(path):
+    """按扩展名选择 sink：.csv 写 CSV，其它写 JSON-lines"""
+    if path.lower().endswith(".csv"):
+        return CsvSink(path)
+    return JsonlSink(path)
+
+
+__all__ = ['Profiler', 'JsonlSink', 'CsvSink', 'open_sink', 'PHASES']
@@ -0,0 +1,204 @@
+"""
+小节级节奏型池
+
+一条旋律 192 个时值单位 = 4 个小节，每小节 48。把一个小节拆成 VALID_BEATS 中
+时值之和的所有方式（共 114 种）预先枚举出来，每种节奏型记录：
+    beat   : 各音符时值
+    mask   : 起音位图，第 k 位表示小节内时刻 k*BEAT_UNIT 有音符起点（每小节 8 位）
+整条旋律的起音位图是 4 个小节的位图拼起来的 32 位整数。
+
+- 节奏型池在第一次使用时构建，并缓存到磁盘（rhythm_pool.npz），之后直接读取
+- 初始化时每小节抽一个下标即可得到合法节奏，O(1)
+- crossover 的合法切点就是两个父代起音位图的交集，一次按位与即可得到；
+  对打包后的种群可以一次算出所有个体的位图，再用按位与筛选有共同切点的配对对象
+"""
+import os
+
+import numpy as np
+
+from Settings import MELODY_LENGTH, BEAT_UNIT
+from zcs_melody import VALID_BEATS
+
+BAR_LENGTH = 48
+SLOTS_PER_BAR = BAR_LENGTH // BEAT_UNIT
+BARS = MELODY_LENGTH // BAR_LENGTH
+POOL_VERSION = 1
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rhythm_pool.npz")
+
+
+def enumerate_bar_patterns(bar_length=BAR_LENGTH, beats=VALID_BEATS):
+    """按字典序列出把 bar_length 拆成 beats 中时值之和的所有方式"""
+    patterns = []
+
+    def extend(prefix, remaining):
+        if remaining == 0:
+            patterns.append(tuple(prefix))
+            return
+        for b in beats:
+            if b <= remaining:
+                prefix.append(b)
+                extend(prefix, remaining - b)
+                prefix.pop()
+
+    extend([], bar_length)
+    return patterns
+
+
+def onset_mask(beat):
+    """起音位图：第 k 位表示时刻 k*BEAT_UNIT 有音符起点（含 0，不含结尾）"""
+    mask = 0
+    t = 0
+    for b in beat:
+        mask |= 1 << (t // BEAT_UNIT)
+        t += b
+    return mask
+
+
+def shared_onsets_by_mask(mask1, mask2):
+    """
+    两个起音位图的共同切点，结果与 Crossover.shared_onsets 相同
+
+    返回 [(t, i, j), ...]：i / j 是时刻 t 之前 parent1 / parent2 的音符个数，
+    即低于该位的置位数
+    """
+    common = mask1 & mask2 & ~1
+    points = []
+    while common:
+        low = common & -common
+        below = low - 1
+        slot = low.bit_length() - 1
+        points.append((slot * BEAT_UNIT, bin(mask1 & below).count("1"),
+                       bin(mask2 & below).count("1")))
+        common ^= low
+    return points
+
+
+def onset_masks(beat, lengths):
+    """
+    onset_mask 的批量版本：对 (n, W) 的 beat 矩阵（如 PackedMelodies.beat）
+    一次算出每行的起音位图，返回 (n,) uint32
+    """
+    beat = np.asarray(beat, dtype=np.int64)
+    valid = np.arange(beat.shape[1])[None, :] < np.asarray(lengths)[:, None]
+    starts = np.cumsum(beat, axis=1) - beat
+    bits = np.where(valid, np.uint32(1) << (starts // BEAT_UNIT).astype(np.uint32), 0)
+    return np.bitwise_or.reduce(bits.astype(np.uint32), axis=1)
+
+
+def compatible_partners(masks, mask):
+    """masks 中与起音位图 mask 至少有一个共同内部切点的行号（可用来挑选 crossover 对象）"""
+    return np.flatnonzero(masks & np.uint32(int(mask) & ~1))
+
+
+class RhythmPool:
+    """
+    去重、带下标的小节节奏型池
+
+    beat    : (P, SLOTS_PER_BAR) int16，补齐位置为 0
+    lengths : (P,) 每个节奏型的音符数
+    masks   : (P,) 每个节奏型的小节内起音位图
+    """
+
+    def __init__(self, beat, lengths, masks):
+        self.beat = beat
+        self.lengths = lengths
+        self.masks = masks
+
+    def __len__(self):
+        return len(self.lengths)
+
+    @classmethod
+    def build(cls, bar_length=BAR_LENGTH, beats=VALID_BEATS):
+        patterns = enumerate_bar_patterns(bar_length, beats)
+        width = bar_length // BEAT_UNIT
+        beat = np.zeros((len(patterns), width), dtype=np.int16)
+        for i, pattern in enumerate(patterns):
+            beat[i, :len(pattern)] = pattern
+        lengths = np.array([len(p) for p in patterns], dtype=np.int16)
+        masks = np.array([onset_mask(p) for p in patterns], dtype=np.uint32)
+        return cls(beat, lengths, masks)
+
+    def pattern(self, index):
+        return self.beat[index, :self.lengths[index]].tolist()
+
+    def sample(self, n, bars=BARS, rng=None):
+        """为 n 条旋律每小节均匀抽一个节奏型，返回 (n, bars) 下标矩阵"""
+        if rng is None:
+            rng = np.random.default_rng()
+        return rng.integers(0, len(self), size=(n, bars))
+
+    def rhythms(self, indices):
+        """
+        把 (n, bars) 下标矩阵拼成整条旋律的节奏
+
+        返回 (beat, lengths, masks)：beat 为左对齐的 (n, W) 矩阵，补齐为 0；
+        masks 为整条旋律的 32 位起音位图
+        """
+        indices = np.asarray(indices)
+        n, bars = indices.shape
+        lengths = self.lengths[indices].sum(axis=1, dtype=np.int64)
+        width = int(lengths.max()) if n else 0
+
+        # 各小节节奏型按行优先展开后去掉补齐的 0，正好是每行依次拼接的结果
+        bars_beat = self.beat[indices]
+        beat = np.zeros((n, width), dtype=np.int16)
+        beat[np.arange(width)[None, :] < lengths[:, None]] = bars_beat[bars_beat > 0]
+
+        shifts = (np.arange(bars) * SLOTS_PER_BAR).astype(np.uint32)
+        masks = np.bitwise_or.reduce(self.masks[indices] << shifts, axis=1)
+        return beat, lengths.astype(np.int16), masks
+
+    def compatible(self, mask, bar=0):
+        """池中与整条旋律起音位图 mask 在第 bar 小节有共同内部起点的节奏型下标"""
+        bar_mask = (int(mask) >> (bar * SLOTS_PER_BAR)) & ((1 << SLOTS_PER_BAR) - 1)
+        return np.flatnonzero(self.masks & np.uint32(bar_mask & ~1))
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, version=np.array(POOL_VERSION), signature=_signature(),
+                     beat=self.beat, lengths=self.lengths, masks=self.masks)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """读取缓存；版本或时值设置不一致时返回 None"""
+        with np.load(path) as data:
+            if int(data["version"]) != POOL_VERSION or \
+                    not np.array_equal(data["signature"], _signature()):
+                return None
+            return cls(data["beat"], data["lengths"], data["masks"])
+
+
+def _signature():
+    return np.array([BAR_LENGTH, BEAT_UNIT] + list(VALID_BEATS), dtype=np.int64)
+
+
+_POOL = None
+
+
+def get_pool(cache_path=DEFAULT_CACHE_PATH):
+    """返回全局节奏型池：首次调用时从磁盘缓存读取，缓存不存在或过期则重新构建并写回"""
+    global _POOL
+    if _POOL is None:
+        pool = None
+        if cache_path and os.path.exists(cache_path):
+            try:
+                pool = RhythmPool.load(cache_path)
+            except (OSError, ValueError, KeyError):
+                pool = None
+        if pool is None:
+            pool = RhythmPool.build()
+            if cache_path:
+                try:
+                    pool.save(cache_path)
+                except OSError:
+                    pass  # 目录不可写时只在内存中使用
+        _POOL = pool
+    return _POOL
+
+
+__all__ = [
+    'RhythmPool', 'get_pool', 'enumerate_bar_patterns', 'onset_mask', 'onset_masks',
+    'shared_onsets_by_mask', 'compatible_partners', 'BAR_LENGTH', 'SLOTS_PER_BAR', 'BARS'
+]
@@ -0,0 +1,234 @@
+"""
+melodies.txt 的二进制编译缓存
+
+第一次读取配置文件时，把解析结果写到旁边的 <文件名>.seedcache：
+    头部   : 魔数、版本、源文件 mtime / 大小 / blake2b 哈希、旋律条数、音符总数、元数据长度
+    元数据 : config 字典与解析警告汇总（JSON），补齐到 8 字节
+    offsets: (n+1,) int64，第 i 条旋律的音符在 pitch/beat 中占 [offsets[i], offsets[i+1])
+    pitch  : int16，"Pause" 与 parse_melody_string 一样记为 84
+    beat   : int16
+之后的运行直接 mmap 这个文件，不再解析文本；源文件的 mtime 或大小变化时自动重建。
+数组是直接映射文件内容的只读视图，打开缓存的耗时与语料大小无关，
+只有真正取出的旋律才会被读入内存。
+
+用法:
+    seeds = load_seeds("melodies.txt")
+    seeds.config, len(seeds), seeds.melody(0), seeds.packed(0, 1000)
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from Packing import REST, KEY_INDEX, PackedMelodies, unpack_rows
+from zcs_config import ParseReport, stream_config_and_melodies
+
+MAGIC = b"MPHSEED\0"
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".seedcache"
+# 魔数, 版本, mtime_ns, 源文件大小, 哈希, 旋律条数, 音符总数, 元数据 JSON 长度
+_HEADER = struct.Struct("<8sIxxxxqq16sqqq")
+_REPORT_FIELDS = ("fragments", "melodies", "lines", "invalid_notes", "bad_totals",
+                  "bad_total_examples", "config_warnings")
+
+
+def cache_path_for(source):
+    return source + CACHE_SUFFIX
+
+
+def _source_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+def _align(n):
+    return (n + 7) // 8 * 8
+
+
+class CompiledSeeds:
+    """
+    mmap 打开的编译缓存
+
+    config: 配置字典；offsets / pitch / beat: 直接映射文件内容的只读数组
+    """
+
+    def __init__(self, config, offsets, pitch, beat, source_hash=None, mm=None):
+        self.config = config
+        self.offsets = offsets
+        self.pitch = pitch
+        self.beat = beat
+        self.source_hash = source_hash
+        self._mmap = mm
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def melody(self, i):
+        """第 i 条旋律的 (pitch_list, beat_list)"""
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        return self.pitch[lo:hi].tolist(), self.beat[lo:hi].tolist()
+
+    def packed(self, start=0, stop=None):
+        """第 start ~ stop 条旋律打包成 PackedMelodies"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        offsets = self.offsets[start:stop + 1]
+        lengths = np.diff(offsets).astype(np.int16)
+        n = len(lengths)
+        width = int(lengths.max()) if n else 0
+        mask = np.arange(width)[None, :] < lengths[:, None]
+        pitch = np.full((n, width), REST, dtype=np.int16)
+        beat = np.zeros((n, width), dtype=np.int16)
+        pitch[mask] = self.pitch[offsets[0]:offsets[-1]]
+        beat[mask] = self.beat[offsets[0]:offsets[-1]]
+        keys = np.full(n, KEY_INDEX.get(self.config["key"], 0), dtype=np.int8)
+        return PackedMelodies(keys, pitch, beat, lengths)
+
+    def melodies(self, start=0, stop=None):
+        """第 start ~ stop 条旋律的 [(pitch_list, beat_list), ...]"""
+        return [(pitch, beat) for _, pitch, beat in unpack_rows(self.packed(start, stop))]
+
+    def close(self):
+        self.offsets = self.pitch = self.beat = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+
+def _compile(source, report):
+    """流式解析 source，返回 (config, offsets, pitch, beat) 扁平数组"""
+    config, batches = stream_config_and_melodies(source, report=report)
+    lengths, pitch, beat = [np.zeros(1, dtype=np.int64)], [], []
+    for packed in batches:
+        valid = packed.valid
+        lengths.append(packed.lengths.astype(np.int64))
+        pitch.append(packed.pitch[valid])
+        beat.append(packed.beat[valid])
+    offsets = np.cumsum(np.concatenate(lengths))
+    pitch = np.concatenate(pitch) if pitch else np.zeros(0, dtype=np.int16)
+    beat = np.concatenate(beat) if beat else np.zeros(0, dtype=np.int16)
+    return config, offsets, pitch, beat
+
+
+def _report_state(report):
+    return {name: getattr(report, name) for name in _REPORT_FIELDS}
+
+
+def _restore_report(report, state):
+    for name in _REPORT_FIELDS:
+        setattr(report, name, state[name])
+    report.bad_total_examples = [tuple(item) for item in report.bad_total_examples]
+
+
+def _write_cache(cache_path, stat, seeds, report):
+    meta = json.dumps({"config": seeds.config, "report": _report_state(report)},
+                      ensure_ascii=False).encode("utf-8")
+    header = _HEADER.pack(MAGIC, CACHE_VERSION, stat.st_mtime_ns, stat.st_size,
+                          seeds.source_hash, len(seeds), len(seeds.pitch), len(meta))
+    tmp_path = cache_path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.write(meta)
+            f.write(bytes(_align(f.tell()) - f.tell()))
+            f.write(seeds.offsets.astype("<i8").tobytes())
+            f.write(seeds.pitch.astype("<i2").tobytes())
+            f.write(seeds.beat.astype("<i2").tobytes())
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def compile_seeds(source, cache_path=None, report=None):
+    """
+    解析 source 并写出编译缓存（先写临时文件再替换），返回 CompiledSeeds（内存中的数组）
+
+    解析时的警告汇总（ParseReport）一并保存，命中缓存时可以原样还原
+    """
+    if report is None:
+        report = ParseReport()
+    # 先取 mtime 再解析：解析期间源文件被改动时，下次读取会发现不一致并重建
+    stat = os.stat(source)
+    seeds = CompiledSeeds(*_compile(source, report), source_hash=_source_hash(source))
+    _write_cache(cache_path or cache_path_for(source), stat, seeds, report)
+    return seeds
+
+
+def open_seeds(cache_path, source=None, verify_hash=False, report=None):
+    """
+    mmap 打开编译缓存，返回 CompiledSeeds
+
+    给出 source 时检查缓存是否与之一致（mtime 与大小；verify_hash=True 时再比较内容哈希），
+    不一致或格式、版本不对时返回 None。report 不为 None 时还原编译时的警告汇总。
+    """
+    with open(cache_path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(mm) < _HEADER.size:
+        mm.close()
+        return None
+    magic, version, mtime_ns, size, digest, n, notes, meta_len = _HEADER.unpack_from(mm)
+    fresh = magic == MAGIC and version == CACHE_VERSION
+    if fresh and source is not None:
+        stat = os.stat(source)
+        fresh = stat.st_mtime_ns == mtime_ns and stat.st_size == size
+        if fresh and verify_hash:
+            fresh = _source_hash(source) == digest
+    if not fresh:
+        mm.close()
+        return None
+
+    pos = _HEADER.size
+    meta = json.loads(bytes(mm[pos:pos + meta_len]).decode("utf-8"))
+    if report is not None:
+        _restore_report(report, meta["report"])
+    pos = _align(pos + meta_len)
+    offsets = np.frombuffer(mm, dtype="<i8", count=n + 1, offset=pos)
+    pos += offsets.nbytes
+    pitch = np.frombuffer(mm, dtype="<i2", count=notes, offset=pos)
+    pos += pitch.nbytes
+    beat = np.frombuffer(mm, dtype="<i2", count=notes, offset=pos)
+    return CompiledSeeds(meta["config"], offsets, pitch, beat, digest, mm)
+
+
+def load_seeds(source, cache_path=None, verify_hash=False, report=None):
+    """
+    读取 source 的配置与种子旋律，返回 CompiledSeeds
+
+    缓存与源文件一致时直接 mmap，不解析文本；否则重新解析并写缓存，
+    缓存写不进去（目录只读等）时只返回内存中的结果。
+    源文件不存在时与 stream_config_and_melodies 一样返回默认配置、没有旋律。
+    """
+    if report is None:
+        report = ParseReport()
+    cache_path = cache_path or cache_path_for(source)
+    if not os.path.exists(source):
+        config, _ = stream_config_and_melodies(source, report=report)
+        return CompiledSeeds(config, np.zeros(1, dtype=np.int64),
+                             np.zeros(0, dtype=np.int16), np.zeros(0, dtype=np.int16))
+    if os.path.exists(cache_path):
+        try:
+            seeds = open_seeds(cache_path, source, verify_hash, report)
+        except (OSError, ValueError, KeyError, struct.error):
+            seeds = None  # 缓存损坏，按过期处理
+        if seeds is not None:
+            return seeds
+    stat = os.stat(source)
+    seeds = CompiledSeeds(*_compile(source, report), source_hash=_source_hash(source))
+    try:
+        _write_cache(cache_path, stat, seeds, report)
+    except OSError:
+        pass  # 目录不可写时只在内存中使用
+    return seeds
+
+
+__all__ = [
+    'CompiledSeeds', 'compile_seeds', 'open_seeds', 'load_seeds', 'cache_path_for',
+    'CACHE_SUFFIX'
+]
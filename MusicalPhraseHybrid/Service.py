@@ -0,0 +1,355 @@
+"""
+旋律生成服务：asyncio 前端 + 请求合批
+
+客户端通过 TCP 连接发送 JSON-lines 请求，每行一个：
+    {"id": "a1", "text": "<配置文件格式的文本>", "key": "D", "ngen": 30, "top": 3,
+     "population": 200}
+    text 与配置文件格式相同（@key 等配置行 + 用 --- 分隔的旋律片段，见 zcs_config），
+    其中的旋律作为种子，不足 population 条时按调性随机生成补齐；key 不为空时覆盖 @key。
+    除 text 外都可以省略。
+服务端对每个请求回复若干行（都带有请求的 id）：
+    {"id": "a1", "event": "warning", "message": "..."}            text 中被跳过的内容
+    {"id": "a1", "event": "started", "batch": 4}                  开始运行，batch 为同批请求数
+    {"id": "a1", "event": "progress", "gen": 5, "max": ..., "avg": ...}   每代一行
+    {"id": "a1", "event": "result", "best": [{"fitness": ..., "text": "C4 12\\n..."}, ...]}
+    {"id": "a1", "event": "error", "message": "..."}
+同一连接上可以连续发送多个请求，回复按完成顺序交错返回。
+
+合批：请求先进入队列，批处理协程等待 batch_window 秒收集同时到达的请求（最多
+max_batch 个），ngen 相同的请求合成一次进化运行。每个请求保留自己的子种群，
+选择只在子种群内部进行（子种群大小为偶数，杂交配对也不会跨子种群），各请求的
+结果互不影响；整批个体的评估则合在一起，由 batch_map 一次向量化完成。
+最多 runs 批同时运行，CPU 密集的进化每一代都在 executor（默认线程池）中执行，
+两代之间回到事件循环推送进度，不会阻塞新请求的接收。runs > 1 时每个运行名额
+使用 toolbox 的一份拷贝与独立的适应度缓存（FitnessCache 不是线程安全的）。
+
+用法:
+    python Service.py [--host 127.0.0.1] [--port 8765] [--max-batch 16] [--window 0.02]
+负载测试见 bench_service.py。
+"""
+import argparse
+import asyncio
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_NGEN = 30
+DEFAULT_TOP = 3
+DEFAULT_POPULATION = 200
+MAX_POPULATION = 2000
+MAX_NGEN = 500
+
+
+class Job:
+    """一个请求：解析后的种子、参数，以及推送给客户端的事件队列"""
+
+    def __init__(self, request_id, key, melodies, ngen, top, population):
+        self.id = request_id
+        self.key = key
+        self.melodies = melodies          # [(pitch_list, beat_list), ...]
+        self.ngen = ngen
+        self.top = top
+        self.population = population + population % 2
+        self.events = asyncio.Queue()     # 事件 dict，None 表示结束
+
+    def emit(self, event, **fields):
+        self.events.put_nowait({"id": self.id, "event": event, **fields})
+
+    def finish(self):
+        self.events.put_nowait(None)
+
+
+def _int_field(request, name, default):
+    value = request.get(name, default)
+    if isinstance(value, bool):
+        raise ValueError(f"{name} 应为整数")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} 应为整数") from None
+
+
+def _str_field(request, name, default):
+    value = request.get(name, default)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"{name} 应为字符串")
+    return value
+
+
+def parse_request(request, default_id):
+    """把一行 JSON 请求解析为 Job，参数不合法时抛出 ValueError"""
+    from zcs_config import parse_config_text
+    from Settings import Notes
+    if not isinstance(request, dict):
+        raise ValueError("请求必须是 JSON 对象")
+    request_id = request.get("id", default_id)
+    warnings = []
+    text = _str_field(request, "text", "") or ""
+    key = _str_field(request, "key", None)
+    config, melodies = parse_config_text(text, warn=warnings.append)
+    key = key or config["key"]
+    if key not in Notes:
+        raise ValueError(f"无效的调性 '{key}'")
+    ngen = _int_field(request, "ngen", DEFAULT_NGEN)
+    top = _int_field(request, "top", DEFAULT_TOP)
+    population = _int_field(request, "population", DEFAULT_POPULATION)
+    if not 0 <= ngen <= MAX_NGEN:
+        raise ValueError(f"ngen 应在 0 ~ {MAX_NGEN} 之间")
+    if not 2 <= population <= MAX_POPULATION:
+        raise ValueError(f"population 应在 2 ~ {MAX_POPULATION} 之间")
+    if top < 1:
+        raise ValueError("top 至少为 1")
+    job = Job(request_id, key, melodies[:population], ngen, top, population)
+    for warning in warnings:
+        job.emit("warning", message=warning)
+    return job
+
+
+def _initial_population(job, melody_creator):
+    from zcs_melody import generate_melodies
+    population = [melody_creator(job.key, pitch, beat) for pitch, beat in job.melodies]
+    remaining = job.population - len(population)
+    if remaining > 0:
+        population += generate_melodies(remaining, key=job.key, use_scale=True,
+                                        melody_creator=melody_creator)
+    return population
+
+
+def evolve_batch(populations, toolbox, cxpb, mutpb, ngen):
+    """
+    同时进化若干个互相独立的子种群（每个大小为偶数），每代 yield [(max, avg), ...]
+
+    与 Evolution.evolve 流程相同，只是选择在各子种群内部进行；
+    杂交、变异、评估对拼接后的整个种群调用一次
+    """
+    from Evolution import var_and, evaluate_invalid
+    bounds = list(itertools.accumulate([0] + [len(p) for p in populations]))
+    population = [ind for sub in populations for ind in sub]
+
+    def summary():
+        result = []
+        for lo, hi in zip(bounds, bounds[1:]):
+            fitness = [ind.fitness.values[0] for ind in population[lo:hi]]
+            result.append((max(fitness), sum(fitness) / len(fitness)))
+        return result
+
+    evaluate_invalid(population, toolbox)
+    yield summary()
+    for _ in range(ngen):
+        offspring = []
+        for lo, hi in zip(bounds, bounds[1:]):
+            offspring += toolbox.select(population[lo:hi], hi - lo)
+        population[:] = var_and(offspring, toolbox, cxpb, mutpb)
+        evaluate_invalid(population, toolbox)
+        yield summary()
+    for sub, lo, hi in zip(populations, bounds, bounds[1:]):
+        sub[:] = population[lo:hi]
+
+
+def _private_toolbox(toolbox):
+    """toolbox 的浅拷贝，其中的适应度缓存换成独立的一份，供另一个线程使用"""
+    import copy
+    from Fitness import FitnessCache
+    private = copy.copy(toolbox)
+    evaluate = getattr(toolbox, "evaluate", None)
+    cache = getattr(evaluate, "func", evaluate)
+    if isinstance(cache, FitnessCache):
+        private.register("evaluate", FitnessCache(cache.evaluate, cache.maxsize, cache.enabled))
+    return private
+
+
+def best_melodies(population, top):
+    """适应度最高的 top 条互不相同的旋律"""
+    from zcs_config import format_melody_string
+    best = []
+    seen = set()
+    for ind in sorted(population, key=lambda ind: ind.fitness.values[0], reverse=True):
+        content = (ind.key, tuple(ind.pitch), tuple(ind.beat))
+        if content in seen:
+            continue
+        seen.add(content)
+        best.append({"fitness": ind.fitness.values[0], "key": ind.key,
+                     "text": format_melody_string(ind.pitch, ind.beat)})
+        if len(best) == top:
+            break
+    return best
+
+
+class MelodyService:
+    """
+    请求队列 + 合批 + executor 中的进化
+
+    toolbox: 默认使用 demo.toolbox（注册了 select / mate / mutate / evaluate / map）
+    max_batch: 每批最多合并的请求数，1 表示不合批
+    batch_window: 收到第一个请求后等待更多请求的秒数
+    runs: 同时运行的批数；大于 1 时每个运行名额使用 toolbox 的一份拷贝（独立的适应度缓存）
+    executor: 运行进化的 concurrent.futures executor，默认为 runs 个线程的线程池
+    """
+
+    def __init__(self, toolbox=None, melody_creator=None, cxpb=None, mutpb=None,
+                 max_batch=16, batch_window=0.02, runs=1, executor=None):
+        if toolbox is None or melody_creator is None:
+            import demo
+            toolbox = toolbox or demo.toolbox
+            melody_creator = melody_creator or demo.Get_Melody_Creator
+            cxpb = demo.CXPB if cxpb is None else cxpb
+            mutpb = demo.MUTPB if mutpb is None else mutpb
+        self.toolbox = toolbox
+        self.melody_creator = melody_creator
+        self.cxpb = 0.7 if cxpb is None else cxpb
+        self.mutpb = 0.2 if mutpb is None else mutpb
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.executor = executor or ThreadPoolExecutor(max_workers=runs)
+        self._toolboxes = [toolbox] if runs == 1 else \
+            [_private_toolbox(toolbox) for _ in range(runs)]
+        self._slots = asyncio.Semaphore(runs)
+        self._queue = asyncio.Queue()
+        self._tasks = set()
+        self._ids = itertools.count()
+        self._batcher = None
+
+    def start(self):
+        if self._batcher is None:
+            self._batcher = asyncio.create_task(self._batch_loop())
+
+    async def submit(self, request):
+        """提交一个请求（dict），返回 Job；逐个 await job.events.get() 读取事件直到 None"""
+        self.start()
+        job = parse_request(request, f"r{next(self._ids)}")
+        await self._queue.put(job)
+        return job
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # 先等到有空闲的运行名额再收集请求，运行期间到达的请求都能并入下一批
+            await self._slots.acquire()
+            jobs = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(jobs) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    jobs.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            groups = {}
+            for job in jobs:
+                groups.setdefault(job.ngen, []).append(job)
+            for i, group in enumerate(groups.values()):
+                if i:
+                    await self._slots.acquire()
+                task = asyncio.create_task(self._run(group))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, jobs):
+        loop = asyncio.get_running_loop()
+        toolbox = self._toolboxes.pop()   # 名额由 _slots 限制，不会取空
+        try:
+            for job in jobs:
+                job.emit("started", batch=len(jobs))
+            populations = await loop.run_in_executor(
+                self.executor, lambda: [_initial_population(job, self.melody_creator)
+                                        for job in jobs])
+            generations = evolve_batch(populations, toolbox, self.cxpb, self.mutpb,
+                                       jobs[0].ngen)
+            gen = 0
+            while True:
+                summary = await loop.run_in_executor(self.executor, next, generations, None)
+                if summary is None:
+                    break
+                for job, (best, avg) in zip(jobs, summary):
+                    job.emit("progress", gen=gen, max=best, avg=avg)
+                gen += 1
+            for job, population in zip(jobs, populations):
+                job.emit("result", best=best_melodies(population, job.top))
+        except Exception as e:
+            for job in jobs:
+                job.emit("error", message=f"{type(e).__name__}: {e}")
+        finally:
+            for job in jobs:
+                job.finish()
+            self._toolboxes.append(toolbox)
+            self._slots.release()
+
+    async def _forward(self, job, writer, lock):
+        import json
+        while True:
+            event = await job.events.get()
+            if event is None:
+                return
+            async with lock:
+                writer.write(json.dumps(event, ensure_ascii=False).encode() + b"\n")
+                await writer.drain()
+
+    async def handle(self, reader, writer):
+        """一个客户端连接：逐行读取请求，各请求的事件并发写回"""
+        import json
+        lock = asyncio.Lock()
+        forwards = set()
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                request = None
+                try:
+                    request = json.loads(line)
+                    job = await self.submit(request)
+                except (TypeError, ValueError) as e:
+                    request_id = request.get("id") if isinstance(request, dict) else None
+                    async with lock:
+                        writer.write(json.dumps({"id": request_id, "event": "error",
+                                                 "message": str(e)},
+                                                ensure_ascii=False).encode() + b"\n")
+                    continue
+                forwards.add(asyncio.create_task(self._forward(job, writer, lock)))
+            await asyncio.gather(*forwards)
+        except ConnectionError:
+            pass
+        finally:
+            for task in forwards:
+                task.cancel()
+            writer.close()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """启动 TCP 服务并一直运行"""
+        self.start()
+        server = await asyncio.start_server(self.handle, host, port, limit=1 << 20)
+        async with server:
+            print(f"旋律生成服务运行在 {host}:{port}（max_batch={self.max_batch}，"
+                  f"window={self.batch_window}s）", flush=True)
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="旋律生成服务（JSON-lines over TCP）")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-batch", type=int, default=16, help="每批最多合并的请求数")
+    parser.add_argument("--window", type=float, default=0.02, help="合批等待时间（秒）")
+    parser.add_argument("--runs", type=int, default=1, help="同时运行的批数")
+    args = parser.parse_args(argv)
+
+    async def run():
+        service = MelodyService(max_batch=args.max_batch, batch_window=args.window,
+                                runs=args.runs)
+        await service.serve(args.host, args.port)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+__all__ = [
+    'Job', 'MelodyService', 'parse_request', 'evolve_batch', 'best_melodies',
+    'DEFAULT_HOST', 'DEFAULT_PORT'
+]
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from deap import base
+from array import array
 #-------Basic identifications--------
 Notes=["C","#C","D","#D","E","F","#F","G","#G","A","#A","B"]
 valid_notes=[]
@@ -17,6 +17,7 @@ KEY_SCALE_MAP = {
     "B": [11, 1, 3, 4, 6, 8, 10]
 }
 MELODY_LENGTH=192
+BEAT_UNIT=6 #最小时值单位（八分音符）
 for i in range(1,8):
     valid_notes+=[str(Notes[j]+str(i)) for j in range(12)]
 valid_notes.append("Pause")
@@ -45,3 +46,134 @@ class Melody:
 
 
 
+#-------紧凑存储的Melody--------
+# True = creator.Melody 基于 CompactMelody（数组存储，无 __dict__）
+USE_COMPACT_MELODY=False
+REST_CODE=-1 #CompactMelody 中代表空拍(None)的值
+
+class _CodedView:
+    """
+    把底层数组包装成“像列表一样”的视图，读写时自动编解码
+    支持下标/切片读写、迭代、insert、pop 等 Crossover/Mutations/评估函数用到的操作
+    切片返回普通 list
+    """
+    __slots__=("_data",)
+    def __init__(self,data):
+        self._data=data
+    @staticmethod
+    def _encode(value):
+        return value
+    @staticmethod
+    def _decode(code):
+        return code
+    @classmethod
+    def _codes(cls,values):
+        return [cls._encode(v) for v in values]
+    def __len__(self):
+        return len(self._data)
+    def __iter__(self):
+        return map(self._decode,self._data)
+    def __getitem__(self,i):
+        if isinstance(i,slice):
+            return [self._decode(c) for c in self._data[i]]
+        return self._decode(self._data[i])
+    def __setitem__(self,i,value):
+        if isinstance(i,slice):
+            self._data[i]=self._codes(value)
+        else:
+            self._data[i]=self._encode(value)
+    def insert(self,i,value):
+        self._data.insert(i,self._encode(value))
+    def append(self,value):
+        self._data.append(self._encode(value))
+    def pop(self,i=-1):
+        return self._decode(self._data.pop(i))
+    def index(self,value):
+        return list(self).index(value)
+    def copy(self):
+        return list(self)
+    def __eq__(self,other):
+        try:
+            return list(self)==list(other)
+        except TypeError:
+            return NotImplemented
+    def __repr__(self):
+        return repr(list(self))
+
+class _PitchView(_CodedView):
+    __slots__=()
+    @staticmethod
+    def _encode(value):
+        return REST_CODE if value is None else value
+    @staticmethod
+    def _decode(code):
+        return None if code==REST_CODE else code
+    @classmethod
+    def _codes(cls,values):
+        return array("b",[REST_CODE if v is None else v for v in values])
+
+class _BeatView(_CodedView):
+    __slots__=()
+    @staticmethod
+    def _encode(value):
+        if value%BEAT_UNIT:
+            raise ValueError("beat must be a multiple of BEAT_UNIT")
+        return value//BEAT_UNIT
+    @staticmethod
+    def _decode(code):
+        return code*BEAT_UNIT
+
+class CompactMelody:
+    """
+    与 Melody 接口相同的紧凑表示：
+    pitch 存在 array('b') 中，空拍用 REST_CODE 表示（音高在 0~84 之间，杂交跨调平移后
+    也只差 ±11 个半音，见 Transposition.KEY_OFFSET，int8 足够）
+    beat 以 BEAT_UNIT 为单位存在 bytearray 中（最长192/6=32，一个字节足够）
+    对外的 pitch/beat 属性是可读写的列表视图，原地修改会直接写回数组
+    """
+    __slots__=("key","_pitch","_beat","fitness","fitness_terms") #fitness_terms 见 DeltaFitness
+    def __init__(self,key,pitch,beat):
+        assert sum(beat)==MELODY_LENGTH,"invalid melody"
+        assert len(pitch)==len(beat),"invalid melody"
+        assert key in Notes,"invalid melody"
+        self.pitch=pitch
+        self.beat=beat
+        self.key=key
+    def __init_subclass__(cls,**kwargs):
+        super().__init_subclass__(**kwargs)
+        # creator.create 会把 fitness 类型放在子类的类属性里，遮住这里的 slot
+        if isinstance(cls.__dict__.get("fitness"),type):
+            delattr(cls,"fitness")
+    @property
+    def pitch(self):
+        return _PitchView(self._pitch)
+    @pitch.setter
+    def pitch(self,pitch):
+        self._pitch=_PitchView._codes(pitch)
+    @property
+    def beat(self):
+        return _BeatView(self._beat)
+    @beat.setter
+    def beat(self,beat):
+        self._beat=bytearray(_BeatView._codes(beat))
+    __repr__=Melody.__repr__
+
+# creator.Melody 的基类；creator.create 时同时传入 __slots__=()，
+# 对 CompactMelody 可去掉每个个体的 __dict__，对 Melody 没有影响
+MelodyBase=CompactMelody if USE_COMPACT_MELODY else Melody
+
+
+def register_types():
+    """
+    注册 creator.FitnessMax 与 creator.Melody，返回 creator.Melody
+
+    creator 类型只在这里创建：demo、进程池的工作进程、岛屿子进程都调用它。
+    可以重复调用，已经注册过时直接返回，不会触发 DEAP 的重复创建警告。
+    导入算子模块（Crossover、Mutations 等）不会注册任何类型，也不会导入 deap。
+    """
+    from deap import base, creator
+    if not hasattr(creator, "FitnessMax"):
+        creator.create("FitnessMax", base.Fitness, weights=(1.0,))
+    if not hasattr(creator, "Melody"):
+        creator.create("Melody", MelodyBase, fitness=creator.FitnessMax, __slots__=())
+    return creator.Melody
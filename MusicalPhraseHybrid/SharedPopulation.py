@@ -0,0 +1,365 @@
+"""
+共享内存种群模块
+
+SharedPopulation 把整个种群存放在一块 multiprocessing.shared_memory 中：
+    fitness : (n,) float64，NaN 表示适应度失效
+    pitch   : (n, width) int16，空拍与补齐位置为 REST
+    beat    : (n, width) int16，补齐位置为 0
+    lengths : (n,) int16
+    keys    : (n,) int8，调性在 Notes 中的下标
+布局与 Packing.PackedMelodies 相同，store.packed(start, stop) 就是不复制数据的视图。
+
+evolve_shared 用它跑与 Evolution.evolve 相同流程的遗传算法，但个体不再 pickle：
+- 选择在主进程中只针对 fitness 数组做锦标赛，再按选中的行号原地重排各数组
+- 杂交、变异、评估按行区间分块交给工作进程，任务只携带共享内存的名字、
+  行区间 [start, stop) 和随机数种子，返回值只有评估个数；
+  工作进程直接读写共享内存中的对应行
+因此每代的进程间通信量只有几百字节，与种群规模、旋律长度无关。
+
+行适配器：
+    row_melodies / write_rows      : 取出若干行为 Melody / 把 Melody 写回这些行
+    mate_rows / mutate_rows / evaluate_rows :
+        对若干行做 BatchCrossover.mate_population / BatchMutations.mutate_packed /
+        Fitness.evaluate_packed，结果直接写回 store
+
+与 Parallel 相同，每个分块使用主进程生成的种子，分块大小固定时结果与进程数无关。
+不支持 FitnessCache、Controller 与 Profiler（它们都需要主进程中的个体对象）。
+
+用法:
+    store = SharedPopulation.from_population(population)
+    with SharedPopulationPool(processes=8) as pool:
+        for state in evolve_shared(store, 0.7, 0.2, ngen=50, pool=pool):
+            print(state.logbook.stream)
+    population = store.to_population(melody_creator)
+    store.close()
+    store.unlink()
+"""
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from Packing import REST, PackedMelodies, pack_melodies, unpack_rows
+from Settings import MELODY_LENGTH, BEAT_UNIT, MelodyBase
+
+GRID_WIDTH = MELODY_LENGTH // BEAT_UNIT   # 时值都是 BEAT_UNIT 的倍数时最多的音符数
+DEFAULT_CHUNKSIZE = 256
+_FIELDS = (("fitness", np.float64), ("pitch", np.int16), ("beat", np.int16),
+           ("lengths", np.int16), ("keys", np.int8))
+_ATTACHED = {}   # 本进程中已经映射的共享内存，按名字缓存
+
+
+def _layout(n, width):
+    """各数组在共享内存中的 (名字, dtype, 形状, 偏移) 与总字节数，每段按 8 字节对齐"""
+    layout = []
+    offset = 0
+    for name, dtype in _FIELDS:
+        shape = (n, width) if name in ("pitch", "beat") else (n,)
+        layout.append((name, dtype, shape, offset))
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        offset += (nbytes + 7) // 8 * 8
+    return layout, max(offset, 8)
+
+
+def _attach(name, n, width):
+    """工作进程中按名字映射共享内存（同一块只映射一次）"""
+    store = _ATTACHED.get(name)
+    if store is None:
+        store = _ATTACHED[name] = SharedPopulation(n, width, name=name, create=False)
+    return store
+
+
+class SharedPopulation:
+    """
+    共享内存中的定长种群
+
+    n: 个体数
+    width: 每条旋律最多的音符数
+    name: 共享内存名字，create=False 时映射已有的一块
+    pickle 时只传递 (name, n, width)，在接收方进程中重新映射同一块内存
+    """
+
+    def __init__(self, n, width=GRID_WIDTH, name=None, create=True):
+        self.n = n
+        self.width = width
+        layout, size = _layout(n, width)
+        self._shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        self._owner = create
+        for field, dtype, shape, offset in layout:
+            setattr(self, field, np.ndarray(shape, dtype=dtype, buffer=self._shm.buf,
+                                            offset=offset))
+        if create:
+            self.fitness[:] = np.nan
+            self.pitch[:] = REST
+            self.beat[:] = 0
+            self.lengths[:] = 0
+            self.keys[:] = 0
+
+    @classmethod
+    def from_population(cls, population, width=None):
+        """
+        由 Melody 列表创建；已有的适应度一并写入
+
+        width 默认为 GRID_WIDTH；有时值不是 BEAT_UNIT 倍数的旋律时取 MELODY_LENGTH，
+        保证杂交、变异之后的旋律也放得下
+        """
+        packed = pack_melodies(population)
+        if width is None:
+            on_grid = not (packed.beat % BEAT_UNIT).any()
+            width = GRID_WIDTH if on_grid and packed.width <= GRID_WIDTH else MELODY_LENGTH
+        store = cls(len(population), width)
+        store.write_rows(np.arange(len(population)), packed)
+        store.fitness[:] = [ind.fitness.values[0] if getattr(ind, "fitness", None) is not None
+                            and ind.fitness.valid else np.nan for ind in population]
+        return store
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def __reduce__(self):
+        return _attach, (self.name, self.n, self.width)
+
+    def __len__(self):
+        return self.n
+
+    def packed(self, start=0, stop=None):
+        """[start, stop) 行的 PackedMelodies 视图，修改会直接写进共享内存"""
+        rows = slice(start, stop)
+        return PackedMelodies(self.keys[rows], self.pitch[rows], self.beat[rows],
+                              self.lengths[rows])
+
+    def take(self, rows):
+        """取出若干行的 PackedMelodies 副本"""
+        return PackedMelodies(self.keys[rows], self.pitch[rows], self.beat[rows],
+                              self.lengths[rows])
+
+    def write_rows(self, rows, packed):
+        """把 PackedMelodies 逐行写进 rows 指定的行，并标记这些行的适应度失效"""
+        if len(packed) and int(packed.lengths.max()) > self.width:
+            raise ValueError(f"旋律有 {int(packed.lengths.max())} 个音符，"
+                             f"超过共享种群的宽度 {self.width}")
+        width = min(packed.width, self.width)
+        self.pitch[rows] = REST
+        self.beat[rows] = 0
+        self.pitch[rows, :width] = packed.pitch[:, :width]
+        self.beat[rows, :width] = packed.beat[:, :width]
+        self.lengths[rows] = packed.lengths
+        self.keys[rows] = packed.keys
+        self.fitness[rows] = np.nan
+
+    def invalid_rows(self, start=0, stop=None):
+        """[start, stop) 中适应度失效的行号"""
+        start = start or 0
+        return start + np.flatnonzero(np.isnan(self.fitness[start:stop]))
+
+    def gather(self, rows):
+        """按行号重排（可重复），rows[i] 行的内容放到第 i 行；用于选择之后生成子代种群"""
+        rows = np.asarray(rows)
+        for field, _ in _FIELDS:
+            array = getattr(self, field)
+            array[:] = array[rows]
+
+    def individual(self, i, melody_creator=None):
+        """第 i 行还原为带适应度的个体（默认为 creator.Melody）"""
+        return self.to_population(melody_creator, i, i + 1)[0]
+
+    def to_population(self, melody_creator=None, start=0, stop=None):
+        """[start, stop) 行还原为个体列表，适应度有效的行一并设置适应度"""
+        if melody_creator is None:
+            from Settings import register_types
+            melody_creator = register_types()
+        population = [melody_creator(*row) for row in unpack_rows(self.packed(start, stop))]
+        for ind, fit in zip(population, self.fitness[start:stop].tolist()):
+            if fit == fit:   # 不是 NaN
+                ind.fitness.values = (fit,)
+        return population
+
+    def __iter__(self):
+        return iter(self.to_population())
+
+    def close(self):
+        """解除本进程的映射（之后不能再访问各数组）"""
+        for field, _ in _FIELDS:
+            setattr(self, field, None)
+        self._shm.close()
+
+    def unlink(self):
+        """释放共享内存，只应由创建者在所有进程都用完之后调用"""
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        if self._owner:
+            self.unlink()
+
+
+# ----------------- 行适配器 -----------------
+def row_melodies(store, rows):
+    """把若干行取出为 Melody（Settings.MelodyBase），供 Crossover / Mutations 的算子使用"""
+    return [MelodyBase(*row) for row in unpack_rows(store.take(rows))]
+
+
+def write_rows(store, rows, melodies):
+    """把 Melody 写回若干行（适应度标记为失效）"""
+    if len(rows):
+        store.write_rows(rows, pack_melodies(melodies))
+
+
+def mate_rows(store, rows1, rows2, mode="onset", points=1):
+    """rows1[k] 与 rows2[k] 两两杂交（与 GetChild 相同的分布），子代写回原来的行"""
+    from BatchCrossover import mate_population
+    parents1 = row_melodies(store, rows1)
+    parents2 = row_melodies(store, rows2)
+    mate_population(list(zip(parents1, parents2)), mode=mode, points=points)
+    write_rows(store, rows1, parents1)
+    write_rows(store, rows2, parents2)
+
+
+def mutate_rows(store, rows, indpb=0.2, rng=None):
+    """对若干行各调用一次与 melody_mutation(ind, indpb) 等价的变异，结果写回原来的行"""
+    from BatchMutations import mutate_packed
+    packed = store.take(rows)
+    mutate_packed(packed, indpb, rng=rng)
+    store.write_rows(rows, packed)
+
+
+def evaluate_rows(store, rows):
+    """批量评估若干行并写入 fitness，返回评估个数"""
+    from Fitness import evaluate_packed
+    if len(rows):
+        store.fitness[rows] = evaluate_packed(store.take(rows))
+    return len(rows)
+
+
+# ----------------- 工作进程任务 -----------------
+def _step_range(store, start, stop, seed, cxpb, mutpb, indpb, mode, points):
+    """
+    对 [start, stop) 行做一代的杂交、变异与评估（与 Evolution.var_and + evaluate_invalid
+    相同），返回评估个数；start 为偶数，(2k, 2k+1) 两行是一对
+    """
+    random.seed(seed)
+    rng = np.random.default_rng(seed)
+    if cxpb > 0:
+        second = np.arange(start + 1, stop, 2)
+        second = second[rng.random(len(second)) < cxpb]
+        if len(second):
+            mate_rows(store, second - 1, second, mode, points)
+    if mutpb > 0:
+        rows = np.arange(start, stop)
+        rows = rows[rng.random(len(rows)) < mutpb]
+        if len(rows):
+            mutate_rows(store, rows, indpb, rng)
+    return evaluate_rows(store, store.invalid_rows(start, stop))
+
+
+def _evaluate_range(store, start, stop, seed):
+    return evaluate_rows(store, store.invalid_rows(start, stop))
+
+
+class SharedPopulationPool:
+    """
+    按行区间把任务分给进程池；processes=0 时在本进程中依次执行（便于调试）
+
+        with SharedPopulationPool(processes=8) as pool:
+            pool.run(_evaluate_range, store)
+    """
+
+    def __init__(self, processes=None, chunksize=DEFAULT_CHUNKSIZE):
+        if chunksize % 2:
+            raise ValueError("chunksize 必须是偶数（杂交按相邻两行配对）")
+        self.processes = (os.cpu_count() or 1) if processes is None else processes
+        self.chunksize = chunksize
+        self._executor = ProcessPoolExecutor(max_workers=self.processes) \
+            if self.processes > 0 else None
+
+    def run(self, task, store, *args):
+        """对每个分块调用 task(store, start, stop, seed, *args)，返回各分块结果之和"""
+        starts = list(range(0, len(store), self.chunksize))
+        stops = [min(s + self.chunksize, len(store)) for s in starts]
+        seeds = [random.getrandbits(64) for _ in starts]
+        if self._executor is None:
+            # 任务会重置 random，在本进程中执行时保存并恢复主进程的随机状态
+            state = random.getstate()
+            try:
+                return sum(task(store, *chunk, *args) for chunk in zip(starts, stops, seeds))
+            finally:
+                random.setstate(state)
+        k = len(starts)
+        extra = [[value] * k for value in args]
+        return sum(self._executor.map(task, [store] * k, starts, stops, seeds, *extra))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def select_tournament(store, tournsize=3, rng=None):
+    """只看 fitness 数组的锦标赛选择（与 tools.selTournament 相同），原地重排种群"""
+    if rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+    n = len(store)
+    aspirants = rng.integers(0, n, size=(n, tournsize))
+    winners = aspirants[np.arange(n), store.fitness[aspirants].argmax(axis=1)]
+    store.gather(winners)
+
+
+def evolve_shared(store, cxpb, mutpb, ngen=None, pool=None, indpb=0.2, mode="onset",
+                  points=1, tournsize=3, stats=None, halloffame=None, logbook=None):
+    """
+    在 SharedPopulation 上逐代进化，每代 yield 一个 Evolution.GenerationState
+
+    流程与 Evolution.evolve 相同；state.population 就是 store（迭代时才还原为个体），
+    名人堂每代只用最好的一行更新。pool 为 None 时在本进程中执行。
+    stats 为 None 时只统计 avg / max；Stats.FitnessStats 直接读取 store 的数组，
+    不必还原个体（tools.Statistics 则要还原整个种群）。
+    """
+    from deap import tools
+    from Evolution import GenerationState
+    own_pool = pool is None
+    if own_pool:
+        pool = SharedPopulationPool(processes=0)
+    if logbook is None:
+        logbook = tools.Logbook()
+        logbook.header = ['gen', 'nevals'] + (stats.fields if stats else ['avg', 'max'])
+
+    def finish(gen, nevals):
+        fitness = store.fitness
+        if stats is not None:
+            record = stats.compile(store)
+        else:
+            record = {"avg": float(np.mean(fitness)), "max": float(np.max(fitness))}
+        if halloffame is not None:
+            halloffame.update([store.individual(int(np.argmax(fitness)))])
+        logbook.record(gen=gen, nevals=nevals, **record)
+        return GenerationState(gen, store, halloffame, logbook, record, nevals)
+
+    try:
+        yield finish(0, pool.run(_evaluate_range, store))
+        gen = 1
+        while ngen is None or gen <= ngen:
+            select_tournament(store, tournsize)
+            nevals = pool.run(_step_range, store, cxpb, mutpb, indpb, mode, points)
+            yield finish(gen, nevals)
+            gen += 1
+    finally:
+        if own_pool:
+            pool.close()
+
+
+__all__ = [
+    'SharedPopulation', 'SharedPopulationPool', 'GRID_WIDTH', 'DEFAULT_CHUNKSIZE',
+    'row_melodies', 'write_rows', 'mate_rows', 'mutate_rows', 'evaluate_rows',
+    'select_tournament', 'evolve_shared'
+]
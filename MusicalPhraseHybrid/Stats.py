@@ -0,0 +1,224 @@
+"""
+向量化的种群统计与列式 logbook
+
+FitnessStats 可以代替 tools.Statistics（接口相同：compile(population) 与 fields），
+一次算出：
+    avg / max / min / std : 适应度
+    q25 / q50 / q75       : 适应度分位数（quantiles 可改）
+    diversity             : 样本中互不相同的旋律所占比例
+    terms                 : 样本中 evaluate_melody 各评分项的平均值（chapter，见 Fitness.TERM_NAMES）
+适应度直接从连续数组读取：population 是 SharedPopulation 时用它的 fitness 数组，
+是个体列表时用一次 np.fromiter 取出。diversity 与 terms 需要打包旋律，只在按固定步长
+抽取的最多 sample_size 个个体上计算（同一种群每次抽到的样本相同），
+因此统计的耗时基本不随种群规模增长。
+
+ColumnarLogbook 可以代替 tools.Logbook 传给 evolve：每个字段一列，chapter 展开成
+"terms.jump"、"control.cxpb" 这样的列名；stream 与 select 的用法与 tools.Logbook 相同，
+可以导出为 CSV 或 .npz（每列一个数组，缺失值为 NaN）。
+
+用法:
+    stats = FitnessStats()
+    logbook = ColumnarLogbook(['gen', 'nevals'] + stats.fields)
+    for state in evolve(population, toolbox, CXPB, MUTPB, NGEN, stats=stats, logbook=logbook):
+        print(logbook.stream)
+    logbook.to_npz("logbook.npz")
+"""
+import csv
+
+import numpy as np
+
+from Fitness import TERM_NAMES, evaluate_packed_terms
+from Packing import pack_melodies
+
+DEFAULT_QUANTILES = (0.25, 0.5, 0.75)
+DEFAULT_SAMPLE_SIZE = 2000
+
+
+def _fitness_array(population):
+    """种群的适应度数组；SharedPopulation 直接返回其 fitness 数组"""
+    fitness = getattr(population, "fitness", None)
+    if isinstance(fitness, np.ndarray):
+        return fitness
+    n = len(population)
+    if n == 0:
+        return np.zeros(0)
+    # wvalues 是普通元组，比 values 属性（每次都做除法）快
+    weight = population[0].fitness.weights[0]
+    return np.fromiter((ind.fitness.wvalues[0] for ind in population),
+                       dtype=np.float64, count=n) / weight
+
+
+def _sample_packed(population, sample_size):
+    """按固定步长抽取最多 sample_size 个个体并打包"""
+    stride = max(1, -(-len(population) // sample_size))
+    take = getattr(population, "take", None)
+    if take is not None:
+        return take(slice(None, None, stride))
+    return pack_melodies(population[::stride])
+
+
+def _distinct_ratio(packed):
+    """调性、pitch、beat 完全相同的行算一条，返回不同行所占比例"""
+    if len(packed) == 0:
+        return 0.0
+    rows = np.hstack([packed.keys[:, None].astype(np.int16), packed.pitch, packed.beat])
+    row_type = np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))
+    rows = np.ascontiguousarray(rows).view(row_type)
+    return len(np.unique(rows)) / len(packed)
+
+
+class FitnessStats:
+    """
+    与 tools.Statistics 接口相同的种群统计
+
+    quantiles: 要统计的分位数
+    diversity / terms: 是否统计多样性 / 各评分项平均值
+    sample_size: diversity 与 terms 使用的样本大小上限
+    """
+
+    def __init__(self, quantiles=DEFAULT_QUANTILES, diversity=True, terms=True,
+                 sample_size=DEFAULT_SAMPLE_SIZE):
+        self.quantiles = tuple(quantiles)
+        self.diversity = diversity
+        self.terms = terms
+        self.sample_size = sample_size
+        self.fields = ["avg", "max", "min", "std"] + \
+            [f"q{round(q * 100)}" for q in self.quantiles] + (["diversity"] if diversity else [])
+
+    def compile(self, population):
+        fitness = _fitness_array(population)
+        if len(fitness) == 0:
+            return {}
+        record = {"avg": float(fitness.mean()), "max": float(fitness.max()),
+                  "min": float(fitness.min()), "std": float(fitness.std())}
+        if self.quantiles:
+            for q, value in zip(self.quantiles, np.quantile(fitness, self.quantiles).tolist()):
+                record[f"q{round(q * 100)}"] = value
+        if self.diversity or self.terms:
+            packed = _sample_packed(population, self.sample_size)
+            if self.diversity:
+                record["diversity"] = _distinct_ratio(packed)
+            if self.terms:
+                terms = evaluate_packed_terms(packed)
+                record["terms"] = {name: float(terms[name].mean()) for name in TERM_NAMES}
+        return record
+
+
+def _flatten(record, prefix=""):
+    flat = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+def _format(value):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+
+class ColumnarLogbook:
+    """
+    列式 logbook：columns[name] 是该字段逐代的值（缺失为 None）
+
+    header: stream 输出的列，默认为第一条记录中不属于 chapter 的字段
+    """
+
+    def __init__(self, header=None):
+        self.header = header
+        self.columns = {}
+        self.chapters = {}     # 与 tools.Logbook 兼容（chapter 已展开为列）
+        self._length = 0
+        self._streamed = 0
+
+    def record(self, **entry):
+        flat = _flatten(entry)
+        if self.header is None:
+            self.header = [key for key, value in entry.items() if not isinstance(value, dict)]
+        for name in flat:
+            if name not in self.columns:
+                self.columns[name] = [None] * self._length
+        for name, column in self.columns.items():
+            column.append(flat.get(name))
+        self._length += 1
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        return {name: column[i] for name, column in self.columns.items()
+                if column[i] is not None}
+
+    def __iter__(self):
+        return (self[i] for i in range(self._length))
+
+    def select(self, *names):
+        """与 tools.Logbook.select 相同：返回各列的值列表"""
+        if len(names) == 1:
+            return list(self.columns[names[0]])
+        return tuple(list(self.columns[name]) for name in names)
+
+    def column(self, name):
+        """某一列的 float64 数组，缺失值为 NaN"""
+        return np.array([np.nan if v is None else v for v in self.columns[name]],
+                        dtype=np.float64)
+
+    @property
+    def stream(self):
+        """尚未输出过的记录（第一次带表头），格式与 tools.Logbook.stream 类似"""
+        widths = [max(len(name), 8) for name in self.header]
+        lines = []
+        if self._streamed == 0:
+            lines.append("  ".join(name.ljust(w) for name, w in zip(self.header, widths)))
+        for i in range(self._streamed, self._length):
+            values = [self.columns.get(name, [None] * self._length)[i] for name in self.header]
+            lines.append("  ".join(_format(v).ljust(w) for v, w in zip(values, widths)))
+        self._streamed = self._length
+        return "\n".join(lines)
+
+    def to_csv(self, path):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(list(self.columns))
+            for i in range(self._length):
+                writer.writerow(["" if column[i] is None else column[i]
+                                 for column in self.columns.values()])
+
+    def to_npz(self, path):
+        """每列一个数组：没有缺失的整数列为 int64，其它数值列为 float64（缺失为 NaN），其余为字符串"""
+        arrays = {}
+        for name, column in self.columns.items():
+            values = [v for v in column if v is not None]
+            if len(values) == len(column) and all(isinstance(v, (int, np.integer))
+                                                  and not isinstance(v, bool) for v in values):
+                arrays[name] = np.array(values, dtype=np.int64)
+            elif all(isinstance(v, (int, float, np.number)) for v in values):
+                arrays[name] = self.column(name)
+            else:
+                arrays[name] = np.array(["" if v is None else str(v) for v in column])
+        arrays["__header__"] = np.array(self.header or [])
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load_npz(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            logbook = cls([str(name) for name in data["__header__"]])
+            names = [name for name in data.files if name != "__header__"]
+            logbook._length = len(data[names[0]]) if names else 0
+            for name in names:
+                values = data[name].tolist()
+                kind = data[name].dtype.kind
+                if kind == "f":
+                    values = [None if v != v else v for v in values]
+                elif kind != "i":
+                    values = [v or None for v in values]
+                logbook.columns[name] = values
+        return logbook
+
+
+__all__ = ['FitnessStats', 'ColumnarLogbook', 'DEFAULT_QUANTILES', 'DEFAULT_SAMPLE_SIZE']
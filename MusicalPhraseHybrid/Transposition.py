@@ -0,0 +1,52 @@
+"""
+移调查找表
+
+KEY_SHIFT[a][b]  : shift_pitch_to_key 从调 a 平移到调 b 时加上的半音数，即 (b - a) % 12
+KEY_OFFSET[a][b] : crossover 中把调 a 的片段放进调 b 的子代时加上的半音数
+
+原 GetChild 先把两个父代平移到 C，杂交后再平移回各自的调，片段实际加上的是
+KEY_SHIFT[a][C] + KEY_SHIFT[C][b]。a == b 且不是 C 调时这一来回等于 +12，整条子代
+被抬高一个八度。KEY_OFFSET 去掉了这个八度漂移：同调的片段不动（来回平移可以整个
+跳过），不同调的片段之间的相对音程与原来完全相同。并且
+KEY_OFFSET[a][b] == -KEY_OFFSET[b][a]，平移过去再平移回来正好还原。
+
+查找表是纯 Python 的元组，Crossover 导入本模块不会载入 NumPy；
+只有 transpose_packed 用到 NumPy。
+"""
+from Settings import Notes
+
+KEY_INDEX = {k: i for i, k in enumerate(Notes)}
+KEY_SHIFT = tuple(tuple((b - a) % 12 for b in range(12)) for a in range(12))
+KEY_OFFSET = tuple(
+    tuple(KEY_SHIFT[a][0] + KEY_SHIFT[0][b] - (12 if b else 0) for b in range(12))
+    for a in range(12)
+)
+
+
+def key_offset(from_key, to_key):
+    """调 from_key 的片段放进调 to_key 的子代时加上的半音数"""
+    return KEY_OFFSET[KEY_INDEX[from_key]][KEY_INDEX[to_key]]
+
+
+def transpose(pitch_list, offset):
+    """每个音高加上 offset，空拍(None)不变"""
+    return [None if p is None else p + offset for p in pitch_list]
+
+
+def transpose_packed(pitch, offsets):
+    """
+    (n, W) pitch 矩阵逐行加上 offsets[i]，空拍(REST)与补齐位置不变
+
+    返回新矩阵，offsets 可以是标量或 (n,) 数组
+    """
+    import numpy as np
+    from Packing import REST
+    offsets = np.asarray(offsets, dtype=pitch.dtype)
+    if offsets.ndim:
+        offsets = offsets[:, None]
+    return np.where(pitch == REST, pitch, pitch + offsets)
+
+
+__all__ = [
+    'KEY_SHIFT', 'KEY_OFFSET', 'KEY_INDEX', 'key_offset', 'transpose', 'transpose_packed'
+]
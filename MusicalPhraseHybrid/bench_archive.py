@@ -0,0 +1,77 @@
+"""
+精英档案基准：tools.HallOfFame 与 EliteArchive 的更新耗时
+
+用法:
+    python bench_archive.py [代数]
+
+模拟一次进化：每代用 POPULATION 个已评估的个体（含大量重复）更新名人堂，
+比较不同容量下每代更新（以及读取 [0]）的平均耗时与最终收录的条数。
+EliteArchive 把移调后相同的旋律也视为重复，收录条数可能少于 HallOfFame。
+开始计时前先检查这一点：C 调旋律与它的各调移调版本只收录一条。
+"""
+import random
+import sys
+import time
+
+from deap import tools
+
+import demo
+from EliteArchive import EliteArchive
+from Settings import Notes
+from Fitness import evaluate_population
+from zcs_melody import generate_melodies
+
+POPULATION = 200
+SIZES = (1, 100, 1000, 5000)
+
+
+def generations(ngen):
+    """ngen 代种群；每代一半是前一代个体的拷贝，模拟进化中的重复"""
+    random.seed(0)
+    previous = []
+    for _ in range(ngen):
+        fresh = generate_melodies(POPULATION - len(previous), key="C",
+                                  melody_creator=demo.Get_Melody_Creator)
+        for ind, fit in zip(fresh, evaluate_population(fresh)):
+            ind.fitness.values = fit
+        population = previous + fresh
+        yield population
+        previous = [demo.toolbox.clone(ind) for ind in random.sample(population, POPULATION // 2)]
+
+
+def check_transposed_duplicates():
+    """C 调旋律与它在其它 11 个调上的移调版本应只收录一条"""
+    random.seed(0)
+    base = generate_melodies(1, key="C", melody_creator=demo.Get_Melody_Creator)[0]
+    copies = [base] + [demo.Get_Melody_Creator(
+        key, [None if p is None else p + k for p in base.pitch], list(base.beat))
+        for k, key in enumerate(Notes) if k]
+    for fit, ind in enumerate(reversed(copies)):
+        ind.fitness.values = (float(fit),)
+    archive = EliteArchive(len(copies))
+    archive.update(copies)
+    assert len(archive) == 1, f"移调去重失败：收录了 {len(archive)} 条"
+    assert archive[0].key == "C" and base in archive
+    for ind in copies:
+        assert ind in archive
+
+
+def main(ngen):
+    check_transposed_duplicates()
+    populations = list(generations(ngen))
+    print(f"{ngen} 代，每代 {POPULATION} 个个体")
+    print(f"{'容量':>6} {'HallOfFame(ms/代)':>18} {'EliteArchive(ms/代)':>20} {'条数':>12}")
+    for size in SIZES:
+        results = []
+        for hof in (tools.HallOfFame(size), EliteArchive(size)):
+            start = time.perf_counter()
+            for population in populations:
+                hof.update(population)
+                hof[0]
+            results.append(((time.perf_counter() - start) / ngen * 1e3, len(hof)))
+        (hof_ms, hof_len), (archive_ms, archive_len) = results
+        print(f"{size:>6} {hof_ms:>18.2f} {archive_ms:>20.2f} {hof_len:>6}/{archive_len:<5}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,64 @@
+"""
+Controller 基准：固定代数 vs 提前停止 + 自适应概率
+
+用法:
+    python bench_controller.py [种子个数]
+
+对每个随机种子，用相同的初始种群分别运行：
+    fixed      : 固定 NGEN 代，CXPB / MUTPB 不变（原 demo 的做法）
+    controller : 同样以 NGEN 为上限，由 Controller 控制
+输出两者的平均最优适应度、适应度请求数（各代 nevals 之和）、实际评估次数（demo 默认的
+适应度缓存未命中的次数，也就是 Controller 的 max_evals 计数的量）、代数与耗时。
+"""
+import random
+import sys
+import time
+
+import numpy as np
+from deap import tools
+
+import demo
+from Controller import Controller
+from Evolution import evolve
+from zcs_melody import generate_melodies
+
+NGEN = 150
+POPULATION_SIZE = 200
+
+
+def run_once(seed, use_controller):
+    random.seed(seed)
+    np.random.seed(seed)
+    demo.fitness_cache.clear()
+    population = generate_melodies(POPULATION_SIZE, key="C",
+                                   melody_creator=demo.Get_Melody_Creator)
+    hof = tools.HallOfFame(1)
+    controller = None
+    if use_controller:
+        controller = Controller(demo.CXPB, demo.MUTPB, patience=demo.PATIENCE)
+        controller.attach(demo.toolbox)
+    start = time.perf_counter()
+    requests = 0
+    try:
+        for state in evolve(population, demo.toolbox, demo.CXPB, demo.MUTPB, NGEN,
+                            halloffame=hof):
+            requests += state.nevals
+    finally:
+        if controller is not None:
+            controller.detach()
+    return (hof[0].fitness.values[0], requests, demo.fitness_cache.misses, state.gen,
+            time.perf_counter() - start)
+
+
+def main(seeds):
+    print(f"种群 {POPULATION_SIZE}，最多 {NGEN} 代，{seeds} 个种子")
+    print(f"{'':<12} {'最优适应度':>10} {'适应度请求':>10} {'实际评估':>10} {'代数':>6} {'耗时(s)':>8}")
+    for name, use_controller in (("fixed", False), ("controller", True)):
+        results = np.array([run_once(seed, use_controller) for seed in range(seeds)])
+        best, requests, evals, gens, elapsed = results.mean(axis=0)
+        print(f"{name:<12} {best:>10.2f} {requests:>10.0f} {evals:>10.0f} {gens:>6.1f} "
+              f"{elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,82 @@
+"""
+crossover 基准：比较原下标 crossover 与按起音时刻 crossover 的合法切点产出
+
+用法:
+    python bench_crossover.py [配对数]
+
+对随机生成的父代配对统计：
+- 至少有一个合法切点（即真正发生交换而不是返回拷贝）的配对比例
+- 平均合法切点数
+- 每次调用耗时
+以及整对父代（含移调、创建子代）逐对调用 GetChild 与整批 mate_population 的耗时，
+父代分为随机调与同调两种情况
+"""
+import random
+import sys
+import time
+
+from BatchCrossover import mate_population
+from Crossover import GetChild, crossover, onset_crossover, shared_onsets
+from Settings import Notes, register_types
+from zcs_melody import generate_melody
+
+DEFAULT_PAIRS = 20000
+
+
+def index_points(parent1_beat, parent2_beat):
+    """与 crossover 相同的合法切点判断"""
+    points = []
+    t1 = t2 = 0
+    for k in range(1, min(len(parent1_beat), len(parent2_beat))):
+        t1 += parent1_beat[k - 1]
+        t2 += parent2_beat[k - 1]
+        if t1 == t2:
+            points.append(k)
+    return points
+
+
+def timed(func, pairs):
+    start = time.perf_counter()
+    for p1, p2 in pairs:
+        func(p1[1], p1[2], p2[1], p2[2])
+    return (time.perf_counter() - start) / len(pairs) * 1e6
+
+
+def main(n_pairs):
+    random.seed(0)
+    pairs = [(generate_melody(), generate_melody()) for _ in range(n_pairs)]
+
+    index_counts = [len(index_points(p1[2], p2[2])) for p1, p2 in pairs]
+    onset_counts = [len(shared_onsets(p1[2], p2[2])) for p1, p2 in pairs]
+
+    print(f"配对数: {n_pairs}")
+    print(f"{'mode':<8} {'有切点比例':>10} {'平均切点数':>10} {'us/次':>8}")
+    for name, counts, func in (("index", index_counts, crossover),
+                               ("onset", onset_counts, onset_crossover)):
+        hit = sum(1 for c in counts if c) / n_pairs
+        mean = sum(counts) / n_pairs
+        print(f"{name:<8} {hit:>10.1%} {mean:>10.2f} {timed(func, pairs):>8.2f}")
+
+    Melody = register_types()
+    print(f"\n{'父代':<6} {'mode':<8} {'GetChild(ms)':>13} {'批量(ms)':>10}")
+    for label, same_key in (("随机调", False), ("同调", True)):
+        keys = []
+        for _ in pairs:
+            key1 = random.choice(Notes)
+            keys.append((key1, key1 if same_key else random.choice(Notes)))
+        for mode in ("index", "onset"):
+            # mate_population 原地修改，每种 mode 都从同一批父代开始
+            melody_pairs = [(Melody(k1, p1[1][:], p1[2][:]), Melody(k2, p2[1][:], p2[2][:]))
+                            for (k1, k2), (p1, p2) in zip(keys, pairs)]
+            start = time.perf_counter()
+            for p1, p2 in melody_pairs:
+                GetChild(p1, p2, mode=mode)
+            scalar = time.perf_counter() - start
+            start = time.perf_counter()
+            mate_population(melody_pairs, mode=mode)
+            batch = time.perf_counter() - start
+            print(f"{label:<6} {mode:<8} {scalar * 1e3:>13.1f} {batch * 1e3:>10.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PAIRS)
@@ -0,0 +1,143 @@
+"""
+增量评估检查与基准：DeltaFitness.evaluate_incremental 与全量 evaluate_melody 逐步对照
+
+用法:
+    python bench_delta.py [变异链数] [每条链的变异次数]
+
+1. 随机检查：从固定种子生成的旋律出发连续做 melody_mutation（indpb=1，七种变异都会
+   用到），每一步都比较 evaluate_incremental 与 evaluate_melody，不一致时报错退出
+2. 边界情况：在跨小节线的音符、小节末尾 / 开头 / 结尾的空拍、连续空拍与长连唱上反复做
+   ChangePitch / ChangeRhythm / SplitNote / MergeNotes，同样逐步对照，并确认确实出现了
+   改动跨过小节线、改动涉及空拍的情况
+3. 计时：上面各步中两种评估的平均耗时
+"""
+import math
+import random
+import sys
+import time
+
+import Mutations
+from DeltaFitness import evaluate_incremental
+from Fitness import evaluate_melody
+from Settings import Notes, register_types
+from zcs_melody import generate_melody
+
+DEFAULT_CHAINS = 200
+DEFAULT_STEPS = 30
+EDGE_SEEDS = 200
+EDGE_STEPS = 20
+BAR = 48        # 一小节的时值（四分音符 = 12）
+LOCAL_MUTATIONS = (Mutations.ChangePitch, Mutations.ChangeRhythm,
+                   Mutations.SplitNote, Mutations.MergeNotes)
+
+# (调性, pitch, beat)：总时值都是 192
+EDGE_MELODIES = [
+    # 跨小节线的音符、小节末尾的空拍、恰好结束在小节线上的音符
+    ("C", [None, 60, 62, 64, None, 65, 67, None, None, 72, 71, 60],
+          [6, 30, 24, 24, 12, 18, 30, 6, 6, 24, 6, 6]),
+    # 开头的连续空拍、整小节的长音、结尾的空拍
+    ("G", [None, None, 67, 69, None, None, 64, 62, 60, None],
+          [12, 6, 30, 48, 6, 18, 24, 24, 12, 12]),
+    # 很长的连唱，中间只有一个空拍
+    ("D", [62, 64, 66, 67, 69, 71, 73, 74, None, 74, 73, 71, 69, 67, 66, 64, 62],
+          [12] * 15 + [6, 6]),
+]
+
+
+def _changed_span(before, after):
+    """
+    两个版本 (pitch, beat) 不同的部分：返回 (起始时刻, 结束时刻, 是否涉及空拍)，
+    时刻按改动后的版本计算；完全相同时返回 None
+    """
+    old = list(zip(*before))
+    new = list(zip(*after))
+    lo = 0
+    while lo < min(len(old), len(new)) and old[lo] == new[lo]:
+        lo += 1
+    if lo == len(old) == len(new):
+        return None
+    hi_old, hi_new = len(old), len(new)
+    while hi_old > lo and hi_new > lo and old[hi_old - 1] == new[hi_new - 1]:
+        hi_old -= 1
+        hi_new -= 1
+    start = sum(after[1][:lo])
+    end = start + sum(after[1][lo:hi_new])
+    rest = any(p is None for p, _ in old[lo:hi_old] + new[lo:hi_new])
+    return start, end, rest
+
+
+class Checker:
+    """逐步对照两种评估，统计耗时与覆盖到的边界情况"""
+
+    def __init__(self):
+        self.steps = 0
+        self.incremental_time = 0.0
+        self.full_time = 0.0
+        self.across_bar = 0
+        self.on_rest = 0
+
+    def run(self, melody, steps, mutate, label):
+        evaluate_incremental(melody)   # 构建 fitness_terms
+        for step in range(steps):
+            before = (melody.pitch[:], melody.beat[:])
+            mutate(melody)
+            if len(melody.pitch) < 3:
+                break   # 两者都交给 evaluate_melody（它要求至少 3 个音符）
+            start = time.perf_counter()
+            incremental = evaluate_incremental(melody)[0]
+            middle = time.perf_counter()
+            full = evaluate_melody(melody)[0]
+            self.incremental_time += middle - start
+            self.full_time += time.perf_counter() - middle
+            self.steps += 1
+            if not math.isclose(incremental, full, rel_tol=1e-9, abs_tol=1e-6):
+                raise AssertionError(
+                    f"{label} 第 {step} 步不一致：增量 {incremental!r}，全量 {full!r}\n"
+                    f"  变异前 pitch={before[0]} beat={before[1]}\n"
+                    f"  变异后 pitch={melody.pitch} beat={melody.beat}")
+            span = _changed_span(before, (melody.pitch, melody.beat))
+            if span is not None:
+                lo, hi, rest = span
+                self.across_bar += any(lo < b < hi for b in range(BAR, hi, BAR))
+                self.on_rest += rest
+
+
+def check_random(checker, Melody, chains, steps):
+    random.seed(0)
+    for c in range(chains):
+        key = random.choice(Notes)
+        melody = Melody(*generate_melody(key=key))
+        checker.run(melody, steps, lambda m: Mutations.melody_mutation(m, indpb=1.0),
+                    f"随机链 {c}")
+
+
+def check_edges(checker, Melody):
+    for e, (key, pitch, beat) in enumerate(EDGE_MELODIES):
+        for seed in range(EDGE_SEEDS):
+            random.seed(seed)
+            melody = Melody(key, pitch[:], beat[:])
+            checker.run(melody, EDGE_STEPS, lambda m: random.choice(LOCAL_MUTATIONS)(m),
+                        f"边界旋律 {e} / 种子 {seed}")
+
+
+def main(chains, steps):
+    Melody = register_types()
+    random_checker = Checker()
+    check_random(random_checker, Melody, chains, steps)
+    print(f"随机检查: {random_checker.steps} 步变异，增量评估与全量评估全部一致")
+
+    edge_checker = Checker()
+    check_edges(edge_checker, Melody)
+    assert edge_checker.across_bar and edge_checker.on_rest, "边界情况没有覆盖到"
+    print(f"边界检查: {edge_checker.steps} 步变异全部一致（跨小节线 {edge_checker.across_bar} 次，"
+          f"涉及空拍 {edge_checker.on_rest} 次）")
+
+    n = random_checker.steps
+    print(f"\n{'评估':<20} {'us/次':>8}")
+    print(f"{'evaluate_melody':<20} {random_checker.full_time / n * 1e6:>8.2f}")
+    print(f"{'evaluate_incremental':<20} {random_checker.incremental_time / n * 1e6:>8.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CHAINS,
+         int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_STEPS)
@@ -0,0 +1,103 @@
+"""
+Diversity 基准：小生境计数的速度与精度，以及共享适应度选择对进化的影响
+
+用法:
+    python bench_diversity.py [种子个数]
+
+1. 小生境计数：MelodyIndex（局部敏感哈希）与 O(n²) 两两比较的耗时、
+   两者计数的相关系数（种群为若干随机旋律及其单音变异，含大量近似重复）
+2. 进化：种群 200、100 代，tools.selTournament 与 sel_shared_tournament 的
+   平均最优适应度，以及最后一代中互不相同的旋律所占比例
+"""
+import random
+import sys
+import time
+
+import numpy as np
+from deap import tools
+
+import demo
+import Mutations
+from Diversity import (MelodyIndex, GRID_SLOTS, ONSET_WEIGHT, SHARE_SIGMA,
+                       contour_grid, sel_shared_tournament, _popcount)
+from Evolution import evolve
+from Packing import pack_melodies
+from RhythmPool import onset_masks
+from Settings import Melody
+from zcs_melody import generate_melody, generate_melodies
+
+INDEX_SIZES = (1000, 4000, 10_000, 100_000)
+EXACT_LIMIT = 4000   # 超过该规模不再计算 O(n²) 的精确结果
+NGEN = 100
+
+
+def clustered_population(n):
+    """n/4 条随机旋律，每条再加 3 个单音变异的副本"""
+    population = []
+    for _ in range(n // 4):
+        melody = Melody(*generate_melody(key="C"))
+        population.append(melody)
+        for _ in range(3):
+            mutant = Melody(melody.key, melody.pitch[:], melody.beat[:])
+            Mutations.ChangePitch(mutant)
+            population.append(mutant)
+    return population
+
+
+def exact_niche_counts(packed, sigma=SHARE_SIGMA):
+    grid = contour_grid(packed)
+    masks = onset_masks(packed.beat, packed.lengths)
+    counts = np.zeros(len(grid))
+    for i in range(len(grid)):
+        d = np.abs(grid - grid[i]).mean(axis=1) \
+            + ONSET_WEIGHT * _popcount(masks ^ masks[i]) / GRID_SLOTS
+        counts[i] = np.maximum(1.0 - d / sigma, 0.0).sum()
+    return counts
+
+
+def bench_index():
+    print(f"{'规模':>8} {'索引(s)':>9} {'两两比较(s)':>12} {'相关系数':>9}")
+    for n in INDEX_SIZES:
+        random.seed(0)
+        if n <= EXACT_LIMIT:
+            packed = pack_melodies(clustered_population(n))
+        else:
+            packed = generate_melodies(n, key="C")
+        start = time.perf_counter()
+        approx = MelodyIndex(packed).niche_counts()
+        indexed = time.perf_counter() - start
+        if n <= EXACT_LIMIT:
+            start = time.perf_counter()
+            exact = exact_niche_counts(packed)
+            pairwise = time.perf_counter() - start
+            corr = np.corrcoef(exact, approx)[0, 1]
+            print(f"{n:>8} {indexed:>9.3f} {pairwise:>12.3f} {corr:>9.3f}")
+        else:
+            print(f"{n:>8} {indexed:>9.3f} {'-':>12} {'-':>9}")
+
+
+def run_once(seed, select, **options):
+    random.seed(seed)
+    np.random.seed(seed)
+    demo.toolbox.register("select", select, tournsize=3, **options)
+    population = generate_melodies(demo.POPULATION_SIZE, key="C",
+                                   melody_creator=demo.Get_Melody_Creator)
+    hof = tools.HallOfFame(1)
+    for _ in evolve(population, demo.toolbox, demo.CXPB, demo.MUTPB, NGEN, halloffame=hof):
+        pass
+    distinct = len({(tuple(m.pitch), tuple(m.beat)) for m in population}) / len(population)
+    return hof[0].fitness.values[0], distinct
+
+
+def bench_selection(seeds):
+    demo.fitness_cache.enabled = False
+    print(f"\n种群 {demo.POPULATION_SIZE}，{NGEN} 代，{seeds} 个种子")
+    print(f"{'':<12} {'最优适应度':>10} {'不同旋律比例':>12}")
+    for name, select in (("tournament", tools.selTournament), ("shared", sel_shared_tournament)):
+        best, distinct = np.array([run_once(seed, select) for seed in range(seeds)]).mean(axis=0)
+        print(f"{name:<12} {best:>10.2f} {distinct:>12.1%}")
+
+
+if __name__ == "__main__":
+    bench_index()
+    bench_selection(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,54 @@
+"""
+导入耗时基准：每个模块在全新的解释器中导入，测冷启动耗时
+
+用法:
+    python bench_import.py [重复次数]
+
+每个模块取多次的最小值，并减去空解释器启动的耗时；同时列出导入后已经被载入的
+重型依赖（numpy、deap.tools、deap.algorithms），用来检查算子模块是否保持轻量。
+进程池的工作进程、测试在启动时只需要导入这些模块中的一部分。
+"""
+import json
+import subprocess
+import sys
+
+MODULES = [
+    "Settings", "Crossover", "Mutations", "DeltaFitness", "Fitness",
+    "Packing", "BatchMutations", "Evolution", "Parallel", "demo",
+]
+HEAVY = ["numpy", "deap.creator", "deap.tools", "deap.algorithms"]
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+import json
+print(json.dumps([elapsed, [m for m in {heavy!r} if m in sys.modules]]))
+"""
+
+
+def measure(statement, repeat):
+    """在 repeat 个新进程中执行 statement，返回 (最短耗时秒, 载入的重型依赖)"""
+    best, loaded = float("inf"), []
+    code = _PROBE.format(statement=statement, heavy=HEAVY)
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], check=True,
+                             capture_output=True, text=True).stdout
+        elapsed, loaded = json.loads(out.strip().splitlines()[-1])
+        best = min(best, elapsed)
+    return best, loaded
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'模块':<16} {'导入耗时(ms)':>12}  载入的重型依赖")
+    for module in MODULES:
+        elapsed, loaded = measure(f"import {module}", repeat)
+        print(f"{module:<16} {elapsed * 1e3:>12.1f}  {', '.join(loaded) or '-'}")
+    elapsed, loaded = measure("import Settings; Settings.register_types()", repeat)
+    print(f"{'register_types':<16} {elapsed * 1e3:>12.1f}  {', '.join(loaded) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+内存基准：比较 Melody（列表存储）与 CompactMelody（数组存储 + __slots__）
+
+用法:
+    python bench_memory.py                 # 10k / 100k / 1M 个体
+    python bench_memory.py 10000 100000    # 自定义规模
+
+两种类型都按 demo 的方式经 creator.create 包装（带 fitness），
+用 tracemalloc 统计构造 N 个个体新增的内存。
+"""
+import gc
+import random
+import sys
+import tracemalloc
+
+from deap import base, creator
+
+from Settings import Melody, CompactMelody
+from zcs_melody import generate_melody
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+TEMPLATE_COUNT = 1000
+
+creator.create("BenchFitness", base.Fitness, weights=(1.0,))
+creator.create("BenchListMelody", Melody, fitness=creator.BenchFitness, __slots__=())
+creator.create("BenchCompactMelody", CompactMelody, fitness=creator.BenchFitness, __slots__=())
+
+
+def measure(melody_type, templates, n):
+    """返回构造 n 个个体新增的字节数"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    population = [melody_type(key, pitch[:], beat[:])
+                  for key, pitch, beat in (templates[i % len(templates)] for i in range(n))]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del population
+    return after - before
+
+
+def main(sizes):
+    random.seed(0)
+    templates = [generate_melody() for _ in range(TEMPLATE_COUNT)]
+    notes = sum(len(t[1]) for t in templates) / len(templates)
+    print(f"平均音符数: {notes:.1f}")
+    print(f"{'N':>10} {'Melody':>12} {'Compact':>12} {'B/ind':>8} {'B/ind':>8} {'ratio':>6}")
+    for n in sizes:
+        plain = measure(creator.BenchListMelody, templates, n)
+        compact = measure(creator.BenchCompactMelody, templates, n)
+        print(f"{n:>10} {plain / 2**20:>10.1f}MB {compact / 2**20:>10.1f}MB "
+              f"{plain / n:>8.0f} {compact / n:>8.0f} {plain / compact:>6.2f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,51 @@
+"""
+变异算子微基准：逐个统计 mutation_strategies 中每种变异的单次耗时
+
+用法:
+    python bench_mutations.py [每种变异的调用次数]
+
+每次调用前从固定种子生成的模板复制一个新个体，复制的开销单独测出后扣除。
+"""
+import random
+import sys
+import time
+
+import Mutations
+from Settings import Notes, register_types
+from zcs_melody import generate_melody
+
+DEFAULT_CALLS = 20000
+TEMPLATE_COUNT = 500
+
+
+def main(calls):
+    Melody = register_types()
+    random.seed(0)
+    templates = []
+    for _ in range(TEMPLATE_COUNT):
+        key = random.choice(Notes)
+        templates.append(generate_melody(key=key))
+
+    def fresh(i):
+        key, pitch, beat = templates[i % TEMPLATE_COUNT]
+        return Melody(key, pitch[:], beat[:])
+
+    overhead = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for i in range(calls):
+            fresh(i)
+        overhead = min(overhead, time.perf_counter() - start)
+
+    print(f"{'strategy':<14} {'us/次':>8}")
+    for strategy in Mutations.mutation_strategies:
+        random.seed(1)
+        start = time.perf_counter()
+        for i in range(calls):
+            strategy(fresh(i))
+        elapsed = time.perf_counter() - start - overhead
+        print(f"{strategy.__name__:<14} {elapsed / calls * 1e6:>8.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CALLS)
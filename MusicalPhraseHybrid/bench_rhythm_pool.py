@@ -0,0 +1,76 @@
+"""
+节奏型池基准：构建 / 读取缓存 / 抽样 / 切点查询的耗时
+
+用法:
+    python bench_rhythm_pool.py [旋律条数]
+
+- 构建：枚举小节节奏型并写入磁盘缓存；读取：从缓存文件还原
+- 抽样：generate_melodies 逐音符抽取节奏 与 从节奏型池按小节抽取 的对比
+- 切点：Crossover.shared_onsets 双指针 与 起音位图按位与 的对比
+- 配对：在打包种群中找出与某个体有共同切点的所有个体
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from Crossover import shared_onsets
+from RhythmPool import (RhythmPool, onset_mask, onset_masks, shared_onsets_by_mask,
+                        compatible_partners)
+from zcs_melody import generate_melodies
+
+DEFAULT_COUNT = 100000
+
+
+def timed(func, repeat=1):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(count):
+    random.seed(0)
+    rng = np.random.default_rng(0)
+
+    elapsed, pool = timed(RhythmPool.build, repeat=5)
+    print(f"节奏型数: {len(pool)}")
+    print(f"构建: {elapsed * 1e3:.2f} ms")
+    path = os.path.join(tempfile.mkdtemp(), "rhythm_pool.npz")
+    elapsed, _ = timed(lambda: pool.save(path), repeat=5)
+    print(f"写缓存: {elapsed * 1e3:.2f} ms")
+    elapsed, _ = timed(lambda: RhythmPool.load(path), repeat=5)
+    print(f"读缓存: {elapsed * 1e3:.2f} ms")
+
+    elapsed, _ = timed(lambda: generate_melodies(count), repeat=3)
+    print(f"\n{count} 条旋律  逐音符抽取: {elapsed * 1e3:.1f} ms")
+    elapsed, _ = timed(lambda: generate_melodies(count, bar_rhythms=True), repeat=3)
+    print(f"{count} 条旋律  按小节抽取: {elapsed * 1e3:.1f} ms")
+    elapsed, _ = timed(lambda: pool.rhythms(pool.sample(count, rng=rng)), repeat=3)
+    print(f"{count} 条节奏  (仅节奏): {elapsed * 1e3:.1f} ms")
+
+    packed = generate_melodies(count)
+    rows = [packed.beat[i, :packed.lengths[i]].tolist() for i in range(min(count, 20000))]
+    pairs = list(zip(rows, rows[1:]))
+    elapsed, _ = timed(lambda: [shared_onsets(a, b) for a, b in pairs])
+    print(f"\n共同切点  双指针: {elapsed / len(pairs) * 1e6:.2f} us/对")
+    masks = [onset_mask(b) for b in rows]
+    mask_pairs = list(zip(masks, masks[1:]))
+    elapsed, _ = timed(lambda: [shared_onsets_by_mask(a, b) for a, b in mask_pairs])
+    print(f"共同切点  位图(已有位图): {elapsed / len(pairs) * 1e6:.2f} us/对")
+    elapsed, _ = timed(lambda: [a & b & ~1 != 0 for a, b in mask_pairs])
+    print(f"是否可交换  位图: {elapsed / len(pairs) * 1e6:.3f} us/对")
+
+    elapsed, all_masks = timed(lambda: onset_masks(packed.beat, packed.lengths), repeat=3)
+    print(f"\n{count} 个体起音位图: {elapsed * 1e3:.1f} ms")
+    elapsed, partners = timed(lambda: compatible_partners(all_masks, all_masks[0]), repeat=5)
+    print(f"查找可配对个体: {elapsed * 1e3:.2f} ms（{len(partners)} 个）")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_COUNT)
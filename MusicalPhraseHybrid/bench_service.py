@@ -0,0 +1,127 @@
+"""
+Service 负载测试：并发客户端向本机旋律生成服务发送请求，统计延迟与吞吐量
+
+用法:
+    python bench_service.py [--clients 16] [--requests 4] [--ngen 20] [--population 100]
+                            [--port PORT] [--max-batch 1 16]
+
+不指定 --port 时，对 --max-batch 中的每个取值各启动一个 Service.py 子进程（随机空闲端口），
+依次测试，便于比较合批的效果；指定 --port 时只测试已经在运行的服务。
+每个客户端各用一条连接，依次发送 requests 个请求（收到结果后再发下一个），统计：
+- 吞吐量：完成的请求数 / 总耗时
+- 首次进度：发出请求到收到第 0 代进度的时间（中位数）
+- 延迟：发出请求到收到结果的时间（中位数与 95 分位）
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+SEED_TEXT = """@key=C
+C4 24
+E4 24
+G4 24
+C5 24
+B4 24
+G4 24
+E4 24
+D4 24
+"""
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def _client(host, port, index, args, latencies, first_progress):
+    reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+    for i in range(args.requests):
+        request = {"id": f"{index}-{i}", "text": SEED_TEXT, "ngen": args.ngen,
+                   "population": args.population}
+        start = time.perf_counter()
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        while True:
+            event = json.loads(await reader.readline())
+            if event["event"] == "progress" and event["gen"] == 0:
+                first_progress.append(time.perf_counter() - start)
+            elif event["event"] in ("result", "error"):
+                latencies.append(time.perf_counter() - start)
+                break
+    writer.close()
+
+
+async def _load(host, port, args):
+    latencies, first_progress = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, c, args, latencies, first_progress)
+                           for c in range(args.clients)))
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, first_progress, latencies
+
+
+async def _wait_for_server(host, port, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+def _report(label, result):
+    throughput, first_progress, latencies = result
+    print(f"{label:<12} {throughput:>10.2f} {_percentile(first_progress, 0.5):>10.3f} "
+          f"{_percentile(latencies, 0.5):>10.3f} {_percentile(latencies, 0.95):>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="旋律生成服务负载测试")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=4, help="每个客户端的请求数")
+    parser.add_argument("--ngen", type=int, default=20)
+    parser.add_argument("--population", type=int, default=100)
+    parser.add_argument("--max-batch", type=int, nargs="+", default=[1, 16])
+    args = parser.parse_args()
+
+    print(f"{args.clients} 个客户端 x {args.requests} 个请求，"
+          f"ngen={args.ngen}，population={args.population}")
+    print(f"{'':<12} {'请求/秒':>10} {'首次进度(s)':>10} {'延迟p50(s)':>10} {'延迟p95(s)':>10}")
+    if args.port is not None:
+        _report(f"{args.host}:{args.port}", asyncio.run(_load(args.host, args.port, args)))
+        return
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    for max_batch in args.max_batch:
+        port = _free_port()
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(here, "Service.py"), "--host", args.host,
+             "--port", str(port), "--max-batch", str(max_batch)],
+            cwd=here, stdout=subprocess.DEVNULL)
+        try:
+            asyncio.run(_wait_for_server(args.host, port))
+            _report(f"max_batch={max_batch}", asyncio.run(_load(args.host, port, args)))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
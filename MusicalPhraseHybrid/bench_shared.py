@@ -0,0 +1,95 @@
+"""
+共享内存种群基准：Parallel.ProcessPoolMap 与 SharedPopulation 的每代进程间通信量和耗时
+
+用法:
+    python bench_shared.py [种群大小] [进程数]
+
+两种方式都跑 NGEN 代（杂交、变异、评估都交给进程池），统计：
+- 每代主进程发给工作进程、以及工作进程返回的 pickle 字节数
+- 每代耗时（进程数超过 CPU 核数时耗时没有参考意义）
+"""
+import os
+import random
+import sys
+import time
+from multiprocessing.reduction import ForkingPickler
+
+import numpy as np
+
+import demo
+from Evolution import evolve
+from Parallel import ProcessPoolMap
+from SharedPopulation import SharedPopulation, SharedPopulationPool, evolve_shared
+from zcs_melody import generate_melodies
+
+NGEN = 20
+
+
+def _size(obj):
+    return len(ForkingPickler.dumps(obj))
+
+
+class CountingPoolMap(ProcessPoolMap):
+    """按 ProcessPoolMap 的分块方式统计发送与返回的字节数"""
+
+    bytes = 0
+
+    def __call__(self, func, iterable):
+        items = list(iterable)
+        results = super().__call__(func, items)
+        for i in range(0, len(items), self.chunksize):
+            self.bytes += _size((func, items[i:i + self.chunksize], 0))
+            self.bytes += _size(results[i:i + self.chunksize])
+        return results
+
+
+class CountingSharedPool(SharedPopulationPool):
+    """统计每个分块任务的参数与返回值字节数"""
+
+    bytes = 0
+
+    def run(self, task, store, *args):
+        chunks = -(-len(store) // self.chunksize)
+        self.bytes += chunks * (_size((task, store, 0, 0, 2**63, *args))
+                                + _size(0))
+        return super().run(task, store, *args)
+
+
+def bench_pool_map(population, processes):
+    demo.fitness_cache.enabled = False
+    pool = CountingPoolMap(processes=processes)
+    demo.toolbox.register("map", pool)
+    start = time.perf_counter()
+    try:
+        for _ in evolve(population, demo.toolbox, demo.CXPB, demo.MUTPB, NGEN):
+            pass
+    finally:
+        pool.close()
+        demo.toolbox.register("map", map)
+    return pool.bytes / (NGEN + 1), (time.perf_counter() - start) / (NGEN + 1)
+
+
+def bench_shared(population, processes):
+    store = SharedPopulation.from_population(population)
+    start = time.perf_counter()
+    with store, CountingSharedPool(processes=processes) as pool:
+        for _ in evolve_shared(store, demo.CXPB, demo.MUTPB, NGEN, pool=pool,
+                               mode=demo.CROSSOVER_MODE, points=demo.CROSSOVER_POINTS):
+            pass
+    return pool.bytes / (NGEN + 1), (time.perf_counter() - start) / (NGEN + 1)
+
+
+def main(size, processes):
+    print(f"种群 {size}，{NGEN} 代，{processes} 个进程（CPU 核数 {os.cpu_count()}）")
+    print(f"{'':<16} {'通信量/代':>12} {'耗时/代(s)':>11}")
+    for name, bench in (("ProcessPoolMap", bench_pool_map), ("SharedPopulation", bench_shared)):
+        random.seed(0)
+        np.random.seed(0)
+        population = generate_melodies(size, key="C", melody_creator=demo.Get_Melody_Creator)
+        ipc, seconds = bench(population, processes)
+        print(f"{name:<16} {ipc / 1024:>10.1f}KB {seconds:>11.3f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 2)
@@ -0,0 +1,60 @@
+"""
+统计基准：tools.Statistics（demo 原来的 avg/max）与 Stats.FitnessStats 的耗时，
+以及它们占一代（选择 + 杂交 + 变异 + 评估）耗时的比例
+
+用法:
+    python bench_stats.py [种群大小 ...]     # 默认 10k 与 100k
+"""
+import random
+import sys
+import time
+
+import numpy as np
+from deap import tools
+
+import demo
+from Evolution import var_and, evaluate_invalid
+from Stats import FitnessStats
+from zcs_melody import generate_melodies
+
+DEFAULT_SIZES = (10_000, 100_000)
+REPEAT = 5
+
+
+def legacy_stats():
+    stats = tools.Statistics(lambda ind: ind.fitness.values)
+    stats.register("avg", np.mean)
+    stats.register("max", np.max)
+    return stats
+
+
+def timed(func, repeat=REPEAT):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(sizes):
+    demo.fitness_cache.enabled = False
+    print(f"{'规模':>8} {'一代(s)':>9} {'Statistics(ms)':>15} {'FitnessStats(ms)':>17} {'占一代':>8}")
+    for n in sizes:
+        random.seed(0)
+        population = generate_melodies(n, key="C", melody_creator=demo.Get_Melody_Creator)
+        evaluate_invalid(population, demo.toolbox)
+
+        start = time.perf_counter()
+        offspring = var_and(demo.toolbox.select(population, n), demo.toolbox, demo.CXPB, demo.MUTPB)
+        evaluate_invalid(offspring, demo.toolbox)
+        generation = time.perf_counter() - start
+
+        legacy = timed(lambda: legacy_stats().compile(offspring))
+        fast = timed(lambda: FitnessStats().compile(offspring))
+        print(f"{n:>8} {generation:>9.2f} {legacy * 1e3:>15.1f} {fast * 1e3:>17.1f} "
+              f"{fast / generation:>8.2%}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or DEFAULT_SIZES)
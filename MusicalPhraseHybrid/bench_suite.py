@@ -0,0 +1,245 @@
+"""
+基准测试套件：微基准 + 整代吞吐 + 峰值内存，结果写成 JSON 基线，可与之前的基线比较
+
+用法:
+    python bench_suite.py                          # 全部运行，写入 bench_baseline.json
+    python bench_suite.py --quick                  # 缩小调用次数与种群规模，快速检查
+    python bench_suite.py --compare bench_baseline.json   # 与基线比较，本次结果写入 bench_current.json
+    python bench_suite.py --output new.json --compare bench_baseline.json
+
+- micro: shift_pitch_to_key、crossover、7 种变异、generate_melody、evaluate_melody 等
+  的单次耗时（us），取 3 次重复的最小值，固定随机种子
+- macro: 种群 200 / 10k / 100k 时每秒进化的代数；每个规模在单独的子进程中运行，
+  同时记录该子进程的峰值 RSS（MB，仅 Unix）
+--compare 时逐项与基线比较，耗时 / 内存变大或吞吐变小超过 --tolerance 的项视为退化，
+此时以退出码 1 结束，方便在脚本中使用。基线在运行前读入；--output 与 --compare
+不能是同一个文件（否则基线会被本次结果覆盖）。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+SEED = 0
+TEMPLATE_COUNT = 500
+MACRO_SIZES = {200: 20, 10_000: 3, 100_000: 1}      # 种群规模 -> 计时的代数
+QUICK_MACRO_SIZES = {200: 5, 2_000: 2}
+MICRO_NOISE_US = 0.5  # 微基准变化小于该值（us）时不算退化
+DEFAULT_OUTPUT = "bench_baseline.json"
+DEFAULT_COMPARE_OUTPUT = "bench_current.json"   # 指定 --compare 时的默认输出
+
+
+def _best_of(func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_micro(calls):
+    """返回 {名称: 单次调用耗时(us)}"""
+    from deap import creator
+
+    import demo  # 注册 creator 类型
+    import Mutations
+    from Crossover import shift_pitch_to_key, crossover, onset_crossover
+    from Fitness import evaluate_melody, evaluate_population
+    from zcs_melody import generate_melody, generate_melodies
+    from Settings import Notes
+
+    random.seed(SEED)
+    templates = [generate_melody(key=random.choice(Notes)) for _ in range(TEMPLATE_COUNT)]
+    melodies = [creator.Melody(k, p, b) for k, p, b in templates]
+
+    def fresh(i):
+        key, pitch, beat = templates[i % TEMPLATE_COUNT]
+        return creator.Melody(key, pitch[:], beat[:])
+
+    def per_call(func, n=calls):
+        random.seed(SEED)
+        return _best_of(lambda: [func(i) for i in range(n)]) / n * 1e6
+
+    def per_mutation(strategy, n=calls, repeat=3):
+        # 变异是原地修改：每次重复前在计时之外复制好 n 个新个体，只对变异本身计时
+        best = float("inf")
+        for _ in range(repeat):
+            copies = [fresh(i) for i in range(n)]
+            random.seed(SEED)
+            start = time.perf_counter()
+            for ind in copies:
+                strategy(ind)
+            best = min(best, time.perf_counter() - start)
+        return best / n * 1e6
+
+    results = {}
+    results["shift_pitch_to_key"] = per_call(
+        lambda i: shift_pitch_to_key(templates[i % TEMPLATE_COUNT][1], "G", "C"))
+
+    def pair(i):
+        _, p1, b1 = templates[i % TEMPLATE_COUNT]
+        _, p2, b2 = templates[(i + 1) % TEMPLATE_COUNT]
+        return p1, b1, p2, b2
+    results["crossover"] = per_call(lambda i: crossover(*pair(i)))
+    results["onset_crossover"] = per_call(lambda i: onset_crossover(*pair(i)))
+    results["GetChild"] = per_call(
+        lambda i: demo.toolbox.mate(melodies[i % TEMPLATE_COUNT],
+                                    melodies[(i + 1) % TEMPLATE_COUNT]))
+
+    for strategy in Mutations.mutation_strategies:
+        results[f"mutation.{strategy.__name__}"] = per_mutation(strategy)
+
+    results["generate_melody"] = per_call(lambda i: generate_melody(key="C"))
+    batch = max(calls, 1000)
+    random.seed(SEED)
+    results["generate_melodies"] = _best_of(lambda: generate_melodies(batch, key="C")) / batch * 1e6
+    results["evaluate_melody"] = per_call(lambda i: evaluate_melody(melodies[i % TEMPLATE_COUNT]))
+    results["evaluate_population"] = _best_of(
+        lambda: evaluate_population(melodies)) / len(melodies) * 1e6
+    return results
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def macro_child(size, gens):
+    """在当前进程中运行一次整代基准，结果以 JSON 打印到标准输出"""
+    import demo
+    from Evolution import evolve
+    from zcs_melody import generate_melodies
+
+    random.seed(SEED)
+    np.random.seed(SEED)
+    population = generate_melodies(size, key="C", melody_creator=demo.Get_Melody_Creator)
+    generations = evolve(population, demo.toolbox, demo.CXPB, demo.MUTPB, gens,
+                         stats=demo.create_stats())
+    start = time.perf_counter()
+    next(generations)  # 第 0 代：初始评估
+    initial = time.perf_counter() - start
+    start = time.perf_counter()
+    for state in generations:
+        pass
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "gens": gens,
+        "initial_eval_s": initial,
+        "gen_per_sec": gens / elapsed,
+        "peak_rss_mb": _peak_rss_mb(),
+        "best": state.best.fitness.values[0],
+    }))
+
+
+def run_macro(sizes):
+    results = {}
+    for size, gens in sizes.items():
+        out = subprocess.run([sys.executable, __file__, "--macro-child", str(size), str(gens)],
+                             check=True, capture_output=True, text=True).stdout
+        results[str(size)] = json.loads(out.strip().splitlines()[-1])
+        print(f"  种群 {size:>7}: {results[str(size)]['gen_per_sec']:.3f} 代/秒  "
+              f"峰值RSS {results[str(size)]['peak_rss_mb'] or float('nan'):.0f} MB")
+    return results
+
+
+def _higher_is_better(name):
+    """吞吐越大越好，耗时与内存越小越好"""
+    return name.endswith("gen_per_sec")
+
+
+def _flatten(results):
+    flat = {}
+    for name, us in results.get("micro", {}).items():
+        flat[f"micro.{name}"] = us
+    for size, r in results.get("macro", {}).items():
+        for key in ("gen_per_sec", "peak_rss_mb"):
+            if r.get(key) is not None:
+                flat[f"macro.{size}.{key}"] = r[key]
+    return flat
+
+
+def compare(current, baseline, tolerance):
+    """打印逐项对比，返回退化的指标列表"""
+    now, base = _flatten(current), _flatten(baseline)
+    regressions = []
+    print(f"\n{'指标':<34} {'基线':>10} {'本次':>10} {'变化':>8}")
+    for name in sorted(now.keys() & base.keys()):
+        old, new = base[name], now[name]
+        if not old:
+            continue
+        change = new / old - 1
+        worse = -change if _higher_is_better(name) else change
+        noise = name.startswith("micro.") and abs(new - old) < MICRO_NOISE_US
+        flag = "  <-- 退化" if worse > tolerance and not noise else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<34} {old:>10.3f} {new:>10.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--output", default=None,
+                        help=f"默认 {DEFAULT_OUTPUT}，指定 --compare 时默认 {DEFAULT_COMPARE_OUTPUT}")
+    parser.add_argument("--compare", default=None, help="与之比较的基线文件")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的相对退化，默认 20%%")
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--calls", type=int, default=None, help="微基准每项的调用次数")
+    parser.add_argument("--skip-macro", action="store_true")
+    parser.add_argument("--macro-child", nargs=2, type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.macro_child:
+        macro_child(*args.macro_child)
+        return
+    if args.output is None:
+        args.output = DEFAULT_COMPARE_OUTPUT if args.compare else DEFAULT_OUTPUT
+    baseline = None
+    if args.compare:
+        if os.path.abspath(args.output) == os.path.abspath(args.compare):
+            parser.error("--output 与 --compare 是同一个文件，基线会被本次结果覆盖")
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    calls = args.calls or (1000 if args.quick else 10000)
+    results = {"meta": {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "seed": SEED,
+        "calls": calls,
+    }}
+    print("micro (us/次)")
+    results["micro"] = run_micro(calls)
+    for name, us in results["micro"].items():
+        print(f"  {name:<24} {us:>10.2f}")
+    if not args.skip_macro:
+        print("macro")
+        results["macro"] = run_macro(QUICK_MACRO_SIZES if args.quick else MACRO_SIZES)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\n结果已写入 {args.output}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} 项退化超过 {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
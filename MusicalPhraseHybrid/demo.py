@@ -1,16 +1,15 @@
+import os
 import random
-import numpy as np
-from deap import base, creator, tools, algorithms
-from Settings import Melody
+from deap import base, creator, tools
+from Settings import register_types
 
 #-------Basic Deap settings-------
-creator.create("FitnessMax", base.Fitness, weights=(1.0,))
-creator.create("Melody", Melody, fitness=creator.FitnessMax)
+register_types()
 toolbox = base.Toolbox()
 
 #-------Create Gene------
 # 导入zcs模块提供的初始种群生成功能 (by zcs)
-from zcs_melody import generate_melody
+from zcs_melody import generate_melody, generate_melodies
 from zcs_config import load_config_and_melodies, create_population_from_config
 
 # === 配置模式选择 (by zcs) ===
@@ -18,6 +17,9 @@ from zcs_config import load_config_and_melodies, create_population_from_config
 # False = 纯随机生成
 USE_CONFIG_FILE = True
 CONFIG_FILE_PATH = "melodies.txt"
+# True = 解析结果编译成二进制缓存 melodies.txt.seedcache，之后的运行直接 mmap 读取，
+#        配置文件修改后自动重建（见 SeedCache.py）
+USE_SEED_CACHE = True
 
 # 全局调性设置（从配置加载后更新）
 CURRENT_KEY = "C"
@@ -36,141 +38,18 @@ toolbox.register("population", tools.initRepeat, list, toolbox.individual)
 
 
 #-----Fitness-----
-from Settings import Notes  # 需要引用 Notes 来确定调性主音索引
-import statistics
-import math
-
-def evaluate_melody(melody):
-    """
-    空拍现在还没加，我暂时认为作为“None”存在pitch列表中了
-    """
-    if not melody.pitch or not melody.beat:
-        return (0,)
-
-    score = 0.0
-    pitches = melody.pitch
-    beats = melody.beat
-    key = melody.key
-
-    if key not in Notes:
-        offset = 0 
-    else:
-        offset = Notes.index(key)
-    normalized_noNone = []
-    normalized = []
-    for p in pitches:
-        if p is None:
-            normalized.append(None)
-        else:
-            normalized.append((p - offset) % 12)
-    for i in range(len(normalized)): # normalized:
-        normalized_noNone.append(normalized[i])
-        if normalized[i] is None:
-            if i==0:
-                normalized_noNone[-1] = 0  # 空拍开头用主音代替计算
-            else:
-                normalized_noNone[-1] = normalized_noNone[-2]  # 空拍用前一个音代替计算
-    
-    # 音区范围
-    pitch_range = max(normalized_noNone) - min(normalized_noNone)
-    if pitch_range > 24:
-        score -= (pitch_range - 18) ** 2
-    else:
-        score += (pitch_range)
-
-    # 不要太跳跃也不要太无聊
-    jump = []
-    jump_list = [0,1.0,1.0,1.5,3.0,4.0,6.0,6.0,8.0,8.0,8.0,8.0]
-    stable_list = [10.0,-30.0,4.0,-30.0,5.0,1.0,-30.0,8.0,-30.0,3.0,-30.0,0.0]
-
-    for i in range(len(normalized_noNone) - 1):
-        interval = abs(normalized_noNone[i+1] - normalized_noNone[i])
-        if interval < len(jump_list):
-            jump.append(jump_list[interval])
-        else:
-            jump.append(20.0)
-        
-    score -= ((sum(jump) - 20.0)/math.sqrt(len(jump))) ** 2
-    score -= statistics.stdev(jump) ** 2
-
-    # 总音符数在一个范围内
-    note_count = len([p for p in pitches if p is not None])
-    if note_count < 16:
-        score -= (16 - note_count) ** 2
-    elif note_count > 48:
-        score -= (note_count - 48) ** 2
-    else:
-        score += note_count * 2.0
-    
-    # 总pause时长在一个范围内
-    pause_duration = sum([beats[i] for i in range(len(pitches)) if pitches[i] is None])
-    if pause_duration < 24:
-        score -= (24 - pause_duration) ** 2
-    elif pause_duration > 96:
-        score -= (pause_duration - 96) ** 2
-    else:
-        score += (96 - pause_duration) * 0.5
-
-    # 连唱超过3个音符奖励，但连唱超过一小节惩罚
-    consec_count = 0
-    consec_duration = 0.0
-    for i in range(len(pitches)):
-        if pitches[i] is not None:
-            consec_count +=1
-            consec_duration += beats[i]
-        else:
-            if consec_count >=4:
-                score += (consec_count -3) *5.0
-            if consec_duration > 48.0:
-                score -= ((consec_duration - 48.0) * 0.2) **2
-            consec_count =0
-            consec_duration = 0.0
-
-    # 连续pause超过两拍，惩罚
-    pause_duration = 0
-    for i in range(len(pitches)):
-        if pitches[i] is None:
-            pause_duration += beats[i]
-        else:
-            if pause_duration >= 24.0:
-                score -= ((pause_duration -24.0) * 0.2) ** 2.0
-            pause_duration =0
-    # 长停留音应较稳定
-    for i in range(len(normalized)):
-        if normalized[i] is None:
-            continue
-        if beats[i] >= 24.0:
-            score += stable_list[normalized[i] % 12] * (beats[i] / 6.0)
-        elif stable_list[normalized[i] % 12] < 0:
-            score += stable_list[normalized[i] % 12] * (beats[i] / 6.0)
-    
-    # 奖励结尾落在主\属音上
-    if normalized_noNone[-1] == 0:
-        score += 10.0
-    elif normalized_noNone[-1] == 7:
-        score += 5.0
-
-    # 奖励结尾为长音
-    if beats[-1] >= 12.0:
-        score += 10.0
-
-    # 奖励每两个小节结尾为空拍
-
-    sum_beats=0.0
-    for i in range(len(normalized)):
-        if sum_beats + beats[i] >= 96.0 and sum_beats < 96.0 or sum_beats + beats[i] >= 192.0 and sum_beats < 192.0:
-            if normalized[i] is None:
-                score += 20.0
-        sum_beats += beats[i]
-
-    # 奖励不同小节的节奏相似性
-    # todo
-
-    # 奖励不同小节具有相同的前缀节奏和旋律
-    # todo
-
-
-    return (score,)
+# 评估函数移至 Fitness 模块；USE_BATCH_FITNESS 为 True 时每代整批向量化评估
+from Fitness import evaluate_melody, batch_map, FitnessCache
+from DeltaFitness import evaluate_incremental
+USE_BATCH_FITNESS = True
+# 按旋律内容缓存适应度，重复个体不再重复评估；False 时关闭缓存
+USE_FITNESS_CACHE = True
+FITNESS_CACHE_SIZE = 100000
+# True = 逐个体增量评估（DeltaFitness）：局部变异后只重算改动的片段；
+# 此时不走整批向量化评估
+USE_DELTA_FITNESS = False
+fitness_cache = FitnessCache(evaluate_incremental if USE_DELTA_FITNESS else evaluate_melody,
+                             maxsize=FITNESS_CACHE_SIZE, enabled=USE_FITNESS_CACHE)
 
 
 #-----Crossover and Mutation_____
@@ -179,44 +58,284 @@ from Mutations import melody_mutation
 
 
 # --- 6. 注册所有操作到工具箱 ---
-toolbox.register("evaluate", evaluate_melody)
-toolbox.register("mate", GetChild)
+toolbox.register("evaluate", fitness_cache)
+if USE_BATCH_FITNESS:
+    toolbox.register("map", batch_map)
+# "index" = 只在相同下标处切开的原 crossover；"onset" = 在任意共同起音时刻切开
+CROSSOVER_MODE = "onset"
+CROSSOVER_POINTS = 1
+toolbox.register("mate", GetChild, mode=CROSSOVER_MODE, points=CROSSOVER_POINTS)
+
+# True = 所有配对一次性打包移调、批量杂交，原地修改（BatchCrossover.mate_population）
+USE_BATCH_CROSSOVER = False
+if USE_BATCH_CROSSOVER:
+    from BatchCrossover import mate_population
+    toolbox.register("mate_population", mate_population, mode=CROSSOVER_MODE,
+                     points=CROSSOVER_POINTS)
 toolbox.register("mutate", melody_mutation, indpb=0.2)
-toolbox.register("select", tools.selTournament, tournsize=3)
+# True = 整个种群一次性向量化变异（BatchMutations.mutate_population）
+USE_BATCH_MUTATION = False
+if USE_BATCH_MUTATION:
+    from BatchMutations import mutate_population
+    toolbox.register("mutate_population", mutate_population, indpb=0.2)
+# True = 共享适应度锦标赛选择（Diversity.sel_shared_tournament）：与相近旋律（音高轮廓 +
+# 起音位置的距离小于 SHARE_SIGMA）分摊适应度，防止种群塌缩成近似重复的个体
+USE_FITNESS_SHARING = False
+SHARE_SIGMA = 2.0
+if USE_FITNESS_SHARING:
+    from Diversity import sel_shared_tournament
+    toolbox.register("select", sel_shared_tournament, tournsize=3, sigma=SHARE_SIGMA)
+else:
+    toolbox.register("select", tools.selTournament, tournsize=3)
 
+# === 并行模式 ===
+# True = 评估、杂交、变异分块提交到进程池（N_WORKERS=None 时使用全部CPU核）
+USE_PARALLEL = False
+N_WORKERS = None
+# True = 种群放在共享内存中（SharedPopulation），工作进程按行区间原地杂交、变异、评估，
+# 主进程只发送行号区间；此时不使用适应度缓存、Controller 与性能剖析
+USE_SHARED_POPULATION = False
 
-# === 创建初始种群 (by zcs) ===
-if USE_CONFIG_FILE:
-    # 从配置文件加载：支持自定义旋律 + 随机生成
-    try:
-        config, population = create_population_from_config(
-            CONFIG_FILE_PATH, 
-            Get_Melody_Creator
-        )
-        CURRENT_KEY = config['key']
-        print(f"\n=== 配置信息 ===")
-        print(f"调性: {CURRENT_KEY}")
-        print(f"种群大小: {len(population)}")
-        print(f"================\n")
-    except Exception as e:
-        print(f"配置加载失败: {e}，使用默认随机生成")
-        population = toolbox.population(n=200)
-else:
-    # 纯随机生成
-    population = toolbox.population(n=200)
+
+# === 岛屿模型 ===
+# N_ISLANDS > 0 时改为运行 N_ISLANDS 个子种群（各一个进程），每 MIGRATION_INTERVAL 代
+# 按 TOPOLOGY（"ring" 或 "full"）交换各岛最好的 MIGRANTS 个个体
+N_ISLANDS = 0
+MIGRATION_INTERVAL = 5
+MIGRANTS = 5
+TOPOLOGY = "ring"
 
 
-hof = tools.HallOfFame(1)
+# === 性能剖析 ===
+# True = 每代记录各算子耗时、各评分项均值与相关系数、各变异策略的调用次数与成功率，
+# 写进 logbook 的 chapter，并逐代写到 PROFILE_OUTPUT（.csv 为 CSV，否则为 JSON-lines）
+PROFILE = False
+PROFILE_OUTPUT = "profile.jsonl"
 
 
-stats = tools.Statistics(lambda ind: ind.fitness.values)
-stats.register("avg", np.mean)
-stats.register("max", np.max)
+# === 提前停止与自适应概率 ===
+# True = 由 Controller 控制进化（NGEN 只是上限）：连续 PATIENCE 代最优、平均适应度都没有
+# 提高，或评估次数达到 MAX_EVALS、耗时达到 MAX_SECONDS 秒（None 为不限）时提前结束；
+# 停滞时逐步提高变异概率、降低杂交概率，并按各变异策略的成功率调整选中它们的概率
+USE_CONTROLLER = True
+PATIENCE = 10
+MAX_EVALS = None
+MAX_SECONDS = None
 
 
-algorithms.eaSimple(population, toolbox, cxpb=0.7, mutpb=0.2, ngen=50,
-                        stats=stats, halloffame=hof, verbose=True)
+# === 检查点 ===
+# CHECKPOINT_EVERY > 0 时每隔这么多代保存一次检查点；
+# RESUME_FROM_CHECKPOINT 为 True 且检查点存在时，从检查点继续运行
+# （USE_CONTROLLER 时 Controller 的停滞计数、自适应概率与策略权重也一并保存、恢复）
+CHECKPOINT_PATH = "evolution.ckpt.npz"
+CHECKPOINT_EVERY = 0
+RESUME_FROM_CHECKPOINT = False
 
-best_melody = hof[0]
-print("\n--- Best Melody ---")
-print(best_melody)
+
+# === 精英档案 ===
+# ELITE_ARCHIVE_SIZE > 0 时用 EliteArchive 代替 HallOfFame(1)：保留适应度最高的这么多条
+# 互不相同（移调到 C 后比较）的旋律，并追加写入 ELITE_ARCHIVE_PATH，下次运行时继续累积
+ELITE_ARCHIVE_SIZE = 0
+ELITE_ARCHIVE_PATH = "elite.archive"
+
+
+# === 统计 ===
+# True = 用 Stats.FitnessStats 与 ColumnarLogbook：一次向量化算出适应度的
+# avg/max/min/std/分位数、多样性与各评分项均值；运行结束后导出到
+# LOGBOOK_OUTPUT（.csv 为 CSV，否则为 .npz；None 为不导出）
+USE_FAST_STATS = True
+LOGBOOK_OUTPUT = None
+
+
+# === 进化参数 ===
+POPULATION_SIZE = 200
+NGEN = 50
+CXPB = 0.7
+MUTPB = 0.2
+
+
+def create_population():
+    """
+    创建初始种群 (by zcs)
+
+    返回 population，并根据配置文件更新全局调性 CURRENT_KEY
+    """
+    global CURRENT_KEY
+    if USE_CONFIG_FILE:
+        # 从配置文件加载：支持自定义旋律 + 随机生成
+        try:
+            config, population = create_population_from_config(
+                CONFIG_FILE_PATH, 
+                Get_Melody_Creator,
+                use_cache=USE_SEED_CACHE
+            )
+            CURRENT_KEY = config['key']
+            print(f"\n=== 配置信息 ===")
+            print(f"调性: {CURRENT_KEY}")
+            print(f"种群大小: {len(population)}")
+            print(f"================\n")
+            return population
+        except Exception as e:
+            print(f"配置加载失败: {e}，使用默认随机生成")
+    # 纯随机生成（整批向量化生成，分布与逐个调用 Get_Melody 相同）
+    return generate_melodies(POPULATION_SIZE, key=CURRENT_KEY, use_scale=True,
+                             melody_creator=Get_Melody_Creator)
+
+
+def create_stats():
+    if USE_FAST_STATS:
+        from Stats import FitnessStats
+        return FitnessStats()
+    import numpy as np
+    stats = tools.Statistics(lambda ind: ind.fitness.values)
+    stats.register("avg", np.mean)
+    stats.register("max", np.max)
+    return stats
+
+
+def run(population=None, ngen=NGEN, verbose=True):
+    """
+    逐代运行遗传算法，每代 yield 一个 Evolution.GenerationState
+
+    调用方可以实时读取每代的最优个体与统计、在停滞时 break 提前结束，
+    或在两代之间保存检查点。
+    """
+    from Evolution import evolve
+    if ELITE_ARCHIVE_SIZE > 0:
+        from EliteArchive import EliteArchive
+        hof = EliteArchive(ELITE_ARCHIVE_SIZE, path=ELITE_ARCHIVE_PATH,
+                           melody_creator=Get_Melody_Creator)
+    else:
+        hof = tools.HallOfFame(1)
+    logbook = None
+    start_gen = 0
+    if RESUME_FROM_CHECKPOINT and os.path.exists(CHECKPOINT_PATH):
+        from Checkpoint import load_checkpoint
+        checkpoint = load_checkpoint(CHECKPOINT_PATH, Get_Melody_Creator)
+        population = checkpoint["population"]
+        if ELITE_ARCHIVE_SIZE > 0:
+            hof.update(checkpoint["halloffame"] or [])
+        else:
+            hof = checkpoint["halloffame"] or hof
+        logbook = checkpoint["logbook"]
+        start_gen = checkpoint["generation"] + 1
+        print(f"从检查点 {CHECKPOINT_PATH} 的第 {checkpoint['generation']} 代继续")
+    elif population is None:
+        population = create_population()
+    stats = create_stats()
+    if logbook is None and USE_FAST_STATS:
+        from Stats import ColumnarLogbook
+        logbook = ColumnarLogbook(['gen', 'nevals'] + stats.fields)
+
+    if USE_SHARED_POPULATION:
+        yield from _run_shared(population, ngen, stats, hof, logbook, verbose)
+        return
+
+    pool = None
+    if USE_PARALLEL:
+        from Parallel import ProcessPoolMap
+        pool = ProcessPoolMap(processes=N_WORKERS)
+        toolbox.register("map", pool)
+    profiler = None
+    if PROFILE:
+        from Profiling import Profiler, open_sink
+        profiler = Profiler(sink=open_sink(PROFILE_OUTPUT))
+        profiler.attach(toolbox)
+    controller = None
+    if USE_CONTROLLER:
+        from Controller import Controller
+        controller = Controller(CXPB, MUTPB, patience=PATIENCE, max_evals=MAX_EVALS,
+                                max_seconds=MAX_SECONDS)
+        if start_gen > 0 and checkpoint["controller"] is not None:
+            controller.load_state(checkpoint["controller"])
+        controller.attach(toolbox)
+    generations = evolve(population, toolbox, CXPB, MUTPB, ngen, stats=stats,
+                         halloffame=hof, logbook=logbook, start_gen=start_gen)
+    if CHECKPOINT_EVERY > 0:
+        from Checkpoint import checkpointed
+        generations = checkpointed(generations, CHECKPOINT_PATH, CHECKPOINT_EVERY,
+                                   controller=controller)
+    state = None
+    try:
+        for state in generations:
+            if verbose:
+                print(state.logbook.stream)
+            yield state
+    finally:
+        if controller is not None:
+            controller.detach()
+            if verbose and controller.stop_reason is not None:
+                gen = state.gen if state is not None else start_gen - 1
+                print(f"第 {gen} 代提前结束（{controller.stop_reason}），"
+                      f"共评估 {controller.evals} 次")
+        if profiler is not None:
+            profiler.detach()
+        if pool is not None:
+            pool.close()
+            toolbox.register("map", batch_map if USE_BATCH_FITNESS else map)
+        if ELITE_ARCHIVE_SIZE > 0:
+            hof.close()
+        _export_logbook(logbook)
+
+
+def _run_shared(population, ngen, stats, hof, logbook, verbose):
+    """USE_SHARED_POPULATION 时的 run：结束后把共享内存中的种群写回 population"""
+    from SharedPopulation import SharedPopulation, SharedPopulationPool, evolve_shared
+    store = SharedPopulation.from_population(population)
+    pool = SharedPopulationPool(processes=N_WORKERS)
+    try:
+        for state in evolve_shared(store, CXPB, MUTPB, ngen, pool=pool, indpb=0.2,
+                                   mode=CROSSOVER_MODE, points=CROSSOVER_POINTS,
+                                   stats=stats, halloffame=hof, logbook=logbook):
+            if verbose:
+                print(state.logbook.stream)
+            yield state
+    finally:
+        pool.close()
+        population[:] = store.to_population(Get_Melody_Creator)
+        store.close()
+        store.unlink()
+        if ELITE_ARCHIVE_SIZE > 0:
+            hof.close()
+        _export_logbook(logbook)
+
+
+def _export_logbook(logbook):
+    """USE_FAST_STATS 且设置了 LOGBOOK_OUTPUT 时导出列式 logbook"""
+    if not LOGBOOK_OUTPUT or not hasattr(logbook, "to_npz"):
+        return
+    if LOGBOOK_OUTPUT.lower().endswith(".csv"):
+        logbook.to_csv(LOGBOOK_OUTPUT)
+    else:
+        logbook.to_npz(LOGBOOK_OUTPUT)
+
+
+def main():
+    if N_ISLANDS > 0:
+        from Islands import run_islands
+        logbook, best = run_islands(N_ISLANDS, POPULATION_SIZE, NGEN, CXPB, MUTPB,
+                                    MIGRATION_INTERVAL, MIGRANTS, TOPOLOGY,
+                                    seed=random.randrange(2**32))
+        _export_logbook(logbook)
+        print("\n--- Best Melody ---")
+        print(best[0])
+        return
+
+    state = None
+    for state in run():
+        pass
+    if state is None:
+        print("检查点中的运行已经结束，没有继续进化")
+        return
+
+    if USE_FITNESS_CACHE and not USE_SHARED_POPULATION:
+        print(f"适应度缓存命中 {fitness_cache.hits} 次，未命中 {fitness_cache.misses} 次"
+              f"（命中率 {fitness_cache.hit_rate:.1%}）")
+
+    best_melody = state.best
+    print("\n--- Best Melody ---")
+    print(best_melody)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@
 提供从文件读取配置参数和用户自定义旋律的功能。
 本模块独立于主程序，通过接口调用。
 """
+import itertools
 import os
 
 # 从Settings导入音名转换表
@@ -47,7 +48,32 @@ def parse_config_line(line):
     return param, value
 
 
-def parse_melody_string(melody_str):
+def apply_config_line(config, line):
+    """
+    把一行配置写入 config 字典
+
+    返回警告信息字符串；配置有效时返回 None
+    """
+    param, value = parse_config_line(line)
+    if param == 'key':
+        if value in Notes or value.upper() in ['C', '#C', 'D', '#D', 'E', 'F', '#F', 'G', '#G', 'A', '#A', 'B']:
+            config['key'] = value
+        else:
+            return f"警告：无效的调性 '{value}'，使用默认值 C"
+    elif param == 'seeds':
+        try:
+            config['seeds'] = int(value)
+        except ValueError:
+            return f"警告：无效的种子数 '{value}'"
+    elif param == 'random':
+        try:
+            config['random'] = int(value)
+        except ValueError:
+            return f"警告：无效的随机数 '{value}'"
+    return None
+
+
+def parse_melody_string(melody_str, warn=print):
     """
     解析旋律字符串，转换为 (pitch_list, beat_list)
     
@@ -59,6 +85,7 @@ def parse_melody_string(melody_str):
     
     音名：C1-B7, #C1-#A7, Pause
     时值：6=八分, 12=四分, 18=附点四分, 24=二分, 36=附点二分, 48=全音符
+    warn: 处理警告信息（无效的音名）的函数，默认直接打印
     """
     pitch_list = []
     beat_list = []
@@ -86,11 +113,18 @@ def parse_melody_string(melody_str):
                 pitch_list.append(pitch)
                 beat_list.append(beat)
             else:
-                print(f"警告：无效的音名 '{note_name}'，已跳过")
+                warn(f"警告：无效的音名 '{note_name}'，已跳过")
     
     return pitch_list, beat_list
 
 
+def format_melody_string(pitch_list, beat_list):
+    """parse_melody_string 的逆操作：每行一个 "音名 时值"，空拍为 Pause"""
+    names = {pitch: name for name, pitch in TransPitches.items()}
+    return '\n'.join(f"{'Pause' if p is None else names[p]} {b}"
+                     for p, b in zip(pitch_list, beat_list))
+
+
 def load_config_and_melodies(filepath):
     """
     从文件加载配置参数和用户旋律
@@ -108,15 +142,28 @@ def load_config_and_melodies(filepath):
         - config: 配置字典
         - melodies: 旋律列表，每个元素为 (pitch_list, beat_list)
     """
-    config = DEFAULT_CONFIG.copy()
-    melodies = []
-    
     if not os.path.exists(filepath):
         print(f"配置文件 {filepath} 不存在，使用默认配置")
-        return config, melodies
+        return DEFAULT_CONFIG.copy(), []
     
     with open(filepath, 'r', encoding='utf-8') as f:
         content = f.read()
+    return parse_config_text(content)
+
+
+def parse_config_text(content, warn=print):
+    """
+    解析配置文件格式的文本（格式见 load_config_and_melodies）
+    
+    参数:
+        content: 文本内容
+        warn: 处理警告信息的函数，默认直接打印
+    
+    返回:
+        (config, melodies) 元组，与 load_config_and_melodies 相同
+    """
+    config = DEFAULT_CONFIG.copy()
+    melodies = []
     
     # 解析配置行
     lines = content.split('\n')
@@ -125,22 +172,9 @@ def load_config_and_melodies(filepath):
     for i, line in enumerate(lines):
         line = line.strip()
         if line.startswith('@'):
-            param, value = parse_config_line(line)
-            if param == 'key':
-                if value in Notes or value.upper() in ['C', '#C', 'D', '#D', 'E', 'F', '#F', 'G', '#G', 'A', '#A', 'B']:
-                    config['key'] = value
-                else:
-                    print(f"警告：无效的调性 '{value}'，使用默认值 C")
-            elif param == 'seeds':
-                try:
-                    config['seeds'] = int(value)
-                except ValueError:
-                    print(f"警告：无效的种子数 '{value}'")
-            elif param == 'random':
-                try:
-                    config['random'] = int(value)
-                except ValueError:
-                    print(f"警告：无效的随机数 '{value}'")
+            warning = apply_config_line(config, line)
+            if warning:
+                warn(warning)
             content_start = i + 1
         elif line and not line.startswith('#'):
             break
@@ -153,33 +187,274 @@ def load_config_and_melodies(filepath):
         fragment = fragment.strip()
         if fragment:
             try:
-                pitch_list, beat_list = parse_melody_string(fragment)
+                pitch_list, beat_list = parse_melody_string(fragment, warn=warn)
                 if pitch_list and beat_list:
                     # 验证总时值
                     if sum(beat_list) == 192:
                         melodies.append((pitch_list, beat_list))
                     else:
-                        print(f"警告：旋律片段时值总和为 {sum(beat_list)}，应为 192，已跳过")
+                        warn(f"警告：旋律片段时值总和为 {sum(beat_list)}，应为 192，已跳过")
             except Exception as e:
-                print(f"警告：解析片段失败 - {e}")
+                warn(f"警告：解析片段失败 - {e}")
     
     return config, melodies
 
 
-def create_population_from_config(filepath, melody_creator):
+# ----------------- 大语料的流式读取 -----------------
+STREAM_BATCH_SIZE = 4096   # 每批旋律条数
+MELODY_TOTAL = 192         # 每条旋律的总时值
+STREAM_BLOCK_SIZE = 1 << 20  # 每次从文件读取的字节数
+_MAX_EXAMPLES = 5          # 每类警告保留的示例个数
+
+# "音名 时值" 整行 -> (pitch, beat) 的预计算表，覆盖所有音名与常用时值
+_NOTE_TABLE = {name.encode(): pitch for name, pitch in TransPitches.items()}
+_LINE_TABLE = {
+    name + b' ' + str(beat).encode(): (pitch, beat)
+    for name, pitch in _NOTE_TABLE.items()
+    for beat in range(6, MELODY_TOTAL + 1, 6)
+}
+
+
+class ParseReport:
+    """
+    流式读取时汇总的警告，代替逐行 print
+
+    invalid_notes: {无效音名: 出现次数}
+    bad_totals: 总时值不是 192 而被跳过的片段数（bad_total_examples 中保留前几个的行号与时值）
+    config_warnings: 配置行的警告
+    """
+
+    def __init__(self):
+        self.fragments = 0
+        self.melodies = 0
+        self.lines = 0
+        self.invalid_notes = {}
+        self.bad_totals = 0
+        self.bad_total_examples = []
+        self.config_warnings = []
+
+    @property
+    def warnings(self):
+        return (sum(self.invalid_notes.values()) + self.bad_totals
+                + len(self.config_warnings))
+
+    def summary(self):
+        parts = [f"读取 {self.lines} 行，{self.fragments} 个片段，有效旋律 {self.melodies} 条"]
+        parts += self.config_warnings
+        if self.invalid_notes:
+            top = sorted(self.invalid_notes.items(), key=lambda item: -item[1])[:_MAX_EXAMPLES]
+            names = "，".join(f"'{name}' x{count}" for name, count in top)
+            parts.append(f"警告：跳过无效音名 {sum(self.invalid_notes.values())} 个（{names}）")
+        if self.bad_totals:
+            examples = "，".join(f"第{line}行起 总时值{total}"
+                                 for line, total in self.bad_total_examples)
+            parts.append(f"警告：{self.bad_totals} 个片段总时值不是 {MELODY_TOTAL}，已跳过"
+                         f"（{examples}）")
+        return "\n".join(parts)
+
+
+def _iter_line_blocks(filepath, block_size=STREAM_BLOCK_SIZE):
+    """
+    按块读取文件，每次产出一个完整行（bytes，不含换行符）组成的列表
+
+    非空文件通过 mmap 读取；跨块的半行留到下一块，内存占用只与 block_size 有关
+    """
+    import mmap
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            carry = b''
+            while True:
+                chunk = mm.read(block_size)
+                if not chunk:
+                    break
+                block = (carry + chunk).split(b'\n')
+                carry = block.pop()
+                yield block
+            if carry:
+                yield [carry]
+
+
+def _is_comment(line):
+    """与 parse_melody_string 相同的注释判断：以 # 开头但不是 #C4 这样的音名"""
+    return line[:1] == b'#' and (len(line) < 2 or not line[1:2].isalpha() or line[1:2] == b' ')
+
+
+def _parse_note_line(line, report):
+    """
+    解析预计算表中没有的一行，返回 (pitch, beat)；不是音符行时返回 None
+
+    与 parse_melody_string 一致：空行、注释、时值不是整数的行静默跳过，
+    无效音名计入 report.invalid_notes
+    """
+    if not line or _is_comment(line):
+        return None
+    parts = line.split()
+    if len(parts) < 2:
+        return None
+    try:
+        beat = int(parts[1])
+    except ValueError:
+        return None
+    pitch = _NOTE_TABLE.get(parts[0])
+    if pitch is None:
+        name = parts[0].decode('utf-8', 'replace')
+        report.invalid_notes[name] = report.invalid_notes.get(name, 0) + 1
+        return None
+    return pitch, beat
+
+
+def _pack_batch(key_index, flat_pitch, flat_beat, lengths):
+    import numpy as np
+    from Packing import REST, PackedMelodies
+
+    n = len(lengths)
+    lengths = np.array(lengths, dtype=np.int16)
+    width = int(lengths.max())
+    mask = np.arange(width)[None, :] < lengths[:, None]
+    pitch = np.full((n, width), REST, dtype=np.int16)
+    beat = np.zeros((n, width), dtype=np.int16)
+    pitch[mask] = flat_pitch
+    beat[mask] = flat_beat
+    return PackedMelodies(np.full(n, key_index, dtype=np.int8), pitch, beat, lengths)
+
+
+def stream_config_and_melodies(filepath, batch_size=STREAM_BATCH_SIZE, report=None):
+    """
+    load_config_and_melodies 的流式版本，用于上百万条旋律的语料
+
+    先读完开头的配置行，返回 (config, batches)：batches 是一个生成器，每次产出
+    最多 batch_size 条旋律打包成的 Packing.PackedMelodies（pitch/beat 为 int16 矩阵，
+    "Pause" 与 parse_melody_string 一样记为音高 84）。文件通过 mmap 分块读取，
+    内存占用只与 batch_size 和块大小有关，与文件大小无关。
+
+    解析规则与 load_config_and_melodies 相同；警告不再逐行打印，而是汇总到
+    report（ParseReport）中，读完后可用 report.summary() 输出。
+    """
+    if report is None:
+        report = ParseReport()
+    config = DEFAULT_CONFIG.copy()
+    if not os.path.exists(filepath):
+        report.config_warnings.append(f"配置文件 {filepath} 不存在，使用默认配置")
+        return config, (batch for batch in ())
+
+    blocks = _iter_line_blocks(filepath)
+    # 配置区：最后一个 @ 行之后的空行 / 注释行仍属于旋律内容，暂存到 first_block
+    first_block = []
+    done = False
+    for block in blocks:
+        for i, raw in enumerate(block):
+            line = raw.strip()
+            if line.startswith(b'@'):
+                warning = apply_config_line(config, line.decode('utf-8', 'replace'))
+                if warning:
+                    report.config_warnings.append(warning)
+                report.lines += len(first_block) + 1
+                first_block = []
+            elif line and not line.startswith(b'#'):
+                first_block += block[i:]
+                done = True
+                break
+            else:
+                first_block.append(raw)
+        if done:
+            break
+
+    from Packing import KEY_INDEX
+    key_index = KEY_INDEX.get(config['key'], 0)
+
+    def batches():
+        flat_pitch, flat_beat, lengths = [], [], []
+        frag_pitch, frag_beat = [], []
+        total = notes = 0
+        frag_start = report.lines + 1
+        line_no = report.lines
+        table = _LINE_TABLE
+
+        def finish_fragment():
+            if notes:
+                report.fragments += 1
+                if total == MELODY_TOTAL:
+                    flat_pitch.extend(frag_pitch)
+                    flat_beat.extend(frag_beat)
+                    lengths.append(len(frag_pitch))
+                    report.melodies += 1
+                else:
+                    report.bad_totals += 1
+                    if len(report.bad_total_examples) < _MAX_EXAMPLES:
+                        report.bad_total_examples.append((frag_start, total))
+            frag_pitch.clear()
+            frag_beat.clear()
+
+        for block in itertools.chain([first_block], blocks):
+            report.lines += len(block)
+            for line in map(bytes.strip, block):
+                line_no += 1
+                hit = table.get(line)
+                if hit is None:
+                    if b'---' in line:
+                        # 片段分隔符，可能出现在行中间
+                        segments = line.split(b'---')
+                    else:
+                        segments = (line,)
+                    for k, segment in enumerate(segments):
+                        if k:
+                            finish_fragment()
+                            total = notes = 0
+                            frag_start = line_no
+                        hit = _parse_note_line(segment.strip(), report)
+                        if hit is not None:
+                            notes += 1
+                            total += hit[1]
+                            if total <= MELODY_TOTAL:
+                                frag_pitch.append(hit[0])
+                                frag_beat.append(hit[1])
+                    if len(lengths) >= batch_size:
+                        yield _pack_batch(key_index, flat_pitch, flat_beat, lengths)
+                        flat_pitch.clear()
+                        flat_beat.clear()
+                        lengths.clear()
+                    continue
+                # 常见情况：整行命中预计算表。时值已超过 192 的片段注定被跳过，只计数
+                notes += 1
+                total += hit[1]
+                if total <= MELODY_TOTAL:
+                    frag_pitch.append(hit[0])
+                    frag_beat.append(hit[1])
+        finish_fragment()
+        if lengths:
+            yield _pack_batch(key_index, flat_pitch, flat_beat, lengths)
+
+    return config, batches()
+
+
+def create_population_from_config(filepath, melody_creator, use_cache=False):
     """
     根据配置文件创建初始种群
     
     参数:
         filepath: 配置文件路径
         melody_creator: 创建Melody对象的函数，签名为 (key, pitch, beat) -> Melody
+        use_cache: 为 True 时通过 SeedCache 读取二进制编译缓存（不存在或过期时先生成）
     
     返回:
         (config, population) 元组
     """
-    from zcs_melody import generate_melody
+    from zcs_melody import generate_melodies
+    from Packing import unpack_rows
     
-    config, user_melodies = load_config_and_melodies(filepath)
+    report = ParseReport()
+    if use_cache:
+        from SeedCache import load_seeds
+        compiled = load_seeds(filepath, report=report)
+        config = compiled.config
+        # 只取前 custom_count 条，未用到的部分不会从映射文件中读入
+        batches = (compiled.packed(start, start + STREAM_BATCH_SIZE)
+                   for start in range(0, len(compiled), STREAM_BATCH_SIZE))
+    else:
+        # 流式读取，只读到够用的旋律为止，大语料也不必整体载入
+        config, batches = stream_config_and_melodies(filepath, report=report)
     
     key = config['key']
     seeds = config['seeds']
@@ -189,22 +464,26 @@ def create_population_from_config(filepath, melody_creator):
     population = []
     
     # 方法a：添加用户提供的旋律
-    if user_melodies and custom_count > 0:
-        actual_custom = min(custom_count, len(user_melodies))
-        for i in range(actual_custom):
-            pitch, beat = user_melodies[i % len(user_melodies)]
-            melody = melody_creator(key, pitch.copy(), beat.copy())
-            population.append(melody)
-        print(f"已加载 {actual_custom} 个用户旋律（方法a）")
+    if custom_count > 0:
+        for packed in batches:
+            for _, pitch, beat in unpack_rows(packed):
+                population.append(melody_creator(key, pitch, beat))
+                if len(population) == custom_count:
+                    break
+            if len(population) == custom_count:
+                break
+        batches.close()
+        if population:
+            print(f"已加载 {len(population)} 个用户旋律（方法a）")
+    if report.warnings:
+        print(report.summary())
     
     # 方法b：随机生成剩余数量（使用调性约束）
     remaining = seeds - len(population)
     if remaining > 0:
         print(f"使用调性 {key} 生成随机旋律")
-        for _ in range(remaining):
-            _, pitch, beat = generate_melody(key=key, use_scale=True)
-            melody = melody_creator(key, pitch, beat)
-            population.append(melody)
+        population += generate_melodies(remaining, key=key, use_scale=True,
+                                        melody_creator=melody_creator)
         print(f"已随机生成 {remaining} 个旋律（方法b）")
     
     return config, population
@@ -212,6 +491,8 @@ def create_population_from_config(filepath, melody_creator):
 
 # 导出的接口
 __all__ = [
-    'parse_melody_string', 'load_config_and_melodies', 
+    'parse_melody_string', 'format_melody_string', 'load_config_and_melodies',
+    'parse_config_text', 'apply_config_line',
+    'stream_config_and_melodies', 'ParseReport',
     'create_population_from_config', 'DEFAULT_CONFIG'
 ]
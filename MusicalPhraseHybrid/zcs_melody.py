@@ -119,9 +119,91 @@ def generate_melody(key=None, use_scale=True):
     return key, pitch_list, beat_list
 
 
+def generate_melodies(n, key=None, use_scale=True, melody_creator=None, rng=None,
+                      bar_rhythms=False):
+    """
+    批量生成 n 条随机旋律，与逐条调用 generate_melody 的分布相同
+
+    所有旋律同步逐个音符推进：每一步对尚未填满的旋律一次性抽取时值
+    （在不超过剩余时值的 VALID_BEATS 中均匀选取）、音高和空拍标记，
+    不再逐条调用 random。
+
+    参数:
+        n: 旋律数量
+        key: 调性，默认为 "C"
+        use_scale: 是否使用调性约束
+        melody_creator: 签名为 (key, pitch, beat) -> Melody 的工厂函数；
+            为 None 时返回 Packing.PackedMelodies（适合百万级的种群）
+        rng: numpy.random.Generator，默认以 random 的随机数作种子，
+            因此 random.seed 之后结果可复现
+        bar_rhythms: True 时节奏改为从 RhythmPool 中每小节均匀抽取一个节奏型
+            （音符不跨小节线，分布与 generate_melody 不同）
+
+    返回:
+        PackedMelodies 或 Melody 对象列表
+    """
+    import numpy as np
+    from Packing import REST, KEY_INDEX, PackedMelodies, unpack_melodies
+
+    if key is None:
+        key = DEFAULT_KEY
+    if rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+
+    if use_scale:
+        valid_pitches = np.array(get_scale_pitches(key), dtype=np.int16)
+        if key not in KEY_SCALE_MAP:
+            key = DEFAULT_KEY
+    else:
+        valid_pitches = np.arange(PITCH_MIN, PITCH_MAX + 1, dtype=np.int16)
+    beats = np.array(VALID_BEATS, dtype=np.int16)
+
+    if bar_rhythms:
+        from RhythmPool import get_pool
+        pool = get_pool()
+        beat, lengths, _ = pool.rhythms(pool.sample(n, rng=rng))
+        pitch = valid_pitches[rng.integers(0, len(valid_pitches), size=beat.shape)]
+        pitch[rng.random(beat.shape) < 0.25] = REST
+        pitch[beat == 0] = REST
+        keys = np.full(n, KEY_INDEX.get(key, 0), dtype=np.int8)
+        packed = PackedMelodies(keys, pitch, beat, lengths)
+        if melody_creator is None:
+            return packed
+        return unpack_melodies(packed, melody_creator)
+
+    width = MELODY_LENGTH // BEAT_UNIT
+    pitch = np.full((n, width), REST, dtype=np.int16)
+    beat = np.zeros((n, width), dtype=np.int16)
+    lengths = np.zeros(n, dtype=np.int16)
+    remaining = np.full(n, MELODY_LENGTH, dtype=np.int64)
+
+    rows = np.arange(n)
+    for col in range(width):
+        # 剩余时值总是 BEAT_UNIT 的倍数，因此至少有一个可用时值
+        rows = rows[remaining[rows] >= BEAT_UNIT]
+        if len(rows) == 0:
+            break
+        available = np.searchsorted(beats, remaining[rows], side="right")
+        b = beats[(rng.random(len(rows)) * available).astype(np.int64)]
+        p = valid_pitches[rng.integers(0, len(valid_pitches), size=len(rows))]
+        p[rng.random(len(rows)) < 0.25] = REST  # 以1/4的概率变成空拍
+
+        pitch[rows, col] = p
+        beat[rows, col] = b
+        lengths[rows] += 1
+        remaining[rows] -= b
+
+    used = int(lengths.max()) if n else 0
+    keys = np.full(n, KEY_INDEX.get(key, 0), dtype=np.int8)
+    packed = PackedMelodies(keys, pitch[:, :used].copy(), beat[:, :used].copy(), lengths)
+    if melody_creator is None:
+        return packed
+    return unpack_melodies(packed, melody_creator)
+
+
 # 导出的接口
 __all__ = [
-    'generate_melody', 'get_scale_pitches',
+    'generate_melody', 'generate_melodies', 'get_scale_pitches',
     'PITCH_MIN', 'PITCH_MAX', 'BEAT_UNIT', 'VALID_BEATS', 
     'MELODY_LENGTH', 'DEFAULT_KEY', 'KEY_SCALE_MAP'
 ]